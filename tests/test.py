@@ -1,7 +1,39 @@
+import csv
+import io
+import json
+import os
+import pickle
+import random
+import tempfile
+import textwrap
+import threading
 import unittest
 from yb_enigma import Enigma, Rotor, Reflector, Plugboard
 from yb_enigma import InvalidConfigurationString, InvalidPlugboardPair, NotUniquePair
-from yb_enigma import parse_configuration, ALPH
+from yb_enigma import parse_configuration, format_output_string, prepare_string, ALPH
+from yb_enigma import RangeIndex, decode_range
+from yb_enigma import ByteEnigma
+from yb_enigma import generate_configurations, write_keysheet, keyspace_size
+from yb_enigma import Keyspace, validate_configuration_string
+from yb_enigma import MachineSpec, INDEX_TO_LETTER, LETTER_TO_INDEX
+from yb_enigma import PhaseTimer
+from yb_enigma.stepping import get_schedule, notched_step
+from yb_enigma import check_engines, check_baselines, reference_encode
+from yb_enigma import NgramScorer, PlugboardSolver
+from yb_enigma import Sweep, position_index
+from yb_enigma import SearchJob, SEARCH_PREFIX_LETTERS
+from yb_enigma import Bombe, crib_offsets
+from yb_enigma import WiringSolver
+from yb_enigma import CorpusStats, analyze_file, index_of_coincidence
+from yb_enigma import run_batch
+from yb_enigma import ColumnEncoder, encode_csv
+from yb_enigma import TableCache, set_table_cache, TABLES_HEADER
+from yb_enigma import MachinePool
+from yb_enigma import EncodeMemo
+from yb_enigma import Permutation, PermutationBatch
+from yb_enigma import detect_compression, open_text_input, open_text_output, prefetch
+from yb_enigma.cli import run_csv
+from yb_enigma.exceptions import InvalidArguments
 # import utils
 
 
@@ -21,6 +53,31 @@ class TestRotors(unittest.TestCase):
                     self.assertEqual(char, decoded_char)
 
 
+    def test_ring_setting(self):
+        for rotor in Rotor.list() + Rotor.greek_list():
+            for ring in [1, 7, 25]:
+                with self.subTest(rotor=rotor.num, ring=ring):
+                    ringed = Rotor.by_num(rotor.num, ring=ring)
+                    self.assertEqual(sorted(ringed.coding_list), list(range(26)))
+                    for x in range(26):
+                        self.assertEqual(ringed.coding_list[(x + ring) % 26], (rotor.coding_list[x] + ring) % 26)
+
+    def test_greek_rotors(self):
+        # thin reflector with Greek rotor at position 0 is the same as thick reflector (M4 is compatible with M3)
+        for thin, greek, thick in [('B-thin', 'Beta', 'B'), ('C-thin', 'Gamma', 'C')]:
+            with self.subTest(reflector=thin):
+                m4 = Enigma()
+                m4.set_configuration(f'{thin} {greek}:0-II:10:4-I:3-III:20 AB:CD')
+                m3 = Enigma()
+                m3.set_configuration(f'{thick} II:10:4-I:3-III:20 AB:CD')
+                self.assertEqual(m4.encode('Hello, World!'), m3.encode('Hello, World!'))
+
+        conf_str = 'B-thin Gamma:5:3-II:10:4-I:3-III:20 AB:CD'
+        spec, cursor = MachineSpec.from_configuration(conf_str)
+        self.assertEqual(spec.get_configuration(cursor), conf_str)
+        self.assertEqual(spec.encode('Hello, World!', cursor), reference_encode(conf_str, 'Hello, World!')[0])
+
+
 class TestPlugboard(unittest.TestCase):
 
     def test_random_full(self):
@@ -73,6 +130,998 @@ class TestEnigmaEncryption(unittest.TestCase):
                             dec = enigma.encode(enc)
                             self.assertEqual('abcdefghijklmnopqrstuvwxyz', dec)
 
+    def test_passthrough(self):
+        string = 'Hello, World!\nÉnigma ½ is\tcool.'
+        conf_str = 'B III:4-I:17-II:9 AQ:EZ'
+        enigma = Enigma()
+
+        for keep in [(False, False, False), (True, False, False), (False, True, True), (True, True, True)]:
+            with self.subTest(keep=keep):
+                keep_spaces, keep_new_line, keep_special = keep
+
+                # char by char, as CLI used to do it
+                enigma.set_configuration(conf_str)
+                expected = ''
+                for char in string:
+                    if char.isalpha():
+                        expected += enigma.encode(char)
+                    elif char == ' ':
+                        expected += char if keep_spaces else ''
+                    elif char == '\n':
+                        expected += char if keep_new_line else ''
+                    elif keep_special:
+                        expected += char
+                expected_conf = enigma.get_configuration()
+
+                enigma.set_configuration(conf_str)
+                encoded = enigma.encode(string, keep_spaces=keep_spaces, keep_new_line=keep_new_line, keep_special=keep_special)
+                self.assertEqual(encoded, expected)
+                self.assertEqual(enigma.get_configuration(), expected_conf)
+
+                enigma.set_configuration(conf_str)
+                encoded = enigma.encode(string, keep_spaces=keep_spaces, keep_new_line=keep_new_line, keep_special=keep_special, keep_case=True)
+                self.assertEqual(encoded.lower(), expected)
+                self.assertEqual(encoded[0], expected[0].upper())
+
+
+class TestEnigmaInstances(unittest.TestCase):
+
+    def test_default_not_shared(self):
+        first, second = Enigma(), Enigma()
+        first.encode('a' * 100)
+        self.assertEqual('A I:0-II:0', second.get_configuration())
+
+    def test_rotors_list_not_changed(self):
+        rotors_list = [Rotor.I(), Rotor.II(), Rotor.III()]
+        Enigma(rotors=rotors_list)
+        self.assertEqual(['I', 'II', 'III'], [rotor.num for rotor in rotors_list])
+
+
+class TestMachineSpec(unittest.TestCase):
+
+    def test_equal_to_enigma(self):
+        cases = list(generate_configurations(50, rotors_amount=3, plugpairs_amount=10, seed=1))
+        cases += ['A I:25-II:25-III:25', 'B I:25', 'C I-II:25-III:25-IV:25-V:25']
+        for stepping in ['odometer', 'notched']:
+            for conf_str in cases:
+                if stepping == 'notched' and conf_str.count('-') > 2:
+                    continue
+                with self.subTest(i=(stepping, conf_str)):
+                    enigma = Enigma(stepping=stepping)
+                    enigma.set_configuration(conf_str)
+                    spec, cursor = MachineSpec.from_configuration(conf_str, stepping=stepping)
+
+                    self.assertEqual(enigma.encode('attackatdawn' * 200), spec.encode('attackatdawn' * 200, cursor))
+                    self.assertEqual(enigma.get_configuration().split(' ')[1], spec.get_configuration(cursor).split(' ')[1])
+                    self.assertEqual(spec, enigma.get_spec())
+
+    def test_threads(self):
+        spec, cursor = MachineSpec.from_configuration('B IV:3-II:17-VII:24 AB:CD:EF')
+        expected = spec.encode('attackatdawn' * 1000, cursor.copy())
+
+        results = []
+
+        def encode():
+            results.append(spec.encode('attackatdawn' * 1000, cursor.copy()))
+
+        threads = [threading.Thread(target=encode) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([expected] * 8, results)
+
+    def test_hashable(self):
+        first, _ = MachineSpec.from_configuration('B IV:3-II:17 AB')
+        second, _ = MachineSpec.from_configuration('B IV:10-II:0 AB')
+        self.assertEqual(first, second)
+        self.assertEqual(1, len({first, second}))
+
+    def test_cached_spec(self):
+        enigma = Enigma()
+        enigma.set_configuration('B IV:3-II:17 AB')
+        spec = enigma._get_cached_spec()
+        enigma.encode('hello world', save_state=True)
+        enigma.set_configuration('B IV:10-II:0 AB')
+        self.assertIs(spec, enigma._get_cached_spec())
+        enigma.set_configuration('B IV:10-II:0:1 AB')
+        self.assertIsNot(spec, enigma._get_cached_spec())
+
+
+class TestPermutation(unittest.TestCase):
+
+    def test_algebra(self):
+        p = Permutation.from_key('ekmflgdqvzntowyhxuspaibrcj')
+        q = Permutation.from_key('wyhxuspaibrcjekmflgdqvznto')
+        identity = Permutation.identity()
+
+        self.assertEqual(str(p), 'ekmflgdqvzntowyhxuspaibrcj')
+        self.assertEqual(p.then(q)[3], q[p[3]])
+        self.assertEqual(p * q, q.then(p))
+        self.assertEqual(p.then(p.inverse()), identity)
+        self.assertEqual(p ** p.order(), identity)
+        self.assertEqual(p ** -3, (p ** 3).inverse())
+        self.assertEqual(p.conjugate(5), Permutation.shift(5).then(p).then(Permutation.shift(-5)))
+        self.assertEqual(sum(p.cycle_type()), 26)
+        self.assertEqual(Permutation([1, 0, 2, 4, 3]).cycles(fixed_points=False), [(0, 1), (3, 4)])
+        self.assertEqual(Permutation([1, 0, 2]).fixed_points(), [2])
+        self.assertTrue(Reflector.B().permutation().is_involution())
+
+        with self.assertRaises(ValueError):
+            Permutation([0, 0, 1])
+
+    def test_machine(self):
+        conf_str = 'B-thin Beta:3-III:4:2-I:17-II:9 AQ:EZ'
+        reflector, rotors_list, plugboard = parse_configuration(conf_str)
+
+        enigma = Enigma(rotors=rotors_list, reflector=reflector, plugboard=plugboard)
+        enigma.first_rotor.shift()
+        machine = plugboard.permutation()
+        for rotor in enigma.get_rotors_list():
+            machine = machine.then(rotor.permutation())
+        machine = machine.then(reflector.permutation())
+        for rotor in enigma.get_rotors_list(reverse=True):
+            machine = machine.then(rotor.permutation().inverse())
+        machine = machine.then(plugboard.permutation())
+
+        spec, cursor = MachineSpec.from_configuration(conf_str)
+        self.assertEqual(machine, spec.permutation([rotor.pos for rotor in enigma.get_rotors_list()]))
+        self.assertEqual(machine.fixed_points(), [])
+
+        # letter j of message is encoded at state (start + j + 1)
+        spec, cursor = MachineSpec.from_configuration('B III:4-I:17-II:9 AQ:EZ')
+        permutations = spec.permutations()
+        indices = prepare_string('hello world').encode('ascii').translate(LETTER_TO_INDEX)
+        start = position_index(cursor.positions)
+        self.assertEqual(permutations.apply(indices, start + 1), spec.encode_indices(indices, cursor.copy()))
+        self.assertEqual(permutations[start + 1], spec.permutation([10, 17, 4]))
+
+        shifted = permutations.then(Permutation.shift(1))
+        self.assertEqual(shifted[7], permutations[7].then(Permutation.shift(1)))
+        # machine is involution at each state
+        self.assertEqual(permutations.inverse()[7], permutations[7])
+
+        batch = PermutationBatch.from_permutations([Permutation.shift(1), Permutation.shift(2)])
+        self.assertEqual(batch.apply_all(bytes([0, 25])), [bytes([1, 0]), bytes([2, 1])])
+
+
+class TestPickling(unittest.TestCase):
+
+    def test_round_trip(self):
+        for conf_str, stepping in [('B-thin Beta:3:1-III:4:2-I:17-II:9 AQ:EZ:KM', 'odometer'),
+                                   ('B III:4-II:3-I:16 AQ', 'notched')]:
+            with self.subTest(conf_str=conf_str, stepping=stepping):
+                enigma = Enigma(stepping=stepping)
+                enigma.set_configuration(conf_str)
+                enigma.encode('hello world')
+
+                restored = pickle.loads(pickle.dumps(enigma))
+                # letters of plugpair are a set, so configuration string may list them in other order
+                self.assertEqual(restored.get_spec(), enigma.get_spec())
+                self.assertEqual(restored.get_cursor().positions, enigma.get_cursor().positions)
+                self.assertEqual(restored.metrics.to_dict(), enigma.metrics.to_dict())
+                self.assertEqual(restored.encode('weather report ' * 10), enigma.encode('weather report ' * 10))
+                self.assertLess(len(pickle.dumps(enigma)), 400)
+
+    def test_custom_wirings(self):
+        rotor = Rotor(pos=3, key='qwertyuiopasdfghjklzxcvbnm', num='X', notches='ab', ring=5)
+        reflector = Reflector(key='abcdefghijklmnopqrstuvwxyz'[::-1], num='R')
+        enigma = Enigma(rotors=[Rotor.I(pos=2), rotor], reflector=reflector)
+        restored = pickle.loads(pickle.dumps(enigma))
+        self.assertEqual(restored.first_rotor.coding_list, rotor.coding_list)
+        self.assertEqual(restored.first_rotor.notches, rotor.notches)
+        self.assertEqual(restored.encode('hello world'), enigma.encode('hello world'))
+
+        # no recursion through linked list of rotors
+        enigma = Enigma(rotors=[Rotor.I(pos=i % 26) for i in range(2000)])
+        self.assertEqual(len(pickle.loads(pickle.dumps(enigma)).get_rotors_list()), 2000)
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_counters(self):
+        for stepping in ['odometer', 'notched']:
+            with self.subTest(i=stepping):
+                enigma = Enigma(stepping=stepping)
+                enigma.set_configuration('B I:3-II:25-III:20')
+                enigma.encode('a' * 2000)
+                enigma.encode('b' * 300, save_state=True)
+
+                # count carries key by key
+                reference = Enigma(stepping=stepping)
+                reference.set_configuration('B I:3-II:25-III:20')
+                rotors_list = reference.get_rotors_list()
+                carries = [0, 0]
+                for _ in range(2300):
+                    positions = [rotor.pos for rotor in rotors_list]
+                    reference.encode('a')
+                    for i in range(2):
+                        if stepping == 'notched':
+                            carries[i] += positions[i] in rotors_list[i].notches
+                        else:
+                            carries[i] += positions[i + 1] != rotors_list[i + 1].pos
+
+                self.assertEqual(2300, enigma.metrics.chars_encoded)
+                self.assertEqual(1, enigma.metrics.configuration_parses)   # save_state doesn't parse again
+                self.assertEqual(carries, enigma.metrics.carries)
+
+    def test_prometheus(self):
+        timer = PhaseTimer()
+        with timer.phase('encode'):
+            Enigma().encode('hello')
+        with timer.phase('encode'):
+            pass
+
+        text = timer.to_prometheus()
+        self.assertIn('# TYPE enigma_phase_wall_seconds gauge', text)
+        self.assertEqual(1, text.count('enigma_phase_cpu_seconds{phase="encode"}'))
+
+        enigma = Enigma()
+        enigma.encode('a' * 30)
+        text = enigma.metrics.to_prometheus()
+        self.assertIn('enigma_chars_encoded_total 30\n', text)
+        self.assertIn('enigma_rotor_carries_total{rotor="0"} 1\n', text)
+        self.assertNotIn('memo', text)
+
+    def test_memo_counters(self):
+        enigma = Enigma(memo=EncodeMemo())
+        for _ in range(3):
+            enigma.encode('hello', save_state=True)
+
+        counters = enigma.metrics.to_dict()['memo']
+        self.assertEqual((2, 1), (counters['hits'], counters['misses']))
+        text = enigma.metrics.to_prometheus()
+        self.assertIn('enigma_memo_hits_total 2\n', text)
+        self.assertIn('enigma_memo_misses_total 1\n', text)
+        self.assertIn(f'enigma_memo_hit_rate {2 / 3}\n', text)
+
+        enigma.memo = None
+        self.assertNotIn('memo', enigma.metrics.to_dict())
+
+
+class TestEnigmaAdvance(unittest.TestCase):
+
+    def test_advance(self):
+        for steps in [0, 1, 25, 26, 27, 676, 1000, 17576, 20000]:
+            with self.subTest(i=steps):
+                stepped = Enigma()
+                stepped.set_configuration('B IV:3-II:25-VII:24')
+                stepped.encode('a' * steps)
+
+                advanced = Enigma()
+                advanced.set_configuration('B IV:3-II:25-VII:24')
+                advanced.advance(steps)
+
+                self.assertEqual(stepped.get_configuration(), advanced.get_configuration())
+
+
+class TestEncodeMemo(unittest.TestCase):
+
+    def test_memoized_encode(self):
+        for stepping in ['odometer', 'notched']:
+            with self.subTest(stepping=stepping):
+                memo = EncodeMemo()
+                enigma = Enigma(stepping=stepping, memo=memo)
+                enigma.set_configuration('B III:4-I:17-II:9 AQ:EZ')
+                plain = Enigma(stepping=stepping)
+                plain.set_configuration('B III:4-I:17-II:9 AQ:EZ')
+
+                for text, save_state in [('Hello, World!', True), ('Hello, World!', True), ('hello world', False),
+                                         ('Status OK', False), ('Hello, World!', False)]:
+                    self.assertEqual(enigma.encode(text, save_state=save_state, keep_spaces=True, keep_case=True),
+                                     plain.encode(text, save_state=save_state, keep_spaces=True, keep_case=True))
+                    self.assertEqual(enigma.get_configuration(), plain.get_configuration())
+
+                # the second and the third texts have the same letters at the same positions as the first one
+                self.assertEqual(memo.hits, 2)
+                self.assertEqual(memo.misses, 3)
+
+    def test_eviction(self):
+        memo = EncodeMemo(max_entries=2)
+        enigma = Enigma(memo=memo)
+        for text in ['a', 'b', 'c']:
+            enigma.encode(text, save_state=True)
+        self.assertEqual((len(memo), memo.evictions), (2, 1))
+        enigma.encode('a', save_state=True)
+        self.assertEqual(memo.hits, 0)
+
+        memo = EncodeMemo(max_bytes=1000)
+        Enigma(memo=memo).encode('a' * 2000)
+        Enigma(memo=memo).encode('a' * 500)
+        self.assertEqual(len(memo), 1)
+        self.assertLessEqual(memo.size, 1000)
+
+
+class TestNotchedStepping(unittest.TestCase):
+
+    def test_double_stepping(self):
+        # rotors I-II-III at "ADU" => "ADV" => "AEW" => "BFX"
+        enigma = Enigma(stepping='notched')
+        enigma.set_configuration('B I:0-II:3-III:20')
+
+        for positions in ['I:0-II:3-III:21', 'I:0-II:4-III:22', 'I:1-II:5-III:23']:
+            with self.subTest(i=positions):
+                enigma.encode('a')
+                self.assertEqual(positions, enigma.get_configuration().split(' ')[1])
+
+    def test_double_stepping_schedule(self):
+        # middle rotor steps twice in a row at its notch ("E"), and the period of I-II-III is 26 * 25 * 26
+        notches = tuple(Rotor.by_num(num).notches for num in ['III', 'II', 'I'])
+        schedule = get_schedule((20, 3, 0), notches)
+        expected = [(20, 3, 0), (21, 3, 0), (22, 4, 0), (23, 5, 1), (24, 5, 1)]
+        self.assertEqual(expected, [schedule.positions_at(offset) for offset in range(5)])
+        self.assertEqual((0, 0), schedule.carries_at(0))
+        self.assertEqual((1, 1), schedule.carries_at(3))
+        self.assertEqual(16900, schedule.period)
+
+    def test_step_table(self):
+        notches = tuple(Rotor.by_num(num).notches for num in ['VI', 'IV', 'II'])
+        for start in [(0, 0, 0), (12, 9, 4), (25, 4, 25), (3, 25, 13)]:
+            with self.subTest(i=start):
+                schedule = get_schedule(start, notches)
+                positions = start
+                for offset in range(2000):
+                    self.assertEqual(positions, schedule.positions_at(offset))
+                    positions = notched_step(positions, notches)
+                self.assertEqual(schedule.positions_at(schedule.cycle_start),
+                                 schedule.positions_at(schedule.cycle_start + schedule.period))
+
+    def test_advance(self):
+        for steps in [1, 25, 650, 16900, 20000]:
+            with self.subTest(i=steps):
+                stepped = Enigma(stepping='notched')
+                stepped.set_configuration('B VI:3-II:25-VIII:12')
+                stepped.encode('a' * steps)
+
+                advanced = Enigma(stepping='notched')
+                advanced.set_configuration('B VI:3-II:25-VIII:12')
+                advanced.advance(steps)
+
+                self.assertEqual(stepped.get_configuration(), advanced.get_configuration())
+
+    def test_encrypt(self):
+        enigma = Enigma(stepping='notched')
+        enigma.set_configuration('C V:4-III:21-I:16 AB:CD')
+        enc = enigma.encode('attackatdawn' * 100, save_state=True)
+        self.assertEqual('attackatdawn' * 100, enigma.encode(enc))
+
+    def test_too_many_rotors(self):
+        # Greek rotor doesn't step, so 'B-thin Beta-I-II-III' is allowed
+        enigma = Enigma(stepping='notched')
+        enigma.set_configuration('B-thin Beta:3-I:1-II:2-III:3')
+
+        with self.assertRaises(ValueError):
+            enigma.set_configuration('A I:1-II:2-III:3-IV:4')
+        with self.assertRaises(ValueError):
+            Enigma(rotors=[Rotor.by_num(num) for num in ['I', 'II', 'III', 'IV']], stepping='notched')
+        with self.assertRaises(InvalidArguments):
+            run_csv(['-c', 'name', '-cnfg', 'A I:1-II:2-III:3-IV:4', '--notched'])
+
+
+class TestSweep(unittest.TestCase):
+
+    def test_outputs(self):
+        message = 'Sweep over all start positions'
+        sweep = Sweep.from_configuration('B III-I-II AQ:EZ', message)
+        self.assertEqual(len(sweep.outputs), 26 ** 3 * len(prepare_string(message)))
+
+        enigma = Enigma()
+        for positions in [(0, 0, 0), (25, 25, 25), (24, 25, 25), (7, 13, 2)]:
+            with self.subTest(positions=positions):
+                enigma.set_configuration(f'B III:{positions[2]}-I:{positions[1]}-II:{positions[0]} AQ:EZ')
+                self.assertEqual(sweep.output(positions), enigma.encode(message))
+
+    def test_scores(self):
+        sweep = Sweep.from_configuration('A II-V', 'aaaa')
+        scores = sweep.scores(lambda indices: indices.count(0))
+        self.assertEqual(len(scores), 26 ** 2)
+        self.assertEqual(scores[position_index([3, 4])], sweep.output([3, 4]).count('a'))
+
+
+class TestTableCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = set_table_cache(self.directory.name)
+
+    def tearDown(self):
+        set_table_cache(None)
+        self.directory.cleanup()
+
+    def test_cached_tables(self):
+        conf_str = 'B III:1-I:2-II:3 AQ:EZ'
+        message = 'Tables are memory-mapped from cache'
+        expected = MachineSpec.from_configuration(conf_str)[0]._compile_state_table()
+
+        for attempt in range(2):
+            with self.subTest(attempt=attempt):
+                spec, cursor = MachineSpec.from_configuration(conf_str)
+                self.assertEqual(bytes(spec.state_table()), expected)
+                self.assertEqual(spec.encode(message, cursor), reference_encode(conf_str, message)[0])
+                self.assertEqual(len(os.listdir(self.directory.name)), 2)
+
+    def test_invalid_files(self):
+        spec, _ = MachineSpec.from_configuration('A II-V')
+        expected = bytes(spec.state_table())
+        path = self.cache.path(spec.table_key(), 'states')
+
+        for name, content in [('truncated', b'YB'), ('version', TABLES_HEADER.pack(b'YBET', 0, len(expected)) + expected)]:
+            with self.subTest(name=name):
+                with open(path, 'wb') as file:
+                    file.write(content)
+                self.assertEqual(bytes(spec.state_table()), expected)
+                self.assertEqual(os.path.getsize(path), TABLES_HEADER.size + len(expected))
+
+    def test_eviction(self):
+        for i, key in enumerate(['a', 'b', 'c']):
+            self.cache.get(key, 'test', lambda: bytes(1000))
+            os.utime(self.cache.path(key, 'test'), (i, i))
+
+        cache = TableCache(self.directory.name, max_size=2500)
+        cache.get('a', 'test', lambda: bytes(1000))  # used again: 'b' is the least recently used now
+        cache.get('d', 'test', lambda: bytes(1000))
+        self.assertEqual(sorted(os.listdir(self.directory.name)), ['a-test.tbl', 'd-test.tbl'])
+
+
+class TestMachinePool(unittest.TestCase):
+
+    def test_sessions(self):
+        pool = MachinePool()
+        configurations = list(generate_configurations(20, 3, 10, seed=4))
+        sessions = [pool.alloc_configuration(conf_str) for conf_str in configurations * 2]
+        self.assertEqual(len(pool.specs), len(configurations))
+        self.assertLessEqual(pool.session_size, 16)
+
+        message = 'Hello, pooled World'
+        encoded = pool.encode_many(sessions, [message[:5]] * len(sessions))
+        encoded = [a + b for a, b in zip(encoded, pool.encode_many(sessions, [message[5:]] * len(sessions)))]
+        for conf_str, result in zip(configurations * 2, encoded):
+            with self.subTest(conf_str=conf_str):
+                self.assertEqual(result, reference_encode(conf_str, message)[0])
+
+        pool.free(sessions[3])
+        self.assertEqual(len(pool), len(sessions) - 1)
+        with self.assertRaises(KeyError):
+            pool.encode(sessions[3], message)
+        self.assertEqual(pool.alloc_configuration('A I-II'), sessions[3])
+        self.assertEqual(pool.get_configuration(sessions[3]), 'A I:0-II:0')
+
+    def test_notched(self):
+        pool = MachinePool()
+        conf_str = 'B III:10-II:3-I:20'
+        session = pool.alloc_configuration(conf_str, 'notched')
+        message = 'a' * 700
+        encoded = pool.encode_many([session, session], [message[:300], message[300:]])
+        self.assertEqual(''.join(encoded), reference_encode(conf_str, message, 'notched')[0])
+
+        # every session at its own start, all stepped by one shared table
+        configurations = [f'B III:{i % 26}-II:{i // 26 % 26}-I:{i // 7 % 26}' for i in range(200)]
+        sessions = [pool.alloc_configuration(conf_str, 'notched') for conf_str in configurations]
+        encoded = pool.encode_many(sessions, [message[:40]] * len(sessions))
+        encoded = [a + b for a, b in zip(encoded, pool.encode_many(sessions, [message[40:90]] * len(sessions)))]
+        for conf_str, result in zip(configurations, encoded):
+            with self.subTest(conf_str=conf_str):
+                self.assertEqual(result, reference_encode(conf_str, message[:90], 'notched')[0])
+
+    def test_unknown_session(self):
+        pool = MachinePool()
+        session = pool.alloc_configuration('B III:10-II:3-I:20')
+        for unknown in [session + 1, -1]:
+            with self.subTest(i=unknown):
+                with self.assertRaises(KeyError):
+                    pool.encode_many([session, unknown], ['hello', 'world'])
+        self.assertEqual('B III:10-II:3-I:20', pool.get_configuration(session))   # nothing is encoded
+        pool.free(session)
+        with self.assertRaises(KeyError):
+            pool.encode_many([session], ['hello'])
+
+
+class TestDecodeRange(unittest.TestCase):
+
+    plaintext = 'Hello, World!\nAttack at dawn; retreat at dusk.\n' * 40
+
+    def setUp(self):
+        self.enigma = Enigma()
+        self.enigma.set_configuration('C III:7-I:25-V:13 AQ:WE')
+
+    def test_range_with_index(self):
+        # keep everything except letters, as '--keep-spaces --keep-special --keep-new-line' does
+        ciphertext = ''.join(
+            self.enigma.encode(char, save_state=False) if char.isalpha() else char for char in self.plaintext
+        ).encode('ascii')
+        self.enigma.set_configuration('C III:7-I:25-V:13 AQ:WE')
+
+        file = io.BytesIO(ciphertext)
+        index = RangeIndex.build(file, stride=64)
+        for start, end in [(0, 10), (5, 200), (63, 64), (64, 1000), (1500, len(ciphertext))]:
+            with self.subTest(i=(start, end)):
+                decoded = decode_range(file, start, end, self.enigma, index=index)
+                self.assertEqual(self.plaintext[start:end].lower(), decoded.decode('ascii'))
+                self.assertEqual('III:7-I:25-V:13', self.enigma.get_configuration().split(' ')[1])
+
+    def test_range_dense(self):
+        plaintext = 'attackatdawn' * 100
+        ciphertext = self.enigma.encode(plaintext, save_state=True).encode('ascii')
+
+        decoded = decode_range(io.BytesIO(ciphertext), 333, 777, self.enigma)
+        self.assertEqual(plaintext[333:777], decoded.decode('ascii'))
+
+    def test_range_keep_case(self):
+        ciphertext = self.enigma.encode(self.plaintext, save_state=True, keep_spaces=True, keep_new_line=True,
+                                        keep_special=True, keep_case=True).encode('ascii')
+
+        file = io.BytesIO(ciphertext)
+        index = RangeIndex.build(file, stride=64)
+        for start, end in [(0, 10), (7, 300), (1000, len(ciphertext))]:
+            with self.subTest(i=(start, end)):
+                decoded = decode_range(file, start, end, self.enigma, index=index, keep_case=True)
+                self.assertEqual(self.plaintext[start:end], decoded.decode('ascii'))
+
+    def test_state_restored_on_error(self):
+        class BrokenFile(io.BytesIO):
+            def read(self, *args):
+                raise OSError('read error')
+
+        with self.assertRaises(OSError):
+            decode_range(BrokenFile(b'abcdef' * 10), 30, 40, self.enigma)
+        self.assertEqual('III:7-I:25-V:13', self.enigma.get_configuration().split(' ')[1])
+
+
+class TestByteEnigma(unittest.TestCase):
+
+    def test_encode(self):
+        cases = [(256, [255, 255, 3]), (256, [7]), (26, [25, 25, 25]), (10, [3, 9])]
+        for size, positions in cases:
+            with self.subTest(i=(size, positions)):
+                enigma = ByteEnigma.from_key('key', rotors_amount=len(positions), plugpairs_amount=3, size=size)
+                enigma.positions = list(positions)
+                reference = ByteEnigma.from_key('key', rotors_amount=len(positions), plugpairs_amount=3, size=size)
+                reference.positions = list(positions)
+
+                data = bytes(i * 7 % size for i in range(size * 300))
+                encoded = enigma.encode(data)
+                self.assertEqual(bytes(reference.encode_symbol(symbol) for symbol in data), encoded)
+                self.assertEqual(reference.positions, enigma.positions)
+
+    def test_decode(self):
+        enigma = ByteEnigma.from_key(b'key', plugpairs_amount=100)
+        data = bytes(range(256)) * 1000
+        encoded = enigma.encode(data, save_state=True)
+        self.assertEqual(data, enigma.encode(encoded))
+
+    def test_errors(self):
+        enigma = ByteEnigma.from_key(1, size=26)
+        self.assertRaises(ValueError, enigma.encode, b'z')
+        self.assertRaises(ValueError, ByteEnigma.from_key, 1, size=25)
+
+
+class TestKeygen(unittest.TestCase):
+
+    def test_valid(self):
+        for conf_str in generate_configurations(500, rotors_amount=8, plugpairs_amount=13, seed=1):
+            with self.subTest(i=conf_str):
+                reflector, rotors_list, plugboard = parse_configuration(conf_str)
+                self.assertEqual(8, len({rotor.num for rotor in rotors_list}))
+                self.assertEqual(13, len(plugboard.pairs))
+
+    def test_positions(self):
+        positions = set()
+        for conf_str in generate_configurations(2000, rotors_amount=1, plugpairs_amount=0, seed=1):
+            positions.add(int(conf_str.split(' ')[1].split(':')[1]))
+        self.assertEqual(set(range(26)), positions)
+
+    def test_unique(self):
+        # 3 reflectors * 8 rotors * 26 positions
+        keys = list(generate_configurations(624, rotors_amount=1, plugpairs_amount=0, seed=1, unique=True))
+        self.assertEqual(624, len(set(keys)))
+        self.assertRaises(ValueError, list, generate_configurations(625, rotors_amount=1, plugpairs_amount=0, unique=True))
+
+    def test_keysheet(self):
+        first, second = io.StringIO(), io.StringIO()
+        write_keysheet(first, 100, seed='seed')
+        write_keysheet(second, 100, seed='seed')
+        self.assertEqual(first.getvalue(), second.getvalue())
+        self.assertEqual(100, len(first.getvalue().splitlines()))
+
+
+class TestKeyspace(unittest.TestCase):
+
+    def test_round_trip(self):
+        keyspaces = [Keyspace(), Keyspace(3, plugpairs=6), Keyspace(1, plugpairs=0), Keyspace(4, plugpairs=[0, 10, 13], rings=True),
+                     Keyspace(3, greek=True), Keyspace(3, plugpairs=2, rings=True, greek=True)]
+        rng = random.Random(1)
+        for keyspace in keyspaces:
+            for n in [0, keyspace.size - 1] + [rng.randrange(keyspace.size) for _ in range(300)]:
+                with self.subTest(rotors=keyspace.rotors_amount, rings=keyspace.rings, greek=keyspace.greek, n=n):
+                    conf_str = keyspace.unrank(n)
+                    validate_configuration_string(conf_str)
+                    parse_configuration(conf_str)
+                    self.assertEqual(n, keyspace.rank(conf_str))
+
+    def test_size(self):
+        self.assertEqual(keyspace_size(3, 6), Keyspace(3, plugpairs=6).size)
+        self.assertEqual(sum(keyspace_size(3, k) for k in range(14)), Keyspace().size)
+        self.assertEqual(8, Keyspace(3, plugpairs=6).byte_length)
+        # every plugboard with one pair is unranked once
+        keyspace = Keyspace(1, plugpairs=1)
+        self.assertEqual(325, len({keyspace.unrank(n * 26).split(' ')[2] for n in range(325)}))
+
+    def test_canonical(self):
+        keyspace = Keyspace(3, plugpairs=2, rings=True)
+        rank = keyspace.rank('B III:4:0-I:17:3-II:9 ZE:QA')
+        self.assertEqual('B III:4-I:17:3-II:9 AQ:EZ', keyspace.unrank(rank))
+        # consecutive ranks are consecutive states of odometer
+        self.assertEqual('B III:4-I:18:3-II:0 AQ:EZ', keyspace.unrank(rank + 17))
+
+    def test_invalid(self):
+        keyspace = Keyspace(3, plugpairs=[0, 1])
+        for conf_str in ['B III:4-I:17', 'B III:4-I:17-III:9', 'B III:26-I:17-II:9', 'B III:4:1-I:17-II:9',
+                         'B III-I-II AQ:EZ', 'B III-I-II AA', 'B III-I-II AQ:QZ', 'B-thin III-I-II',
+                         'B Beta-III-I-II', 'B III:x-I-II', 'B']:
+            with self.subTest(conf_str=conf_str):
+                self.assertRaises(ValueError, keyspace.rank, conf_str)
+                self.assertNotIn(conf_str, keyspace)
+        self.assertIn('B III-I-II AQ', keyspace)
+        self.assertRaises(ValueError, Keyspace(greek=True).rank, 'B-thin III-I-II')
+        self.assertRaises(ValueError, keyspace.unrank, keyspace.size)
+        self.assertRaises(ValueError, keyspace.unrank, -1)
+        self.assertRaises(ValueError, Keyspace, 9)
+        self.assertRaises(ValueError, Keyspace, 3, 14)
+
+    def test_bytes(self):
+        keyspace = Keyspace()
+        conf_str = 'C VIII:25-VII:25-VI:25 AZ:BY:CX:DW:EV:FU:GT:HS:IR:JQ:KP:LO:MN'
+        key = keyspace.to_bytes(conf_str)
+        self.assertEqual(keyspace.byte_length, len(key))
+        self.assertEqual(conf_str, keyspace.from_bytes(key))
+        self.assertLess(keyspace.to_bytes('A I-II-III'), key)
+
+    def test_ranges(self):
+        keyspace = Keyspace()
+        shards = keyspace.ranges(7)
+        self.assertEqual(0, shards[0].start)
+        self.assertEqual(keyspace.size, shards[-1].stop)
+        for first, second in zip(shards, shards[1:]):
+            self.assertEqual(first.stop, second.start)
+        self.assertRaises(ValueError, keyspace.ranges, 0)
+
+    def test_sample(self):
+        keyspace = Keyspace(1, plugpairs=0)
+        self.assertEqual(keyspace.sample(10, seed=1), keyspace.sample(10, seed=1))
+        conf_strs = keyspace.sample(5000, seed=1)
+        self.assertTrue(all(conf_str in keyspace for conf_str in conf_strs))
+        self.assertEqual(set(range(26)), {int(conf_str.split(':')[1]) for conf_str in conf_strs})
+
+
+class TestHarness(unittest.TestCase):
+
+    def test_engines(self):
+        self.assertEqual(check_engines(30, seed=1, max_length=1000), [])
+
+    def test_reference(self):
+        # reference steps by its own model of pawls: "ADU" => "ADV" => "AEW" => "BFX"
+        self.assertEqual((23, 5, 1), reference_encode('B I:0-II:3-III:20', 'aaa', 'notched')[1])
+        # Greek rotor is passed by letter, not folded into reflector
+        conf_str = 'B-thin Beta:2:1-II:10:4-I:3-III:20 AB:CD'
+        spec, cursor = MachineSpec.from_configuration(conf_str)
+        self.assertEqual(spec.encode('attackatdawn', cursor), reference_encode(conf_str, 'attackatdawn')[0])
+
+    def test_baselines(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'baselines.json')
+            self.assertEqual(check_baselines(path, length=1000, repeats=1), {})
+            self.assertTrue(os.path.exists(path))
+
+            with open(path, 'w') as file:
+                json.dump({'spec': float('inf')}, file)
+            self.assertEqual(list(check_baselines(path, length=1000, repeats=1)), ['spec'])
+
+
+class TestPlugboardSolver(unittest.TestCase):
+    plaintext = textwrap.dedent("""\
+        It was the best of times, it was the worst of times, it was the age of wisdom, it was the age of foolishness,
+        it was the epoch of belief, it was the epoch of incredulity, it was the season of Light, it was the season
+        of Darkness, it was the spring of hope, it was the winter of despair, we had everything before us, we had
+        nothing before us, we were all going direct to Heaven, we were all going direct the other way""")
+
+    def test_solve(self):
+        conf_str = 'B III:4-I:17-II:9 AQ:BN:CV:EZ:HM:KT:LX:PW'
+        enigma = Enigma()
+        enigma.set_configuration(conf_str)
+        ciphertext = enigma.encode(self.plaintext)
+
+        solver = PlugboardSolver.from_configuration(conf_str, ciphertext, NgramScorer.from_text(self.plaintext))
+        _, plugboard = solver.solve(restarts=2, processes=1, seed=1)
+        self.assertEqual(sorted(plugboard.pairs, key=sorted), sorted(enigma.plugboard.pairs, key=sorted))
+
+    def test_decrypt(self):
+        conf_str = 'C II:20-V:3 AB:CD'
+        enigma = Enigma()
+        enigma.set_configuration(conf_str)
+        ciphertext = enigma.encode(self.plaintext)
+
+        solver = PlugboardSolver.from_configuration(conf_str, ciphertext, NgramScorer.from_text(''))
+        plugboard = bytes([1, 0, 3, 2]) + bytes(range(4, 26))
+        self.assertEqual(solver.decrypt(plugboard).translate(INDEX_TO_LETTER).decode('ascii'), prepare_string(self.plaintext))
+
+
+class TestSearchJob(unittest.TestCase):
+
+    def setUp(self):
+        enigma = Enigma()
+        enigma.set_configuration('C V:11')
+        self.ciphertext = enigma.encode(TestPlugboardSolver.plaintext)
+        self.scorer = NgramScorer.from_text(TestPlugboardSolver.plaintext)
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_search(self):
+        job = SearchJob(self.ciphertext, self.scorer, os.path.join(self.directory.name, 'job.ckpt'), rotors_amount=1, top_k=3)
+        candidates = job.run(processes=1)
+        self.assertEqual(candidates[0][1], 'C V:11')
+        self.assertEqual(len(job.done), len(job.shards))
+        # positions are ranked by prefix, and candidates are scored by the whole ciphertext
+        plaintext = prepare_string(TestPlugboardSolver.plaintext).encode('ascii').translate(LETTER_TO_INDEX)
+        self.assertGreater(len(plaintext), SEARCH_PREFIX_LETTERS)
+        self.assertAlmostEqual(candidates[0][0], self.scorer.score(plaintext))
+
+    def test_resume(self):
+        full = SearchJob(self.ciphertext, self.scorer, os.path.join(self.directory.name, 'full.ckpt'), rotors_amount=1).run(processes=1)
+
+        class Interrupted(Exception):
+            pass
+
+        def interrupt(done, total):
+            if done == 5:
+                raise Interrupted()
+
+        path = os.path.join(self.directory.name, 'job.ckpt')
+        with self.assertRaises(Interrupted):
+            SearchJob(self.ciphertext, self.scorer, path, rotors_amount=1).run(processes=1, progress=interrupt)
+
+        job = SearchJob(self.ciphertext, self.scorer, path, rotors_amount=1)
+        self.assertTrue(job.load_checkpoint())
+        self.assertEqual(len(job.done), 5)
+        self.assertEqual(job.run(processes=1), full)
+
+        with self.assertRaises(ValueError):
+            SearchJob(self.ciphertext, self.scorer, path, rotors_amount=1, top_k=2).run(processes=1)
+
+
+class TestBombe(unittest.TestCase):
+
+    def test_stops(self):
+        conf_str = 'B III:4-I:17-II:9 AQ:EZ:KM:LT:BX:CW:FY:GO:HR:JS'
+        plaintext = 'weatherreportforthenorthseatodayisclearwithlightwinds'
+        enigma = Enigma()
+        enigma.set_configuration(conf_str)
+        ciphertext = enigma.encode(plaintext)
+
+        crib = plaintext[7:32]
+        self.assertIn(7, crib_offsets(ciphertext, crib))
+
+        bombe = Bombe(ciphertext, crib, offset=7, reflectors=['B'], rotor_nums=['I', 'II', 'III'])
+        self.assertGreater(len(bombe.walks), 0)
+        stops = bombe.run(processes=1)
+        self.assertIn('B III:4-I:17-II:9', [' '.join(stop.split(' ')[:2]) for stop in stops])
+
+        # pairs of stop are implied by crib, so they are the real ones
+        real_pairs = parse_configuration(conf_str)[2].pairs
+        stop = next(stop for stop in stops if stop.startswith('B III:4-I:17-II:9'))
+        for pair in parse_configuration(stop)[2].pairs:
+            self.assertIn(pair, real_pairs)
+
+    def test_crib_longer_than_period(self):
+        # one rotor: 26 states, so the crib wraps around the table
+        conf_str = 'B III:5 AQ:EZ'
+        plaintext = 'weatherreportforthenorthseatodayisclearwithlightwinds'
+        enigma = Enigma()
+        enigma.set_configuration(conf_str)
+        ciphertext = enigma.encode(plaintext)
+
+        bombe = Bombe(ciphertext, plaintext[:40], 0, 1, reflectors=['B'], rotor_nums=['III'])
+        stops = bombe.run(processes=1)
+        self.assertIn('B III:5', [' '.join(stop.split(' ')[:2]) for stop in stops])
+
+    def test_invalid_crib(self):
+        with self.assertRaises(ValueError):
+            Bombe('abcd', 'xbyz')
+        with self.assertRaises(ValueError):
+            Bombe('abcd', 'bcdab')
+
+
+class TestWiringSolver(unittest.TestCase):
+
+    def test_solve(self):
+        x_key, y_key = 'qwertyuiopasdfghjklzxcvbnm', 'mnbvcxzlkjhgfdsapoiuytrewq'
+        plaintext = 'weatherreportforthenorthseatodayisclearwithlightwindsfromthewest' * 3
+
+        def message(rotors_list):
+            enigma = Enigma(rotors=rotors_list, reflector=Reflector.B(), plugboard=Plugboard(pairs=[{'a', 'q'}, {'e', 'z'}]))
+            conf_str = enigma.get_configuration()
+            return plaintext, enigma.encode(plaintext), conf_str
+
+        messages = [
+            # X is the only unknown rotor, in each slot
+            message([Rotor(pos=3, key=x_key, num='X', ring=5), Rotor.I(pos=17), Rotor.II(pos=9)]),
+            message([Rotor.III(pos=1), Rotor(pos=20, key=x_key, num='X'), Rotor.II(pos=9)]),
+            message([Rotor.III(pos=1), Rotor.I(pos=2), Rotor(pos=11, key=x_key, num='X', ring=1)]),
+            # Y is recovered, when X is known
+            message([Rotor(pos=7, key=y_key, num='Y', ring=2), Rotor(pos=0, key=x_key, num='X'), Rotor.I(pos=4)]),
+            message([Rotor.IV(pos=7), Rotor(pos=4, key=x_key, num='X'), Rotor(pos=25, key=y_key, num='Y')]),
+        ]
+        solver = WiringSolver(messages, unknown=['X', 'Y', 'Z'])
+        self.assertEqual(solver.solve(), {'X': x_key, 'Y': y_key})
+        self.assertEqual(solver.solutions['X'], [x_key])
+        self.assertNotIn('Z', solver.solutions)
+
+        # too few letters: wiring is ambiguous
+        solver = WiringSolver([(text[:5], encoded[:5], conf_str) for text, encoded, conf_str in messages[:1]], unknown=['X'])
+        self.assertEqual(solver.solve(), {})
+        self.assertEqual(len(solver.solutions['X']), 2)
+
+
+class TestCorpusStats(unittest.TestCase):
+
+    def test_chunks(self):
+        text = TestPlugboardSolver.plaintext * 3
+        letters = prepare_string(text)
+
+        expected = CorpusStats(window=50)
+        expected.update(text)
+        self.assertEqual(expected.total, len(letters))
+        self.assertEqual(expected.top_trigrams(1), [('THE', letters.count('the'))])
+        self.assertEqual(len(expected.windows_ioc), len(letters) // 50)
+
+        for chunk_size in [1, 2, 7, 1000]:
+            with self.subTest(chunk_size=chunk_size):
+                stats = analyze_file(io.BytesIO(text.encode('utf-8')), window=50, chunk_size=chunk_size)
+                self.assertEqual(stats.to_dict(top=20), expected.to_dict(top=20))
+
+    def test_ioc(self):
+        self.assertEqual(index_of_coincidence([2, 0, 0]), 1.0)
+        self.assertEqual(index_of_coincidence([1, 1]), 0.0)
+        self.assertEqual(index_of_coincidence([1]), 0.0)
+
+
+class TestBatch(unittest.TestCase):
+
+    def test_batch(self):
+        keysheet = list(generate_configurations(3, seed=1))
+        jobs = [
+            {'id': 1, 'configuration': keysheet[0], 'text': 'Hello, World!'},
+            {'id': 2, 'key_id': 2, 'text': 'Hello, World!', 'keep_spaces': True, 'keep_special': True},
+            {'id': 3, 'configuration': keysheet[0], 'text': 'Hello, World!', 'groups': True},
+            {'id': 4, 'configuration': 'X I', 'text': 'a'},
+            {'id': 5, 'key_id': 3, 'text': 'a'},
+        ]
+        input_file = io.StringIO('\n'.join(json.dumps(job) for job in jobs) + '\n\nnot json\n')
+
+        for processes, memo_entries in [(1, 0), (2, 0), (1, 16), (2, 16)]:
+            with self.subTest(processes=processes, memo_entries=memo_entries):
+                input_file.seek(0)
+                output_file = io.StringIO()
+                memo_stats = {}
+                self.assertEqual(run_batch(input_file, output_file, jobs=processes, keysheet=keysheet,
+                                           memo_entries=memo_entries, memo_stats=memo_stats), 6)
+                results = [json.loads(line) for line in output_file.getvalue().splitlines()]
+
+                enigma = Enigma()
+                enigma.set_configuration(keysheet[0])
+                encoded = enigma.encode('Hello, World!', save_state=True)
+                enigma.set_configuration(keysheet[2])
+                kept = enigma.encode('Hello, World!', keep_spaces=True, keep_special=True)
+
+                self.assertEqual(results[0], {'id': 1, 'encoded': encoded})
+                self.assertEqual(results[1], {'id': 2, 'encoded': kept})
+                self.assertEqual(results[2], {'id': 3, 'encoded': format_output_string(encoded)})
+                self.assertEqual([result['id'] for result in results[3:5]], [4, 5])
+                self.assertTrue(all('error' in result for result in results[3:]))
+
+                # the 3rd job repeats the 1st one
+                if memo_entries:
+                    self.assertEqual(1, sum(counters['hits'] for counters in memo_stats.values()))
+                    self.assertEqual(2, sum(counters['misses'] for counters in memo_stats.values()))
+                else:
+                    self.assertEqual({}, memo_stats)
+
+
+class TestCsv(unittest.TestCase):
+
+    def test_encode_csv(self):
+        conf_str = 'B III:4-I:17-II:9 AQ:EZ'
+        table = 'id,name,city\r\n1,Alice Smith,Prague\r\n2,"O\'Neil, Pat",Brno\r\n3,Alice Smith,"multi\nline"\r\n4,Zoë\r\n'
+        for offset in ['row', 'hash']:
+            for processes in [1, 2]:
+                with self.subTest(offset=offset, processes=processes):
+                    output_file = io.StringIO(newline='')
+                    self.assertEqual(encode_csv(io.StringIO(table, newline=''), output_file, conf_str, ['name', 'city'],
+                                                offset=offset, jobs=processes), 4)
+                    rows = list(csv.reader(io.StringIO(output_file.getvalue(), newline='')))
+                    self.assertEqual([row[0] for row in rows], ['id', '1', '2', '3', '4'])
+                    self.assertNotEqual(rows[1][1], 'Alice Smith')
+                    self.assertEqual(rows[2][1][1], '\'')
+                    self.assertEqual(rows[4][1][-1], 'ë')
+                    # equal values are encoded equally only by hash offset
+                    self.assertEqual(rows[1][1] == rows[3][1], offset == 'hash')
+
+                    decoded_file = io.StringIO(newline='')
+                    encode_csv(io.StringIO(output_file.getvalue(), newline=''), decoded_file, conf_str, ['name', 'city'],
+                               offset=offset, jobs=processes)
+                    self.assertEqual(decoded_file.getvalue().replace('\r\n', '\n'), table.replace('\r\n', '\n'))
+
+        with self.assertRaises(ValueError):
+            encode_csv(io.StringIO(table), io.StringIO(), conf_str, ['surname'])
+
+    def test_jump(self):
+        for stepping in ['odometer', 'notched']:
+            with self.subTest(stepping=stepping):
+                encoder = ColumnEncoder('B III:4-I:17-II:9', [0], stepping=stepping)
+                enigma = Enigma(stepping=stepping)
+                enigma.set_configuration('B III:4-I:17-II:9')
+                enigma.advance(1000)
+                self.assertEqual(encoder.encode_cell('Hello, World', 1000), enigma.encode('Hello, World', keep_spaces=True,
+                                                                                         keep_special=True, keep_case=True))
+
+
+class TestStreams(unittest.TestCase):
+
+    def test_compressed_round_trip(self):
+        text = 'Hello, World!\n' * 10000
+        for compression in ['gzip', 'bz2', 'xz']:
+            with self.subTest(compression=compression):
+                raw = io.BytesIO()
+                destination = io.TextIOWrapper(raw, encoding='utf-8')
+                output = open_text_output(destination, compression)
+                output.write(text)
+                output.close()
+                self.assertEqual(detect_compression(raw.getvalue()), compression)
+
+                file = io.TextIOWrapper(io.BufferedReader(io.BytesIO(raw.getvalue())), encoding='utf-8')
+                text_file, detected = open_text_input(file)
+                self.assertEqual(detected, compression)
+                self.assertEqual(text_file.read(), text)
+
+    def test_plain_input(self):
+        file = io.TextIOWrapper(io.BufferedReader(io.BytesIO(b'hello')), encoding='utf-8')
+        text_file, compression = open_text_input(file)
+        self.assertIsNone(compression)
+        self.assertIs(text_file, file)
+        self.assertEqual(text_file.read(), 'hello')
+
+    def test_prefetch(self):
+        self.assertEqual(list(prefetch(range(100), size=2)), list(range(100)))
+
+        def failing():
+            yield 1
+            raise OSError('read error')
+
+        with self.assertRaises(OSError):
+            list(prefetch(failing()))
+
+        # consumer stops early
+        items = prefetch(iter(range(1000)), size=1)
+        self.assertEqual(next(items), 0)
+        items.close()
+
+
+class TestFormatOutput(unittest.TestCase):
+
+    def test_groups(self):
+        self.assertEqual(format_output_string('helloworld', 4), 'HELL OWOR LD')
+        self.assertEqual(format_output_string('lloworld', 4, start=2), 'LL OWOR LD')
+        self.assertEqual(format_output_string('world', 5, start=5), ' WORLD')
+
+    def test_by_parts(self):
+        string = 'enigmaiscoolandfast'
+        for cut in range(len(string) + 1):
+            with self.subTest(cut=cut):
+                by_parts = format_output_string(string[:cut]) + format_output_string(string[cut:], start=cut)
+                self.assertEqual(by_parts, format_output_string(string))
+
 
 class TestConfStringParse(unittest.TestCase):
 
@@ -92,7 +1141,13 @@ class TestConfStringParse(unittest.TestCase):
             ],
             "B I-II AB": [
                 'B', 'I:0-II:0', [{'a', 'b'}]
-            ]
+            ],
+            "B I:3:5-II:0:0": [
+                'B', 'I:3:5-II:0', []
+            ],
+            "B-thin Beta:2:1-I-II": [
+                'B-thin', 'I:0-II:0', []
+            ],
         }
 
         for string, result in cases.items():
@@ -114,6 +1169,10 @@ class TestConfStringParse(unittest.TestCase):
             "A I-II-III ABC:ER": InvalidConfigurationString,
             "A I-II AA": InvalidPlugboardPair,
             "A I-II AB:AD": NotUniquePair,
+            "A I:1:26": InvalidConfigurationString,
+            "B Beta-I-II": InvalidConfigurationString,
+            "B-thin I-Gamma-II": InvalidConfigurationString,
+            "C-thin Gamma": InvalidConfigurationString,
         }
 
         for string, exception in cases.items():
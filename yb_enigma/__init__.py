@@ -7,6 +7,26 @@ Classes:
     Rotor
     Reflector
     Plugboard
+    RangeIndex
+    ByteEnigma
+    MachineSpec
+    Permutation
+    PermutationBatch
+    Cursor
+    Metrics
+    PhaseTimer
+    NgramScorer
+    PlugboardSolver
+    Sweep
+    SearchJob
+    Bombe
+    WiringSolver
+    ColumnEncoder
+    CorpusStats
+    TableCache
+    MachinePool
+    EncodeMemo
+    Keyspace
 
 Functions:
 
@@ -14,6 +34,23 @@ Functions:
     format_output_string
     keep_only_alph
     prepare_string
+    keep_passthrough
+    position_index
+    crib_offsets
+    index_of_coincidence
+    analyze_file
+    run_batch
+    encode_csv
+    set_table_cache
+    detect_compression
+    open_text_input
+    open_text_output
+    prefetch
+    decode_range
+    generate_configurations
+    write_keysheet
+    check_engines
+    check_baselines
 
 
 Initialize by:
@@ -40,6 +77,9 @@ Initialize by:
            plugboard   = plugboard,
        )
 
+    5. ring settings (after positions) and four-rotor machine (thin reflector and non-stepping Greek rotor)
+       enigma.set_configuration("B-thin Beta:2:1-II:10:4-I:3-III:20 AB:CD")
+
 Get current configuration as configuration string:
     cnfg_string = enigma.get_configuration()
 
@@ -47,11 +87,106 @@ Encode string:
     // using 'save_state' parameter, you can define if enigma`s state will be changed after encoding, or saved as it was before
     encoded_string = enigma.encode('hello world', save_state=False)
 
+Encode string, keeping spaces, new lines, special characters and case of letters:
+    encoded_string = enigma.encode('Hello, World!', keep_spaces=True, keep_new_line=True, keep_special=True, keep_case=True)
+
 Set configuration by configuration string:
     enigma.set_configuration(cnfg_string)
 
 Decode string:
     decoded_string = enigma.encode(encoded_string)
+
+Decode bytes [start, end) of ciphertext file (without decoding anything before them):
+    with open(path, 'rb') as file:
+        decoded_bytes = decode_range(file, start, end, enigma, index=RangeIndex.load(path + '.idx'))
+
+Get counters (encoded characters, rotors carries, configuration parses):
+    enigma.metrics.to_dict()
+    enigma.metrics.to_prometheus()
+
+Share one machine between threads (immutable spec + own cursor in each thread):
+    spec, cursor = MachineSpec.from_configuration(cnfg_string)
+    encoded_string = spec.encode('hello world', cursor)   // in other threads: spec.encode(string, spec.cursor(positions))
+
+Permutations (bytes-backed): composition, inverse, conjugation by shift, power, cycles:
+    rotor = Rotor.I(pos=3).permutation()            // also Reflector.permutation(), Plugboard.permutation()
+    machine = spec.permutation([3, 4, 5])           // the whole machine at positions
+    cycles = machine.cycles()
+    permutations = spec.permutations()              // all 26^N states at once (PermutationBatch)
+    encoded_indices = permutations.apply(indices, start=state + 1)
+
+Keep state of many sessions in flat arrays (tens of bytes per session, wirings are shared):
+    pool = MachinePool(max_rotors=4)
+    session = pool.alloc_configuration(cnfg_string)
+    encoded_string = pool.encode(session, 'hello world')
+    encoded_strings = pool.encode_many(sessions, strings)   // i-th string by i-th session
+    pool.free(session)
+
+Don't encode repeated messages again (the same text under the same key at the same positions), LRU memo:
+    memo = EncodeMemo(max_entries=4096, max_bytes=16 * 2 ** 20)
+    enigma = Enigma(memo=memo)                      // the same memo can be shared by many machines
+    memo.to_dict()                                  // entries, bytes, hits, misses, evictions, hit rate
+
+Rank configurations: bijection between keys and integers 0...size-1 (compact keys, shards of search, sampling):
+    keyspace = Keyspace(rotors_amount=3, plugpairs=6)  // also: plugpairs=None (any amount), rings=True, greek=True
+    rank = keyspace.rank('B III:4-I:17-II:9 AQ:BN:CV:EZ:HM:KT')
+    cnfg_string = keyspace.unrank(rank)             // canonical configuration string
+    key = keyspace.to_bytes(cnfg_string)            // 'keyspace.byte_length' bytes
+    shards = keyspace.ranges(8)                     // [range(...), ...] of ranks
+    cnfg_strings = keyspace.sample(100, seed=1)
+
+Check all engines against reference implementation, and their throughput against saved baselines:
+    mismatches = check_engines(count=100)
+    regressions = check_baselines('./baselines.json', threshold=0.8)
+
+Recover plugboard, when reflector, rotors and their positions are known (hill climbing in process pool):
+    scorer = NgramScorer.from_text(sample_text)
+    solver = PlugboardSolver.from_configuration('B III:4-I:17-II:9', ciphertext, scorer)
+    score, plugboard = solver.solve(restarts=8)
+
+Encode one message under all 26^N start positions of rotors (in one sweep over precomputed keystream):
+    sweep = Sweep.from_configuration('B III-I-II AQ:EZ', 'hello world')
+    encoded_string = sweep.output([3, 4, 5])        // positions from the first rotor to the last
+    scores = sweep.scores(scorer.score)             // array, indexed by 'position_index(positions)'
+
+Search for key (reflector, rotors order and positions) in process pool, resumable from checkpoint file:
+    job = SearchJob(ciphertext, scorer, './search.ckpt', rotors_amount=3, top_k=10)
+    candidates = job.run()                          // [(score, cnfg_string), ...], the best first
+
+Recover key from crib (known plaintext) at offset, testing all orders of rotors in process pool:
+    stops = Bombe(ciphertext, crib, offset=crib_offsets(ciphertext, crib)[0]).run()   // partial configuration strings
+
+Recover wirings of custom rotors from messages with known plaintext and key (unknown rotors are written by names):
+    solver = WiringSolver([(plaintext, ciphertext, 'B X:4-I:17-II:9 AQ:EZ'), ...], unknown=['X'])
+    wirings = solver.solve()                        // {'X': 'ekmflgdqvzntowyhxuspaibrcj'}, usable as Rotor(key=...)
+
+Get letter frequencies, index of coincidence and n-grams of large file (read by chunks):
+    with open(path, 'rb') as file:
+        stats = analyze_file(file, window=1000)     // window: also index of coincidence of each 1000 letters
+    stats.to_dict(top=10)
+
+Encode jobs from JSON lines file in process pool (results are written in the same order):
+    with open('./jobs.jsonl') as input_file, open('./results.jsonl', 'w') as output_file:
+        run_batch(input_file, output_file, jobs=4)
+
+Encode columns of CSV file (each cell at base configuration, moved by its row and column, or by hash):
+    with open('./table.csv', newline='') as input_file, open('./encoded.csv', 'w', newline='') as output_file:
+        encode_csv(input_file, output_file, cnfg_string, ['name', 'city'], offset='row', jobs=4)
+
+Cache compiled tables on disk, memory-mapped and shared by all processes (or set YB_ENIGMA_TABLE_CACHE):
+    set_table_cache('/var/cache/yb-enigma', max_size=256 * 2 ** 20)
+    table = spec.state_table()                      // built once, then memory-mapped from cache
+
+Read compressed (gzip, bz2, xz) text file by chunks, decompressed in background thread:
+    with open(path) as file:
+        text_file, compression = open_text_input(file)      // compression: None, if file isn't compressed
+        for chunk in prefetch(iter(lambda: text_file.read(65536), '')):
+            ...
+
+Encode binary data (256 symbols alphabet, wirings generated from key):
+    byte_enigma = ByteEnigma.from_key(b'secret key')
+    encoded_bytes = byte_enigma.encode(data, save_state=True)
+    decoded_bytes = byte_enigma.encode(encoded_bytes)
 """
 
 from .utils import *
@@ -61,3 +196,23 @@ from .reflector import *
 from .plugboard import *
 from .exceptions import *
 from .common import *
+from .ranges import *
+from .byte_enigma import *
+from .keygen import *
+from .keyspace import *
+from .permutation import *
+from .spec import *
+from .metrics import *
+from .memo import *
+from .tables import *
+from .streams import *
+from .pool import *
+from .harness import *
+from .solver import *
+from .sweep import *
+from .search import *
+from .bombe import *
+from .wiring import *
+from .analysis import *
+from .batch import *
+from .tabular import *
@@ -0,0 +1,185 @@
+"""
+Streaming statistics of texts: letter frequencies, index of coincidence and n-grams
+"""
+from collections import Counter
+
+from .common import ALPH
+from .ranges import NON_ALPH_BYTES
+from .solver import ngram_codes
+from .spec import LETTER_TO_INDEX
+from .utils import prepare_string
+
+# amount of bytes, read from file at once
+ANALYSIS_CHUNK_SIZE = 1 << 20
+
+
+def index_of_coincidence(counts: list[int]):
+    """Get index of coincidence: probability, that two random letters of text are the same.
+
+    Args:
+        counts (list[int]): Amount of each letter.
+
+    Returns:
+        float: Index of coincidence (0.0, if there are less than 2 letters).
+    """
+    total = sum(counts)
+    if total < 2:
+        return 0.0
+    return sum(count * (count - 1) for count in counts) / (total * (total - 1))
+
+
+def _ngram_string(code: int, n: int):
+    """Get n-gram by its code (see 'ngram_codes').
+
+    Args:
+        code (int): N-gram code.
+        n (int):    N-gram length.
+
+    Returns:
+        str: N-gram (upper-cased).
+    """
+    return ''.join(ALPH[(code >> (8 * i)) & 0xff] for i in range(n)).upper()
+
+
+class CorpusStats:
+    """Letter, bigram and trigram counts of text, which is added by parts (of any size).
+
+    Only english letters are counted, case-insensitively (as 'prepare_string' does).
+    All counting is done by C-level 'Counter' over bytes and arrays, without loops over characters.
+
+    Args:
+        window (int): Size of windows (in letters) for windowed index of coincidence. Default: don't compute it.
+
+    Attributes:
+        letters (list[int]):        Amount of each letter.
+        bigrams (Counter):          Amount of each bigram (by code, see 'ngram_codes').
+        trigrams (Counter):         Amount of each trigram (by code).
+        window (int):               Size of windows.
+        windows_ioc (list[float]):  Index of coincidence of each full window.
+    """
+
+    def __init__(self, window: int = None):
+        self.letters = [0] * len(ALPH)
+        self.bigrams = Counter()
+        self.trigrams = Counter()
+        self.window = window
+        self.windows_ioc = []
+
+        # the last letters of previous part: n-grams may cross parts boundary
+        self._tail = b''
+        self._window = b''
+
+    @property
+    def total(self):
+        """Amount of letters."""
+        return sum(self.letters)
+
+    def update(self, data):
+        """Add part of text.
+
+        Args:
+            data (str | bytes): Part of text.
+
+        Returns:
+            None
+        """
+        if isinstance(data, str):
+            indices = prepare_string(data).encode('ascii').translate(LETTER_TO_INDEX)
+        else:
+            indices = data.translate(None, NON_ALPH_BYTES).lower().translate(LETTER_TO_INDEX)
+        if not indices:
+            return
+
+        for index, count in Counter(indices).items():
+            self.letters[index] += count
+
+        self.bigrams.update(ngram_codes(self._tail[-1:] + indices, 2))
+        self.trigrams.update(ngram_codes(self._tail + indices, 3))
+        self._tail = (self._tail + indices)[-2:]
+
+        if self.window:
+            buffer = self._window + indices
+            full = len(buffer) - len(buffer) % self.window
+            for start in range(0, full, self.window):
+                counts = Counter(buffer[start:start + self.window]).values()
+                self.windows_ioc.append(index_of_coincidence(list(counts)))
+            self._window = buffer[full:]
+
+    def ioc(self):
+        """Get index of coincidence of the whole text.
+
+        Returns:
+            float: Index of coincidence.
+        """
+        return index_of_coincidence(self.letters)
+
+    def frequencies(self):
+        """Get relative frequency of each letter.
+
+        Returns:
+            dict[str, float]: Letter (upper-cased) => frequency.
+        """
+        total = self.total
+        return {char.upper(): (count / total if total else 0.0) for char, count in zip(ALPH, self.letters)}
+
+    def top_bigrams(self, amount: int = 10):
+        """Get the most common bigrams.
+
+        Args:
+            amount (int): Amount of bigrams.
+
+        Returns:
+            list[tuple[str, int]]: Bigram and its amount.
+        """
+        return [(_ngram_string(code, 2), count) for code, count in self.bigrams.most_common(amount)]
+
+    def top_trigrams(self, amount: int = 10):
+        """Get the most common trigrams.
+
+        Args:
+            amount (int): Amount of trigrams.
+
+        Returns:
+            list[tuple[str, int]]: Trigram and its amount.
+        """
+        return [(_ngram_string(code, 3), count) for code, count in self.trigrams.most_common(amount)]
+
+    def to_dict(self, top: int = 10):
+        """Get statistics as dictionary.
+
+        Args:
+            top (int): Amount of the most common bigrams and trigrams.
+
+        Returns:
+            dict: Statistics.
+        """
+        result = {
+            'letters': self.total,
+            'ioc': self.ioc(),
+            'frequencies': self.frequencies(),
+            'bigrams': self.top_bigrams(top),
+            'trigrams': self.top_trigrams(top),
+        }
+        if self.window:
+            result['windows_ioc'] = list(self.windows_ioc)
+        return result
+
+
+def analyze_file(file, window: int = None, chunk_size: int = ANALYSIS_CHUNK_SIZE):
+    """Get statistics of file, reading it by chunks (memory usage doesn't depend on file size).
+
+    Args:
+        file (BinaryIO):  File, opened in binary mode.
+        window (int):     Size of windows for windowed index of coincidence.
+        chunk_size (int): Amount of bytes, read at once.
+
+    Returns:
+        CorpusStats: Statistics.
+    """
+    stats = CorpusStats(window=window)
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            break
+        stats.update(chunk)
+    return stats
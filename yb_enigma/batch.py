@@ -0,0 +1,195 @@
+"""
+Batch encoding of JSON lines jobs
+"""
+import json
+import os
+from functools import lru_cache
+from multiprocessing import Pool
+
+from .enigma import Enigma
+from .memo import EncodeMemo
+from .exceptions import InvalidArguments, InvalidConfigurationString, InvalidPlugboardPair, NotUniquePair, NotFound
+from .stepping import ODOMETER, NOTCHED
+from .utils import format_output_string
+
+# options of job, passed to 'Enigma.encode'
+PASSTHROUGH_OPTIONS = ['keep_spaces', 'keep_new_line', 'keep_special', 'keep_case']
+
+# errors of one job, which are written to its result (instead of stopping the whole batch)
+JOB_ERRORS = (InvalidArguments, InvalidConfigurationString, InvalidPlugboardPair, NotUniquePair, NotFound,
+              ValueError, TypeError, AttributeError)
+
+# amount of jobs, sent to worker process at once
+BATCH_CHUNK_SIZE = 64
+
+# amount of results, written between flushes of output file
+BATCH_FLUSH_LINES = 1024
+
+
+@lru_cache(maxsize=256)
+def _machine(conf_str: str, stepping: str):
+    """Get (cached) Enigma with parsed configuration and cursor at its start positions.
+
+    Args:
+        conf_str (str): Configuration string.
+        stepping (str): Rotors stepping mode.
+
+    Returns:
+        tuple[Enigma, Cursor]: Enigma and cursor.
+    """
+    enigma = Enigma(stepping=stepping)
+    enigma.set_configuration(conf_str)
+    return enigma, enigma.get_cursor()
+
+
+def encode_job(job: dict, keysheet: list[str] = None, memo: EncodeMemo = None):
+    """Encode text of one job.
+
+    Job keys:
+        configuration (str): Configuration string (or 'key_id').
+        key_id (int):        Index of configuration in keysheet (0 - the first line).
+        text (str):          Text to encode.
+        groups (bool):       Divide encoded text into groups.
+        keep_spaces, keep_new_line, keep_special, keep_case (bool): Passthrough policy (see 'Enigma.encode').
+        notched (bool):      Use notched stepping.
+        id:                  Any value, copied to result.
+
+    Args:
+        job (dict):           Job.
+        keysheet (list[str]): Configurations for jobs with 'key_id'.
+        memo (EncodeMemo):    Memo of encoded messages (repeated jobs are not encoded again).
+
+    Returns:
+        dict: Result: {"encoded": ...} or {"error": ...} (with job's "id", if it has one).
+    """
+    result = {'id': job['id']} if 'id' in job else {}
+    try:
+        if 'configuration' in job:
+            conf_str = job['configuration']
+        elif 'key_id' in job:
+            if keysheet is None or not 0 <= job['key_id'] < len(keysheet):
+                raise InvalidArguments(f'Unknown key_id {job["key_id"]}')
+            conf_str = keysheet[job['key_id']]
+        else:
+            raise InvalidArguments('Job must have "configuration" or "key_id"')
+
+        options = {option: bool(job.get(option, False)) for option in PASSTHROUGH_OPTIONS}
+        if job.get('groups') and any(options.values()):
+            raise InvalidArguments('Can\'t use division into groups with "keep_spaces", "keep_special", "keep_new_line" or "keep_case"')
+
+        enigma, cursor = _machine(conf_str.strip(), NOTCHED if job.get('notched') else ODOMETER)
+        enigma.set_cursor(cursor)
+        enigma.memo = memo
+        encoded = enigma.encode(job.get('text', ''), **options)
+
+        result['encoded'] = format_output_string(encoded) if job.get('groups') else encoded
+    except JOB_ERRORS as e:
+        result['error'] = str(e) or type(e).__name__
+    return result
+
+
+def encode_line(line: str, keysheet: list[str] = None, memo: EncodeMemo = None):
+    """Encode job, given as JSON line.
+
+    Args:
+        line (str):           JSON line.
+        keysheet (list[str]): Configurations for jobs with 'key_id'.
+        memo (EncodeMemo):    Memo of encoded messages.
+
+    Returns:
+        str: Result as JSON line (without new line character).
+    """
+    try:
+        job = json.loads(line)
+        if not isinstance(job, dict):
+            raise ValueError('Job must be JSON object')
+    except ValueError as e:
+        return json.dumps({'error': f'Invalid job: {e}'})
+    return json.dumps(encode_job(job, keysheet, memo))
+
+
+def run_batch(input_file, output_file, jobs: int = None, keysheet: list[str] = None, memo_entries: int = 0,
+              memo_stats: dict = None):
+    """Encode all jobs of JSON lines file. Results are written in order of jobs, as soon as they are ready.
+
+    Args:
+        input_file (TextIO):  JSON lines file with jobs (empty lines are skipped).
+        output_file (TextIO): File for results (one JSON line per job).
+        jobs (int):           Amount of worker processes (1 - no pool). Default: CPU count.
+        keysheet (list[str]): Configurations for jobs with 'key_id'.
+        memo_entries (int):   Max amount of memoized messages in each process (see 'EncodeMemo'). 0 - no memo.
+        memo_stats (dict):    Dictionary, filled with counters of memo of each process, which encoded jobs
+                              (process id => 'EncodeMemo.to_dict'). Nothing is added, if there is no memo.
+
+    Returns:
+        int: Amount of processed jobs.
+    """
+    lines = (line for line in input_file if line.strip())
+
+    if jobs == 1:
+        memo = EncodeMemo(memo_entries) if memo_entries else None
+        count = _write_results(map(lambda line: encode_line(line, keysheet, memo), lines), output_file)
+        if memo is not None and memo_stats is not None:
+            memo_stats[os.getpid()] = memo.to_dict()
+        return count
+
+    with Pool(jobs, initializer=_init_worker, initargs=(keysheet, memo_entries)) as pool:
+        results = pool.imap(_worker_encode_line, lines, chunksize=BATCH_CHUNK_SIZE)
+        return _write_results(_collect_memo_stats(results, memo_stats), output_file)
+
+
+def _collect_memo_stats(results, memo_stats: dict):
+    """Take results of worker processes, keeping the latest memo counters of each process.
+
+    Args:
+        results (Iterable[tuple[str, tuple | None]]): Results and (process id, memo counters) of processes.
+        memo_stats (dict): Dictionary for counters (None - counters are dropped).
+
+    Yields:
+        str: Results.
+    """
+    for result, stats in results:
+        if stats is not None and memo_stats is not None:
+            pid, counters = stats
+            memo_stats[pid] = counters
+        yield result
+
+
+def _write_results(results, output_file):
+    """Write results, one per line, flushing output file regularly.
+
+    Args:
+        results (Iterable[str]): Results (JSON lines).
+        output_file (TextIO):    File for results.
+
+    Returns:
+        int: Amount of results.
+    """
+    count = 0
+    for result in results:
+        output_file.write(result + '\n')
+        count += 1
+        if count % BATCH_FLUSH_LINES == 0:
+            output_file.flush()
+    output_file.flush()
+    return count
+
+
+# keysheet and memo of worker process (set once per process)
+_worker_keysheet = None
+_worker_memo = None
+
+
+def _init_worker(keysheet: list[str], memo_entries: int):
+    """Set keysheet and memo of worker process."""
+    global _worker_keysheet, _worker_memo
+    _worker_keysheet = keysheet
+    _worker_memo = EncodeMemo(memo_entries) if memo_entries else None
+
+
+def _worker_encode_line(line: str):
+    """Encode job in worker process (result is sent with current counters of memo of this process)."""
+    result = encode_line(line, _worker_keysheet, _worker_memo)
+    if _worker_memo is None:
+        return result, None
+    return result, (os.getpid(), _worker_memo.to_dict())
@@ -0,0 +1,247 @@
+"""
+Bombe: recovery of rotors order, positions and plugboard from crib (known plaintext)
+"""
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .common import ALPH
+from .keygen import REFLECTOR_NUMS, ROTOR_NUMS
+from .spec import MachineSpec, IDENTITY, PADDING, LETTER_TO_INDEX
+from .utils import prepare_string
+
+IDENTITY_INT = int.from_bytes(IDENTITY, 'little')
+
+# candidates of all 26 letters: one byte per letter (1 - letter is candidate)
+ALL_LETTERS = int.from_bytes(bytes([1]) * 26, 'little')
+
+# translate table: 0 => 1, anything else => 0 (finds fixed points of permutation, XORed with identity)
+ZERO_TO_ONE = b'\x01' + bytes(255)
+
+
+def crib_offsets(ciphertext: str, crib: str):
+    """Get offsets in ciphertext, at which crib can be (Enigma never encodes letter to itself).
+
+    Args:
+        ciphertext (str): Ciphertext (only letters are used).
+        crib (str):       Known plaintext (only letters are used).
+
+    Returns:
+        list[int]: Offsets (in letters).
+    """
+    ciphertext, crib = prepare_string(ciphertext), prepare_string(crib)
+    return [
+        offset for offset in range(len(ciphertext) - len(crib) + 1)
+        if all(p != c for p, c in zip(crib, ciphertext[offset:]))
+    ]
+
+
+class Bombe:
+    """Known-plaintext attack on rotors order and start positions (odometer stepping), as Turing-Welchman bombe does.
+
+    Crib and ciphertext letters at the same place are connected in menu graph by edge, labelled with offset of
+    the letter. Plugboard P and scrambler Z_i (rotors and reflector at that offset) give c = P(Z_i(P(p))),
+    so hypothesis P(a) = u gives P(b) = Z_i(u) for each edge (a, b, i).
+
+    For each start position:
+        1. Each loop of menu, walked from test letter (the most connected one), is permutation of P(test letter),
+           which must keep it in place. Walks are composed by 'bytes.translate' over precomputed scrambler tables
+           of every offset, and only common fixed points of all loops are left (most positions have none).
+        2. Each left candidate is checked by propagation of wires (bitset of hypotheses of each letter)
+           through the menu and the diagonal board (P(a) = u <=> P(u) = a). Candidate without contradiction is a stop.
+
+    Rotors orders (shards, one reflector with one order of rotors) are processed in process pool.
+
+    Args:
+        ciphertext (str):       Ciphertext (only letters are used).
+        crib (str):             Known plaintext (only letters are used).
+        offset (int):           Offset of crib in ciphertext (in letters, see 'crib_offsets').
+        rotors_amount (int):    Amount of rotors.
+        reflectors (list[str]): Reflectors numbers to try. Default: all reflectors.
+        rotor_nums (list[str]): Rotors numbers to try. Default: all rotors.
+
+    Attributes:
+        pairs (list[tuple[int, int, int]]):      Offset (key presses from start position), crib and ciphertext letter indices.
+        menu (list[list[tuple[int, int]]]):      Edges of each letter: other letter and offset.
+        test_letter (int):                       Letter index, for which plugboard hypotheses are made.
+        walks (list[tuple[int]]):                Offsets of each loop, walked from test letter.
+        shards (list[tuple[str, tuple[str]]]):   Reflector number and rotors numbers of each shard.
+
+    Raises:
+        ValueError: If crib doesn't fit ciphertext at offset.
+    """
+
+    def __init__(self, ciphertext: str, crib: str, offset: int = 0, rotors_amount: int = 3,
+                 reflectors: list[str] = None, rotor_nums: list[str] = None):
+        ciphertext = prepare_string(ciphertext)[offset:].encode('ascii').translate(LETTER_TO_INDEX)
+        crib = prepare_string(crib).encode('ascii').translate(LETTER_TO_INDEX)
+        if not crib or len(crib) > len(ciphertext):
+            raise ValueError('Crib must be not empty and not longer than ciphertext after offset')
+        if any(p == c for p, c in zip(crib, ciphertext)):
+            raise ValueError(f'Crib can\'t be at offset {offset}: letter would be encoded to itself')
+
+        # letter at offset k is encoded at state (start + offset + k + 1)
+        self.pairs = [(offset + k + 1, p, c) for k, (p, c) in enumerate(zip(crib, ciphertext))]
+
+        self.menu = [[] for _ in ALPH]
+        for step, p, c in self.pairs:
+            self.menu[p].append((c, step))
+            self.menu[c].append((p, step))
+        self.test_letter = max(range(len(ALPH)), key=lambda letter: len(self.menu[letter]))
+        self.walks = self._closed_walks()
+
+        self.rotors_amount = rotors_amount
+        self.shards = [
+            (reflector, rotors)
+            for reflector in (reflectors if reflectors is not None else REFLECTOR_NUMS)
+            for rotors in itertools.permutations(rotor_nums if rotor_nums is not None else ROTOR_NUMS, rotors_amount)
+        ]
+
+    def _closed_walks(self):
+        """Find loops of menu (one per edge, which is not in spanning tree) as closed walks from test letter.
+
+        Returns:
+            list[tuple[int]]: Offsets of each walk: path from test letter, loop edge and path back.
+        """
+        # spanning tree of test letter's component (breadth-first): path of offsets from test letter to each letter
+        paths = {self.test_letter: ()}
+        tree_edges = set()
+        queue = [self.test_letter]
+        for letter in queue:
+            for other, step in self.menu[letter]:
+                if other not in paths:
+                    paths[other] = paths[letter] + (step,)
+                    tree_edges.add(step)
+                    queue.append(other)
+
+        walks = []
+        for step, p, c in self.pairs:
+            if step not in tree_edges and p in paths:
+                walks.append(paths[p] + (step,) + paths[c][::-1])
+        # short walks reject positions with the least work
+        return sorted(walks, key=len)
+
+    def _propagate(self, scramblers: list, start: int, value: int):
+        """Propagate hypothesis P(test letter) = value through the menu and the diagonal board.
+
+        Args:
+            scramblers (list[bytes]): Scrambler table of each state.
+            start (int):              Start state.
+            value (int):              Hypothesis.
+
+        Returns:
+            list[int] | None: Bitset of implied values of each letter (None, if there is contradiction).
+        """
+        wires = [0] * len(ALPH)
+        queue = [(self.test_letter, value)]
+        wires[self.test_letter] = 1 << value
+        wires[value] |= 1 << self.test_letter
+        if wires[value] & (wires[value] - 1):
+            return None
+        queue.append((value, self.test_letter))
+
+        for letter, value in queue:
+            for other, step in self.menu[letter]:
+                implied = scramblers[start + step][value]
+                for a, b in ((other, implied), (implied, other)):  # the wire and its diagonal board pair
+                    bit = 1 << b
+                    if wires[a] & bit:
+                        continue
+                    if wires[a]:
+                        return None
+                    wires[a] = bit
+                    queue.append((a, b))
+        return wires
+
+    def test_shard(self, index: int):
+        """Find stops of one shard.
+
+        Args:
+            index (int): Shard index.
+
+        Returns:
+            list[str]: Stops as partial configuration strings: reflector, rotors at start positions and
+                       plugboard pairs, implied by crib (the other pairs are unknown).
+        """
+        reflector, rotors = self.shards[index]
+        spec, _ = MachineSpec.from_configuration(reflector + ' ' + '-'.join(rotors))
+        table = spec.state_table()
+
+        states = 26 ** len(rotors)
+        last_step = self.pairs[-1][0]
+        scramblers = [bytes(table[i:i + 26]) + PADDING for i in range(0, len(table), 26)]
+        # table is extended cyclically, so start + step never needs modulo (steps may be longer than period)
+        scramblers += [scramblers[i % states] for i in range(last_step + 1)]
+        walks = self.walks
+
+        stops = []
+        for start in range(states):
+            candidates = ALL_LETTERS
+            for walk in walks:
+                permutation = IDENTITY
+                for step in walk:
+                    permutation = permutation.translate(scramblers[start + step])
+                fixed = (int.from_bytes(permutation, 'little') ^ IDENTITY_INT).to_bytes(26, 'little').translate(ZERO_TO_ONE)
+                candidates &= int.from_bytes(fixed, 'little')
+                if not candidates:
+                    break
+
+            if not candidates:
+                continue
+            for value in range(len(ALPH)):
+                if not candidates >> (8 * value) & 1:
+                    continue
+                wires = self._propagate(scramblers, start, value)
+                if wires is None:
+                    continue
+
+                cursor = spec.cursor([(start // 26 ** i) % 26 for i in range(len(rotors))])
+                pairs = ':'.join(
+                    (ALPH[letter] + ALPH[wire.bit_length() - 1]).upper()
+                    for letter, wire in enumerate(wires) if wire and letter < wire.bit_length() - 1
+                )
+                stops.append(' '.join(part for part in [spec.get_configuration(cursor), pairs] if part))
+        return stops
+
+    def run(self, processes: int = None, progress=None):
+        """Test all shards.
+
+        Args:
+            processes (int):     Amount of worker processes (1 - no pool). Default: CPU count.
+            progress (Callable): Called with amount of done shards and amount of all shards after each shard.
+
+        Returns:
+            list[str]: Stops of all shards (in order of shards).
+        """
+        if processes == 1:
+            results = ((index, self.test_shard(index)) for index in range(len(self.shards)))
+        else:
+            executor = ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(self,))
+            futures = [executor.submit(_worker_test_shard, index) for index in range(len(self.shards))]
+            results = (future.result() for future in as_completed(futures))
+
+        stops = {}
+        try:
+            for index, shard_stops in results:
+                stops[index] = shard_stops
+                if progress is not None:
+                    progress(len(stops), len(self.shards))
+        finally:
+            if processes != 1:
+                executor.shutdown(cancel_futures=True)
+
+        return [stop for index in sorted(stops) for stop in stops[index]]
+
+
+# bombe of worker process (set once per process)
+_worker_bombe = None
+
+
+def _init_worker(bombe: Bombe):
+    """Set bombe of worker process."""
+    global _worker_bombe
+    _worker_bombe = bombe
+
+
+def _worker_test_shard(index: int):
+    """Test one shard in worker process."""
+    return index, _worker_bombe.test_shard(index)
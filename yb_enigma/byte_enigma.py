@@ -0,0 +1,294 @@
+"""
+ByteEnigma class
+"""
+import random
+
+IDENTITY = bytes(range(256))
+
+# amount of the first rotor's full rotations, encoded at once (see 'ByteEnigma.encode')
+CHUNK_BLOCKS = 1024
+
+
+def _table(permutation: bytes):
+    """Pad permutation of 'size' symbols to 256 bytes 'bytes.translate' table.
+
+    Args:
+        permutation (bytes): Permutation of range(size).
+
+    Returns:
+        bytes: Translate table.
+    """
+    return permutation + IDENTITY[len(permutation):]
+
+
+def _random_involution(size: int, rng: random.Random):
+    """Generate random permutation without fixed points, that is its own inverse (like reflector).
+
+    Args:
+        size (int):          Alphabet size (must be even).
+        rng (random.Random): Random numbers generator.
+
+    Returns:
+        bytes: Permutation.
+    """
+    symbols = list(range(size))
+    rng.shuffle(symbols)
+
+    involution = bytearray(size)
+    for i in range(0, size, 2):
+        a, b = symbols[i], symbols[i + 1]
+        involution[a], involution[b] = b, a
+
+    return bytes(involution)
+
+
+class ByteEnigma:
+    """Enigma over alphabet of 'size' symbols (bytes 0...size-1), by default 256 symbols.
+
+    Works exactly as Enigma (odometer stepping, plugboard -> rotors -> reflector -> rotors -> plugboard),
+    but encodes bytes, so any binary data can be processed losslessly.
+
+    Args:
+        rotors (list[bytes]):  Rotors wirings (permutations of range(size)), from the first rotor to the last.
+        reflector (bytes):     Reflector wiring (permutation without fixed points, that is its own inverse).
+        plugboard (bytes):     Plugboard wiring (permutation, that is its own inverse). Default: no plugpairs.
+        positions (list[int]): Initial rotors positions, from the first rotor to the last. Default: all 0.
+        size (int):            Alphabet size (2...256).
+
+    Attributes:
+        size (int):            Alphabet size.
+        rotors (list[bytes]):  Rotors wirings, from the first rotor to the last.
+        reflector (bytes):     Reflector wiring.
+        plugboard (bytes):     Plugboard wiring.
+        positions (list[int]): Current rotors positions, from the first rotor to the last.
+
+    Raises:
+        ValueError: If wirings are not valid permutations.
+    """
+
+    def __init__(self, rotors: list[bytes], reflector: bytes, plugboard: bytes = None, positions: list[int] = None, size: int = 256):
+        if not 2 <= size <= 256:
+            raise ValueError('"size" must be in range 2...256')
+        if len(rotors) == 0:
+            raise ValueError('Empty rotors list')
+
+        plugboard = plugboard if plugboard is not None else IDENTITY[:size]
+        positions = positions if positions is not None else [0] * len(rotors)
+
+        for wiring in rotors + [reflector, plugboard]:
+            if sorted(wiring) != list(range(size)):
+                raise ValueError('Wiring must be permutation of all alphabet symbols')
+        for wiring in [reflector, plugboard]:
+            if wiring.translate(_table(wiring)) != IDENTITY[:size]:
+                raise ValueError('Reflector and plugboard wirings must be their own inverse')
+        if any(reflector[i] == i for i in range(size)):
+            raise ValueError('Reflector must not map symbol to itself')
+        if len(positions) != len(rotors) or any(not 0 <= pos < size for pos in positions):
+            raise ValueError('Invalid rotors positions')
+
+        self.size = size
+        self.rotors = [bytes(wiring) for wiring in rotors]
+        self.reflector = bytes(reflector)
+        self.plugboard = bytes(plugboard)
+        self.positions = list(positions)
+
+        # translate tables for each rotor at each position (built lazily, see '_rotor_tables')
+        self._forward_tables = [None] * len(rotors)
+        self._backward_tables = [None] * len(rotors)
+
+    @staticmethod
+    def from_key(key=None, rotors_amount: int = 3, plugpairs_amount: int = 0, size: int = 256):
+        """Generate wirings from key. The same key always gives the same machine.
+
+        Args:
+            key (str | bytes | int): Key (random numbers generator seed). If None, wirings are random.
+            rotors_amount (int):     Amount of rotors.
+            plugpairs_amount (int):  Amount of plugpairs.
+            size (int):              Alphabet size (even number 2...256).
+
+        Returns:
+            ByteEnigma: ByteEnigma instance, all rotors at position 0.
+
+        Raises:
+            ValueError: If 'size' is odd or there are too many plugpairs.
+        """
+        if size % 2:
+            raise ValueError('"size" must be even (reflector pairs all symbols)')
+        if plugpairs_amount > size // 2:
+            raise ValueError('Too many plugpairs')
+
+        rng = random.Random(key) if key is not None else random.SystemRandom()
+
+        rotors = []
+        for _ in range(rotors_amount):
+            wiring = list(range(size))
+            rng.shuffle(wiring)
+            rotors.append(bytes(wiring))
+
+        reflector = _random_involution(size, rng)
+
+        plugboard = bytearray(range(size))
+        symbols = rng.sample(range(size), plugpairs_amount * 2)
+        for i in range(0, len(symbols), 2):
+            a, b = symbols[i], symbols[i + 1]
+            plugboard[a], plugboard[b] = b, a
+
+        return ByteEnigma(rotors=rotors, reflector=reflector, plugboard=bytes(plugboard), size=size)
+
+    def _rotor_tables(self, i: int):
+        """Get translate tables of rotor at each position.
+
+        forward[pos][x] = wiring[(x + pos) % size]
+        backward[pos][y] = (wiring^-1[y] - pos) % size
+
+        Args:
+            i (int): Rotor index.
+
+        Returns:
+            tuple[list[bytes], list[bytes]]: Forward and backward tables.
+        """
+        if self._forward_tables[i] is None:
+            size = self.size
+            wiring = self.rotors[i]
+
+            inverse = bytearray(size)
+            for x, y in enumerate(wiring):
+                inverse[y] = x
+            inverse = bytes(inverse)
+
+            forward, backward = [], []
+            for pos in range(size):
+                forward.append(_table(wiring[pos:] + wiring[:pos]))
+                shift = IDENTITY[size - pos:size] + IDENTITY[:size - pos]  # y => (y - pos) % size
+                backward.append(_table(inverse.translate(_table(shift))))
+
+            self._forward_tables[i] = forward
+            self._backward_tables[i] = backward
+
+        return self._forward_tables[i], self._backward_tables[i]
+
+    def _step(self):
+        """Shift the first rotor by 1 (odometer stepping).
+
+        Returns:
+            None
+        """
+        for i in range(len(self.positions)):
+            self.positions[i] += 1
+            if self.positions[i] < self.size:
+                break
+            self.positions[i] = 0
+
+    def advance(self, steps: int):
+        """Move rotors by 'steps' symbols without encoding anything.
+
+        Args:
+            steps (int): Amount of symbols.
+
+        Returns:
+            None
+        """
+        value = 0
+        for pos in reversed(self.positions):
+            value = value * self.size + pos
+        value = (value + steps) % self.size ** len(self.positions)
+
+        for i in range(len(self.positions)):
+            value, self.positions[i] = divmod(value, self.size)
+
+    def encode_symbol(self, symbol: int):
+        """Encode one symbol (slow, symbol by symbol; reference for 'encode').
+
+        Args:
+            symbol (int): Symbol to encode.
+
+        Returns:
+            int: Encoded symbol.
+        """
+        size = self.size
+        self._step()
+
+        symbol = self.plugboard[symbol]
+        for wiring, pos in zip(self.rotors, self.positions):
+            symbol = wiring[(symbol + pos) % size]
+        symbol = self.reflector[symbol]
+        for wiring, pos in zip(reversed(self.rotors), reversed(self.positions)):
+            symbol = (wiring.index(symbol) - pos) % size
+
+        return self.plugboard[symbol]
+
+    def encode(self, data: bytes, save_state: bool = False):
+        """Encode bytes.
+
+        All work is done by 'bytes.translate' over whole blocks of data:
+        symbols encoded at the same position of the first rotor are translated together (as strided slice),
+        and the rest of rotors with reflector are composed into one table per full rotation of the first rotor.
+
+        Args:
+            data (bytes):      Bytes to encode (each byte must be less than 'size').
+            save_state (bool): Save state after encoding.
+
+        Returns:
+            bytes: Encoded bytes.
+
+        Raises:
+            ValueError: If data contains symbols out of alphabet.
+        """
+        size = self.size
+        if size < 256 and data.translate(None, IDENTITY[:size]):
+            raise ValueError('Symbol out of alphabet')
+
+        first_forward, first_backward = self._rotor_tables(0)
+        slow_tables = [self._rotor_tables(i) for i in range(1, len(self.rotors))]
+        slow_positions = self.positions[1:]
+        reflector = _table(self.reflector)
+
+        # prepend padding, so that symbol at the first rotor's position N is always at index N of its block
+        padding = (self.positions[0] + 1) % size
+        buffer = bytearray(padding) + bytearray(data).translate(_table(self.plugboard))
+
+        # the first block starts with full rotation of the first rotor, if it is at position 0 already
+        rotation = padding == 0
+
+        # process chunks of many blocks, so that strided slices stay in cache
+        chunk_size = size * CHUNK_BLOCKS
+        for chunk_start in range(0, len(buffer), chunk_size):
+            chunk = buffer[chunk_start:chunk_start + chunk_size]
+
+            # through the first rotor
+            for pos in range(size):
+                chunk[pos::size] = chunk[pos::size].translate(first_forward[pos])
+
+            # through the rest of rotors and reflector: the same table until the first rotor makes full rotation
+            for start in range(0, len(chunk), size):
+                if rotation:
+                    # shift the rest of rotors as odometer
+                    for i in range(len(slow_positions)):
+                        slow_positions[i] += 1
+                        if slow_positions[i] < size:
+                            break
+                        slow_positions[i] = 0
+                rotation = True
+
+                table = IDENTITY
+                for (forward, _), pos in zip(slow_tables, slow_positions):
+                    table = table.translate(forward[pos])
+                table = table.translate(reflector)
+                for (_, backward), pos in zip(reversed(slow_tables), reversed(slow_positions)):
+                    table = table.translate(backward[pos])
+
+                chunk[start:start + size] = chunk[start:start + size].translate(table)
+
+            # back through the first rotor
+            for pos in range(size):
+                chunk[pos::size] = chunk[pos::size].translate(first_backward[pos])
+
+            buffer[chunk_start:chunk_start + chunk_size] = chunk
+
+        del buffer[:padding]
+        buffer = buffer.translate(_table(self.plugboard))
+
+        if not save_state:
+            self.advance(len(data))
+
+        return bytes(buffer)
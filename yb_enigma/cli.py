@@ -8,19 +8,583 @@ Entry point for console application.
 """
 
 import argparse
+import functools
+import json
 import textwrap
 import os
+import re
 import sys
 
-from .utils import parse_configuration, format_output_string
+from .utils import format_output_string, parse_configuration
 from .exceptions import InvalidArguments
 from .enigma import Enigma
+from .ranges import RangeIndex, decode_range, index_path
+from .stepping import ODOMETER, NOTCHED, MAX_NOTCHED_ROTORS
+from .keygen import write_keysheet
+from .metrics import PhaseTimer
+from .harness import ENGINES, DEFAULT_THRESHOLD, check_engines, check_baselines
+from .solver import NgramScorer
+from .search import SearchJob
+from .bombe import Bombe, crib_offsets
+from .wiring import WiringSolver
+from .analysis import analyze_file
+from .batch import run_batch
+from .tabular import OFFSET_MODES, ROW_OFFSET, encode_csv
+from .tables import TABLE_CACHE_ENV, set_table_cache
+from .streams import COMPRESSIONS, compression_by_extension, open_text_input, open_text_output, prefetch
+
+# amount of characters, read from input file (or stdin) and encoded at once
+CHUNK_SIZE = 65536
+
+TABLE_CACHE_HELP = f'Directory of compiled tables cache (shared by all processes). Default: ${TABLE_CACHE_ENV}, if it is set.'
+
+
+def _use_table_cache(directory: str):
+    """
+    Set cache of compiled tables for this process and for worker processes (they inherit environment).
+    """
+    if directory:
+        os.environ[TABLE_CACHE_ENV] = directory
+        set_table_cache(directory)
+
+
+def _check_notched_rotors(conf_str: str):
+    """
+    Reject configuration with more rotors, than notched stepping supports (Greek rotor doesn't step).
+    """
+    if len(parse_configuration(conf_str)[1]) > MAX_NOTCHED_ROTORS:
+        raise InvalidArguments(f'Notched stepping (-nt, --notched) supports at most {MAX_NOTCHED_ROTORS} rotors')
+
+
+def run_keygen(argv: list[str]):
+    """
+    Generate keysheet: "enigma-cli keygen [ARGS]...".
+    """
+    parser = argparse.ArgumentParser(
+        prog="Enigma CLI keygen",
+        description='Generate random configuration strings (one per line).',
+    )
+
+    parser.add_argument("--count", "-n",
+                        type=int,
+                        required=True,
+                        help='Amount of configurations.')
+
+    parser.add_argument("--output-file", "-o",
+                        type=argparse.FileType('w'),
+                        default='-',
+                        help='Path to keysheet file. Default: print to console.')
+
+    parser.add_argument("--rotors", "-rt",
+                        type=int,
+                        default=3,
+                        help='Amount of rotors. Default: 3.')
+
+    parser.add_argument("--plugpairs", "-pl",
+                        type=int,
+                        default=6,
+                        help='Amount of plugpairs. Default: 6.')
+
+    parser.add_argument("--seed",
+                        help='Random numbers generator seed (reproducible keysheet). Default: use "secrets" module.')
+
+    parser.add_argument("--unique", "-u",
+                        help='Do not repeat configurations.',
+                        action="store_true")
+
+    args = parser.parse_args(argv)
+
+    try:
+        write_keysheet(args.output_file, args.count,
+                       rotors_amount=args.rotors,
+                       plugpairs_amount=args.plugpairs,
+                       seed=args.seed,
+                       unique=bool(args.unique))
+    except ValueError as e:
+        raise InvalidArguments(str(e)) from e
+
+    args.output_file.close()
+
+
+def run_verify(argv: list[str]):
+    """
+    Check engines against reference implementation and throughput baselines: "enigma-cli verify [ARGS]...".
+    """
+    parser = argparse.ArgumentParser(
+        prog="Enigma CLI verify",
+        description='Compare every engine with reference implementation on random configurations and messages.',
+    )
+
+    parser.add_argument("--count", "-n",
+                        type=int,
+                        default=100,
+                        help='Amount of random cases. Default: 100.')
+
+    parser.add_argument("--seed",
+                        help='Random numbers generator seed (reproducible cases). Default: random.')
+
+    parser.add_argument("--engines", "-e",
+                        nargs='+',
+                        choices=list(ENGINES),
+                        help='Engines to check. Default: all.')
+
+    parser.add_argument("--baselines", "-b",
+                        help='Path to JSON file with throughput baselines (created, if it doesn\'t exist).')
+
+    parser.add_argument("--threshold",
+                        type=float,
+                        default=DEFAULT_THRESHOLD,
+                        help=f'Allowed fraction of baseline throughput. Default: {DEFAULT_THRESHOLD}.')
+
+    parser.add_argument("--update", "-u",
+                        help='Save measured throughput as new baselines.',
+                        action="store_true")
+
+    args = parser.parse_args(argv)
+
+    failed = False
+
+    mismatches = check_engines(args.count, seed=args.seed, engines=args.engines)
+    for mismatch in mismatches:
+        print(f'MISMATCH {mismatch["engine"]} ({mismatch["stepping"]}): "{mismatch["configuration"]}", '
+              f'message length {len(mismatch["message"])}', file=sys.stderr)
+    print(f'{args.count} cases, {len(mismatches)} mismatches')
+    failed = failed or bool(mismatches)
+
+    if args.baselines:
+        regressions = check_baselines(args.baselines, threshold=args.threshold, update=bool(args.update),
+                                      engines=args.engines)
+        for name, (baseline, measured) in regressions.items():
+            print(f'REGRESSION {name}: {measured:.0f} chars/s, baseline {baseline:.0f} chars/s', file=sys.stderr)
+        print(f'{len(regressions)} throughput regressions')
+        failed = failed or bool(regressions)
+
+    if failed:
+        sys.exit(1)
+
+
+def run_search(argv: list[str]):
+    """
+    Search for key of ciphertext (resumable): "enigma-cli search [ARGS]...".
+    """
+    parser = argparse.ArgumentParser(
+        prog="Enigma CLI search",
+        description='Try every reflector, order of rotors and their positions; print the best configurations. '
+                    'Interrupted search continues from checkpoint file.',
+    )
+
+    parser.add_argument("--input-file", "-f",
+                        type=argparse.FileType('r'),
+                        required=True,
+                        help='Path to ciphertext file.')
+
+    parser.add_argument("--corpus", "-c",
+                        type=argparse.FileType('r'),
+                        required=True,
+                        help='Path to sample text in plaintext language (for bigrams and trigrams statistics).')
+
+    parser.add_argument("--checkpoint", "-cp",
+                        required=True,
+                        help='Path to checkpoint file (created, or resumed from, if it exists).')
+
+    parser.add_argument("--rotors", "-rt",
+                        type=int,
+                        default=3,
+                        help='Amount of rotors. Default: 3.')
+
+    parser.add_argument("--top", "-t",
+                        type=int,
+                        default=10,
+                        help='Amount of the best configurations to keep. Default: 10.')
+
+    parser.add_argument("--plugboard", "-pl",
+                        default='',
+                        help='Plugboard of all configurations (i.e. "AB:CD"). Default: no plugpairs.')
+
+    parser.add_argument("--plugboard-restarts", "-pr",
+                        type=int,
+                        default=0,
+                        help='Recover plugboard of the best configurations by hill climbing with this amount of restarts. Default: 0 (don\'t recover).')
+
+    parser.add_argument("--jobs", "-j",
+                        type=int,
+                        help='Amount of worker processes. Default: CPU count.')
+
+    parser.add_argument("--table-cache", "-tc",
+                        help=TABLE_CACHE_HELP)
+
+    args = parser.parse_args(argv)
+    _use_table_cache(args.table_cache)
+
+    ciphertext = args.input_file.read()
+    args.input_file.close()
+    scorer = NgramScorer.from_text(args.corpus.read())
+    args.corpus.close()
+
+    job = SearchJob(ciphertext, scorer, args.checkpoint,
+                    rotors_amount=args.rotors,
+                    top_k=args.top,
+                    plugboard=args.plugboard,
+                    plugboard_restarts=args.plugboard_restarts)
+
+    def progress(done, total):
+        print(f'\r{done}/{total} shards', end='', file=sys.stderr, flush=True)
+
+    try:
+        candidates = job.run(processes=args.jobs, progress=progress)
+    except ValueError as e:
+        raise InvalidArguments(str(e)) from e
+    print(file=sys.stderr)
+
+    for score, conf_str in candidates:
+        print(f'{score:.2f}\t{conf_str}')
+
+
+def run_bombe(argv: list[str]):
+    """
+    Recover key from crib (known plaintext): "enigma-cli bombe [ARGS]...".
+    """
+    parser = argparse.ArgumentParser(
+        prog="Enigma CLI bombe",
+        description='Try every reflector, order of rotors and their positions against crib (known part of plaintext); '
+                    'print stops: configurations with plugboard pairs, implied by crib.',
+    )
+
+    parser.add_argument("--input-file", "-f",
+                        type=argparse.FileType('r'),
+                        required=True,
+                        help='Path to ciphertext file.')
+
+    parser.add_argument("--crib", "-c",
+                        required=True,
+                        help='Known plaintext.')
+
+    parser.add_argument("--offset", "-x",
+                        type=int,
+                        help='Offset of crib in ciphertext (in letters). Default: every offset, where crib fits.')
+
+    parser.add_argument("--rotors", "-rt",
+                        type=int,
+                        default=3,
+                        help='Amount of rotors. Default: 3.')
+
+    parser.add_argument("--jobs", "-j",
+                        type=int,
+                        help='Amount of worker processes. Default: CPU count.')
+
+    parser.add_argument("--table-cache", "-tc",
+                        help=TABLE_CACHE_HELP)
+
+    args = parser.parse_args(argv)
+    _use_table_cache(args.table_cache)
+
+    ciphertext = args.input_file.read()
+    args.input_file.close()
+
+    offsets = [args.offset] if args.offset is not None else crib_offsets(ciphertext, args.crib)
+    for offset in offsets:
+        try:
+            bombe = Bombe(ciphertext, args.crib, offset=offset, rotors_amount=args.rotors)
+        except ValueError as e:
+            raise InvalidArguments(str(e)) from e
+
+        def progress(done, total):
+            print(f'\roffset {offset}: {done}/{total} shards', end='', file=sys.stderr, flush=True)
+
+        stops = bombe.run(processes=args.jobs, progress=progress)
+        print(file=sys.stderr)
+
+        for stop in stops:
+            print(f'{offset}\t{stop}')
+
+
+def run_wiring(argv: list[str]):
+    """
+    Recover wirings of custom rotors from known plaintext: "enigma-cli wiring --in MESSAGES -u NAME [ARGS]...".
+    """
+    parser = argparse.ArgumentParser(
+        prog="Enigma CLI wiring",
+        description='Recover wirings of unknown rotors from messages with known plaintext, key and start positions. '
+                    'Each line of messages file: {"plaintext": ..., "ciphertext": ..., "configuration": ...}, '
+                    'where unknown rotors are written by their names, i.e. "B X:4-I:17-II:9 AQ:EZ". '
+                    'Recovered wirings are printed as "NAME<tab>KEY" (KEY is accepted by Rotor).',
+    )
+
+    parser.add_argument("--in", "-i",
+                        dest='input_file',
+                        type=argparse.FileType('r'),
+                        default='-',
+                        help='Path to messages file (JSON lines). Default: read from stdin.')
+
+    parser.add_argument("--unknown", "-u",
+                        action='append',
+                        required=True,
+                        help='Name of unknown rotor (can be used many times).')
+
+    args = parser.parse_args(argv)
+
+    try:
+        messages = [
+            (message['plaintext'], message['ciphertext'], message['configuration'])
+            for message in map(json.loads, filter(str.strip, args.input_file))
+        ]
+        solver = WiringSolver(messages, args.unknown)
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidArguments(f'Invalid messages: {e}') from e
+    finally:
+        args.input_file.close()
+
+    wirings = solver.solve()
+    for name in args.unknown:
+        if name in wirings:
+            print(f'{name}\t{wirings[name]}')
+        elif len(solver.solutions.get(name, [])) > 1:
+            print(f'{name}: ambiguous, more messages are needed', file=sys.stderr)
+        else:
+            print(f'{name}: not recovered (no messages, in which it is the only unknown rotor, or they contradict)', file=sys.stderr)
+
+
+def run_analyze(argv: list[str]):
+    """
+    Print letter frequencies, index of coincidence and n-grams of files: "enigma-cli analyze [ARGS]... FILE...".
+    """
+    parser = argparse.ArgumentParser(
+        prog="Enigma CLI analyze",
+        description='Compute statistics of text files (read by chunks, any size): letter frequencies, '
+                    'index of coincidence, the most common bigrams and trigrams.',
+    )
+
+    parser.add_argument("files",
+                        nargs='+',
+                        help='Paths to files (\'-\' to read from stdin).')
+
+    parser.add_argument("--window", "-w",
+                        type=int,
+                        help='Compute index of coincidence of each window of this amount of letters.')
+
+    parser.add_argument("--top", "-t",
+                        type=int,
+                        default=10,
+                        help='Amount of the most common bigrams and trigrams. Default: 10.')
+
+    parser.add_argument("--json",
+                        help='Print statistics of each file as one JSON line.',
+                        action="store_true")
+
+    args = parser.parse_args(argv)
+
+    if args.window is not None and args.window < 2:
+        raise InvalidArguments('Window (-w, --window) must be at least 2 letters')
+
+    for path in args.files:
+        if path == '-':
+            stats = analyze_file(sys.stdin.buffer, window=args.window)
+        else:
+            with open(path, 'rb') as file:
+                stats = analyze_file(file, window=args.window)
+
+        result = stats.to_dict(top=args.top)
+        if args.json:
+            print(json.dumps({'file': path, **result}))
+            continue
+
+        print(path)
+        print(f'  letters: {result["letters"]}, index of coincidence: {result["ioc"]:.5f}')
+        print('  frequencies: ' + ' '.join(f'{char}={frequency:.4f}' for char, frequency in result['frequencies'].items()))
+        print('  bigrams: ' + ' '.join(f'{bigram}={count}' for bigram, count in result['bigrams']))
+        print('  trigrams: ' + ' '.join(f'{trigram}={count}' for trigram, count in result['trigrams']))
+        if args.window:
+            print('  windows index of coincidence: ' + ' '.join(f'{ioc:.4f}' for ioc in result['windows_ioc']))
+
+
+def run_batch_command(argv: list[str]):
+    """
+    Encode JSON lines jobs: "enigma-cli batch --in JOBS --out RESULTS [ARGS]...".
+    """
+    parser = argparse.ArgumentParser(
+        prog="Enigma CLI batch",
+        description='Encode jobs from JSON lines file. Each job: {"configuration": ... or "key_id": ..., "text": ..., '
+                    '"groups", "keep_spaces", "keep_new_line", "keep_special", "keep_case", "notched": true/false, "id": ...}. '
+                    'Results are written in the same order: {"id": ..., "encoded": ...} or {"id": ..., "error": ...}.',
+    )
+
+    parser.add_argument("--in", "-i",
+                        dest='input_file',
+                        type=argparse.FileType('r'),
+                        default='-',
+                        help='Path to jobs file. Default: read from stdin.')
+
+    parser.add_argument("--out", "-o",
+                        dest='output_file',
+                        type=argparse.FileType('w'),
+                        default='-',
+                        help='Path to results file. Default: print to console.')
+
+    parser.add_argument("--jobs", "-j",
+                        type=int,
+                        help='Amount of worker processes. Default: CPU count.')
+
+    parser.add_argument("--keysheet", "-ks",
+                        type=argparse.FileType('r'),
+                        help='Path to keysheet (one configuration per line) for jobs with "key_id" (0 - the first line).')
+
+    parser.add_argument("--table-cache", "-tc",
+                        help=TABLE_CACHE_HELP)
+
+    parser.add_argument("--memo", "-m",
+                        type=int,
+                        default=0,
+                        help='Memoize up to N encoded messages in each worker process (repeated text, key and start '
+                             'positions are not encoded again). Default: 0 (no memo).')
+
+    parser.add_argument("--stats",
+                        help='Print memo counters (hits, misses, hit rate, evictions) of each worker process (with --memo).',
+                        action='store_true')
+
+    args = parser.parse_args(argv)
+    _use_table_cache(args.table_cache)
+
+    keysheet = None
+    if args.keysheet:
+        keysheet = [line.strip() for line in args.keysheet]
+        args.keysheet.close()
+
+    memo_stats = {}
+    run_batch(args.input_file, args.output_file, jobs=args.jobs, keysheet=keysheet, memo_entries=args.memo,
+              memo_stats=memo_stats)
+
+    if args.stats and memo_stats:
+        print(f'{"memo of worker":<20} {"hits":>10} {"misses":>10} {"hit rate":>10} {"evictions":>10}', file=sys.stderr)
+        for pid, counters in sorted(memo_stats.items()):
+            print(f'{pid:<20} {counters["hits"]:>10} {counters["misses"]:>10} {counters["hit_rate"]:>10.1%} '
+                  f'{counters["evictions"]:>10}', file=sys.stderr)
+
+    args.input_file.close()
+    args.output_file.close()
+
+
+def run_csv(argv: list[str]):
+    """
+    Encode columns of CSV/TSV file: "enigma-cli csv -i INPUT -o OUTPUT -c COLUMN... [ARGS]...".
+    """
+    parser = argparse.ArgumentParser(
+        prog="Enigma CLI csv",
+        description='Encode selected columns of CSV/TSV file (streaming, by chunks of rows in process pool). '
+                    'Each cell is encoded at its own rotors positions: base configuration, moved by offset of the cell. '
+                    'Letters keep their case, other characters are kept, so encoding the output again with the same '
+                    'arguments gives the original file. Compressed files (gzip, bz2, xz) are supported.',
+    )
+
+    parser.add_argument("--input-file", "-i",
+                        default='-',
+                        help='Path to CSV file. Default: read from stdin.')
+
+    parser.add_argument("--output-file", "-o",
+                        default='-',
+                        help='Path to encoded CSV file (compressed by extension .gz, .bz2, .xz). Default: print to console.')
+
+    parser.add_argument("--columns", "-c",
+                        nargs='+',
+                        required=True,
+                        help='Encoded columns: names (or indices, with --no-header).')
+
+    parser.add_argument("--configuration", "-cnfg",
+                        help='Base configuration string.')
+
+    parser.add_argument("--key-file", "-k",
+                        type=argparse.FileType('r'),
+                        help='Path to file with base configuration string.')
+
+    parser.add_argument("--offset", "-x",
+                        choices=OFFSET_MODES,
+                        default=ROW_OFFSET,
+                        help=textwrap.dedent('''\
+                            Offset of cell from base configuration: 'row' - row number and column (every cell has its own positions),
+                            'hash' - hash of column name and value of --key-column (equal values are encoded equally). Default: row.'''))
+
+    parser.add_argument("--key-column", "-kc",
+                        help='Column, whose value is hashed into offset (with --offset hash). It is not encoded.')
+
+    parser.add_argument("--delimiter", "-d",
+                        help='Delimiter of cells. Default: tab for .tsv files, otherwise comma.')
+
+    parser.add_argument("--no-header",
+                        help='The first row is not header (columns are given by indices, 0 - the first one).',
+                        action="store_true")
+
+    parser.add_argument("--notched", "-nt",
+                        help='Use notched (historical) rotors stepping.',
+                        action="store_true")
+
+    parser.add_argument("--jobs", "-j",
+                        type=int,
+                        help='Amount of worker processes. Default: CPU count.')
+
+    parser.add_argument("--table-cache", "-tc",
+                        help=TABLE_CACHE_HELP)
+
+    args = parser.parse_args(argv)
+    _use_table_cache(args.table_cache)
+
+    if bool(args.configuration) == bool(args.key_file):
+        raise InvalidArguments('Use one of configuration(-cnfg, --configuration) or key file(-k, --key-file)')
+    conf_str = args.configuration or args.key_file.readline()
+
+    if args.notched:
+        _check_notched_rotors(conf_str)
+
+    delimiter = args.delimiter
+    if delimiter is None:
+        delimiter = '\t' if re.search(r'\.tsv(\.gz|\.bz2|\.xz)?$', args.input_file) else ','
+
+    input_file = sys.stdin if args.input_file == '-' else open(args.input_file, newline='')
+    output_file = sys.stdout if args.output_file == '-' else open(args.output_file, 'w', newline='')
+    rows_input, _ = open_text_input(input_file, newline='')
+    compression = compression_by_extension(args.output_file) if args.output_file != '-' else None
+    rows_output = open_text_output(output_file, compression, newline='') if compression else output_file
+
+    try:
+        encode_csv(rows_input, rows_output, conf_str, args.columns,
+                   header=not args.no_header,
+                   delimiter=delimiter,
+                   offset=args.offset,
+                   key_column=args.key_column,
+                   stepping=NOTCHED if args.notched else ODOMETER,
+                   jobs=args.jobs)
+    except ValueError as e:
+        raise InvalidArguments(str(e)) from e
+    finally:
+        if compression:
+            rows_output.close()
+        for file in [input_file, output_file]:
+            if file not in (sys.stdin, sys.stdout):
+                file.close()
+
+
+# subcommands: "enigma-cli [COMMAND] [ARGS]..."
+COMMANDS = {
+    'keygen': run_keygen,
+    'verify': run_verify,
+    'search': run_search,
+    'bombe': run_bombe,
+    'wiring': run_wiring,
+    'analyze': run_analyze,
+    'batch': run_batch_command,
+    'csv': run_csv,
+}
 
 
 def run():
     """
     CLI entry point.
     """
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        COMMANDS[sys.argv[1]](sys.argv[2:])
+        return
+
+    timer = PhaseTimer()
+    timer.start('arguments')
+
     parser = argparse.ArgumentParser(
         prog="Enigma CLI",
 
@@ -37,7 +601,8 @@ def run():
     parser.add_argument("--input-file", "-f",
                         type=argparse.FileType('r'),
                         help=textwrap.dedent('''\
-                            Path to source file. '''))
+                            Path to source file. Use '-' to read from stdin (input is encoded and written by chunks).
+                            Compressed input (gzip, bz2, xz) is detected and decompressed on the fly. '''))
 
     parser.add_argument("--key-file", "-k",
                         type=argparse.FileType('r'),
@@ -47,9 +612,15 @@ def run():
     parser.add_argument("--output-file", "-o",
                         type=argparse.FileType('w'),
                         help=textwrap.dedent('''\
-                            Path to destination file.
+                            Path to destination file. Use '-' to write to stdout (key is printed to stderr).
                             If (--save-key, -sk) - key will be saved to /path/to/destination_file_name.key '''))
 
+    parser.add_argument("--compress", "-z",
+                        choices=COMPRESSIONS,
+                        help=textwrap.dedent('''\
+                            Compress destination file (on the fly).
+                            Default: by extension of destination file (.gz, .bz2, .xz), otherwise not compressed.'''))
+
     parser.add_argument("--configuration", "-cnfg",
                         help=textwrap.dedent('''\
                             Set enigma configurations.
@@ -63,6 +634,10 @@ def run():
                         help='Set random rotors, reflector and plugboard configuration.',
                         action="store_true")
 
+    parser.add_argument("--notched", "-nt",
+                        help='Use notched (historical) rotors stepping, with double stepping of the middle rotor.',
+                        action="store_true")
+
     parser.add_argument("--keep-spaces", "-ks",
                         help='Keep spaces in input string.',
                         action="store_true")
@@ -75,6 +650,10 @@ def run():
                         help='Keep new line charecters in input string.',
                         action="store_true")
 
+    parser.add_argument("--keep-case", "-kc",
+                        help='Keep case of letters in input string.',
+                        action="store_true")
+
     parser.add_argument("--groups", "-g",
                         help=textwrap.dedent("""\
                         Divide output string to groups.
@@ -82,6 +661,18 @@ def run():
                         Can`t be used with '--keep-spaces', '--keep-special' or '--keep-new-line'"""),
                         action="store_true")
 
+    parser.add_argument("--index", "-ix",
+                        help=textwrap.dedent('''\
+                            Save sparse index of destination file to /path/to/destination_file_name.idx
+                            Needed by (--range, -r) if '--keep-spaces', '--keep-special' or '--keep-new-line' was used.'''),
+                        action="store_true")
+
+    parser.add_argument("--range", "-r",
+                        help=textwrap.dedent('''\
+                            Decode only bytes [A, B) of source file. Format: 'A:B'
+                            Index /path/to/source_file_name.idx is used, if exists.
+                            Use with '--groups', if source file is divided into groups.'''))
+
     parser.add_argument("--save-key", "-sk",
                         help='Enable debug output.',
                         action="store_true")
@@ -90,7 +681,19 @@ def run():
                         help='Enable debug output.',
                         action="store_true")
 
+    parser.add_argument("--stats",
+                        help='Print timing of each phase (wall and CPU time) and peak memory usage.',
+                        action="store_true")
+
+    parser.add_argument("--stats-file",
+                        type=argparse.FileType('w'),
+                        help='Save timing of each phase and counters to file (Prometheus text format).')
+
+    parser.add_argument("--table-cache", "-tc",
+                        help=TABLE_CACHE_HELP)
+
     args = parser.parse_args()
+    _use_table_cache(args.table_cache)
 
     # Show configuration string help message
     if bool(args.help_configuration):
@@ -107,6 +710,12 @@ def run():
             3) AB:CD - plugboard
                 a) AB - Plug pair A to B
                 b) CD - Plpug pair C to D
+
+        Ring setting of rotor follows its position: II:10:4 - rotor II at position 10, ring setting 4.
+
+        Four-rotor machine (M4): B-thin Beta:2-II:10-I:3-III:20 AB:CD
+            1) B-thin - thin reflector (B-thin, C-thin)
+            2) Beta:2 - Greek rotor (Beta, Gamma): the leftmost one, doesn't step, only with thin reflector
         
         Valid configuration string examples:
             1) A II:10-I:3-III:20 AB:CD
@@ -115,12 +724,16 @@ def run():
             4) A I-I-I
             5) B IV
             6) C V:25
+            7) B II:10:4-I:3:12-III:20
+            8) C-thin Gamma:5-I-II-III
 
         Invalid configuration string examples:
             1) II:10-I:3-III:20 AB:CD (reflector must be specified)
             2) A I:30-II:0 (30 >= 26)
             3) A I-II-III AA (invalid plugboard pair - same letters)
             4) C I-II-III AB:BD (invalid plugboard pair - same letter is used multiple times)
+            5) B Beta-I-II-III (Greek rotor needs thin reflector)
+            6) B-thin I-Beta-II (Greek rotor must be the leftmost one)
         """))
         sys.exit(0)
 
@@ -150,94 +763,188 @@ def run():
     if (args.keep_spaces or args.keep_new_line or args.keep_special) and args.groups:
         raise InvalidArguments('Can\'t use division into groups with "--keep-spaces", "--keep-special" or "--keep-new-line"')
 
-    # INITIALISATION
-    rotors_list, reflector, plugboard = None, None, None
+    if args.range and not args.input_file:
+        raise InvalidArguments('Range (-r, --range) can only be used with file(-f, --input-file) input source')
 
-    # if configuration is given by string or file, parse it and use in enigma initialisation
-    if args.configuration:
-        reflector, rotors_list, plugboard = parse_configuration(args.configuration, debug=debug)
-    elif args.key_file:
-        reflector, rotors_list, plugboard = parse_configuration(args.key_file.readline(), debug=debug)
+    if args.range and not (args.configuration or args.key_file):
+        raise InvalidArguments('Range (-r, --range) requires configuration(-cnfg, --configuration) or key file(-k, --key-file)')
 
-    enigma = Enigma(rotors=rotors_list,
-                    reflector=reflector,
-                    plugboard=plugboard,
-                    random_cnfg=bool(args.random_configuration),
-                    debug=debug)
+    if args.range and not re.fullmatch(r"^[0-9]+:[0-9]+$", args.range):
+        raise InvalidArguments('Range (-r, --range) must be in format "A:B"')
 
-    # save current configuration string
-    conf_string = enigma.get_configuration()
-    encoded_string = ''
+    if args.index and (not args.output_file or args.output_file is sys.stdout):
+        raise InvalidArguments('Index (-ix, --index) can only be used with destination file(-o, --output-file)')
 
-    # FILE MODE
-    if args.input_file:
-        # read and encode char by char
-        char = args.input_file.read(1)
-        while char:
-            # if char is alph, encode it anyway
-            if char.isalpha():
-                encoded_string += enigma.encode(char)
-            # if it's space, keep it only if "-ks, --keep-spaces" was set
-            elif char == ' ':
-                if args.keep_spaces:
-                    encoded_string += char
-            # if it's new line char, keep it only if "-kn, --keep-new-line" was set
-            elif char == '\n':
-                if args.keep_new_line:
-                    encoded_string += char
-            # if it's smth else, keep it only if "-kx, --keep-special" was set
-            elif args.keep_special:
-                encoded_string += char
-
-            char = args.input_file.read(1)
+    if args.save_key and args.output_file is sys.stdout:
+        raise InvalidArguments('Key (-sk, --save-key) can\'t be saved, if destination file(-o, --output-file) is stdout')
+
+    if args.range and args.input_file is sys.stdin:
+        raise InvalidArguments('Range (-r, --range) can\'t be used with stdin input source')
+
+    if args.compress and not args.output_file:
+        raise InvalidArguments('Compression (-z, --compress) requires destination file(-o, --output-file)')
+
+    # configuration from key file is read here, so that it is checked with the other arguments
+    conf_arg = args.configuration or (args.key_file.readline() if args.key_file else None)
 
+    if args.notched and conf_arg:
+        _check_notched_rotors(conf_arg)
+
+    # compressed input is detected by its first bytes
+    input_file, input_compression = open_text_input(args.input_file) if args.input_file else (None, None)
+
+    if args.range and input_compression:
+        raise InvalidArguments('Range (-r, --range) can\'t be used with compressed source file')
+
+    compression = args.compress
+    if compression is None and args.output_file and args.output_file is not sys.stdout:
+        compression = compression_by_extension(args.output_file.name)
+
+    if args.index and compression:
+        raise InvalidArguments('Index (-ix, --index) can\'t be used with compressed destination file')
+
+    timer.stop('arguments')
+
+    # INITIALISATION
+    with timer.phase('parse_configuration'):
+        enigma = Enigma(random_cnfg=bool(args.random_configuration),
+                        debug=debug,
+                        stepping=NOTCHED if args.notched else ODOMETER)
+
+        # if configuration is given by string or file, parse it and use it
+        if conf_arg:
+            enigma.set_configuration(conf_arg)
+
+        # save current configuration string
+        conf_string = enigma.get_configuration()
+
+    # RANGE MODE
+    if args.range:
+        start, end = (int(offset) for offset in args.range.split(':'))
+
+        path = args.input_file.name
         args.input_file.close()
 
+        with timer.phase('encode'):
+            index = RangeIndex.load(index_path(path)) if os.path.exists(index_path(path)) else None
+
+            with open(path, 'rb') as file:
+                decoded = decode_range(file, start, end, enigma, index=index, groups=bool(args.groups),
+                                       keep_case=bool(args.keep_case))
+
+        with timer.phase('io'):
+            if args.output_file:
+                args.output_file.write(decoded.decode('utf-8', errors='replace'))
+                args.output_file.close()
+            else:
+                sys.stdout.buffer.write(decoded)
+                sys.stdout.buffer.write(b'\n')
+
+        _write_stats(args, timer, enigma)
+        return
+
+    # output goes to console, if destination file is not given or it is "-"
+    to_stdout = args.output_file is None or args.output_file is sys.stdout
+    output = sys.stdout if to_stdout else args.output_file
+    if compression:
+        output = open_text_output(output, compression)
+
+    # key is printed before encoded text; if encoded text is piped to stdout, key goes to stderr
+    if args.output_file is sys.stdout:
+        print(conf_string, file=sys.stderr)
+    elif to_stdout:
+        print(conf_string)
+
+    # FILE MODE: read, encode and write by chunks, so memory usage does not depend on input size
+    if args.input_file:
+        chunks = _read_chunks(input_file, timer)
+
     # STRING MODE
-    elif args.string:
-        # encode char by char
-        for char in args.string:
-            # if char is alph, encode it anyway
-            if char.isalpha():
-                encoded_string += enigma.encode(char)
-            # if it's space, keep it only if "-ks, --keep-spaces" was set
-            elif char == ' ':
-                if args.keep_spaces:
-                    encoded_string += char
-            # if it's new line char, keep it only if "-kn, --keep-new-line" was set
-            elif char == '\n':
-                if args.keep_new_line:
-                    encoded_string += char
-            # if it's smth else, keep it only if "-kx, --keep-special" was set
-            elif args.keep_special:
-                encoded_string += char
+    else:
+        chunks = [args.string]
+
+    written = 0
+    for text in chunks:
+        with timer.phase('encode'):
+            encoded_string = enigma.encode(text,
+                                           keep_spaces=bool(args.keep_spaces),
+                                           keep_new_line=bool(args.keep_new_line),
+                                           keep_special=bool(args.keep_special),
+                                           keep_case=bool(args.keep_case))
+
+        # format encoded string, if needed (groups continue across chunks)
+        with timer.phase('formatting'):
+            if args.groups:
+                formatted_string = format_output_string(encoded_string, start=written)
+                written += len(encoded_string)
+                encoded_string = formatted_string
+
+        with timer.phase('io'):
+            output.write(encoded_string)
+            output.flush()
+
+    if args.input_file:
+        input_file.close()
+        args.input_file.close()
 
     # OUTPUT
-    if args.output_file:
-        # format encoded string, if needed
-        if args.groups:
-            encoded_string = format_output_string(encoded_string)
+    with timer.phase('io'):
+        # finish compressed stream (destination file stays open)
+        if compression:
+            output.close()
 
-        # write to file
-        args.output_file.write(encoded_string)
+        if to_stdout:
+            # new line after encoded text, unless it is piped
+            if args.output_file is None:
+                output.write('\n')
+            sys.stdout.flush()
+        else:
+            path = os.path.realpath(args.output_file.name)
 
-        path = os.path.realpath(args.output_file.name)
+            # save key
+            if args.save_key:
+                with open(path+'.key', 'w') as key_file:
+                    key_file.write(conf_string)
 
-        # save key
-        if args.save_key:
-            with open(path+'.key', 'w') as key_file:
-                key_file.write(conf_string)
+            args.output_file.close()
 
-        args.output_file.close()
+            # save index
+            if args.index:
+                with open(path, 'rb') as file:
+                    RangeIndex.build(file).save(index_path(path))
 
-        print(conf_string + '\n' + path)
+            print(conf_string + '\n' + path)
+
+    _write_stats(args, timer, enigma)
 
-    else:
-        # format encoded string, if needed
-        if args.groups:
-            encoded_string = format_output_string(encoded_string)
 
-        print(conf_string + '\n' + encoded_string)
+def _read_chunks(file, timer: PhaseTimer):
+    """
+    Read text file (or stdin) by chunks of CHUNK_SIZE characters.
+    Chunks are read (and decompressed) ahead in background thread, while the current one is encoded.
+    """
+    chunks = prefetch(iter(functools.partial(file.read, CHUNK_SIZE), ''))
+    while True:
+        with timer.phase('io'):
+            text = next(chunks, None)
+        if text is None:
+            break
+        yield text
+
+
+def _write_stats(args, timer: PhaseTimer, enigma: Enigma):
+    """
+    Print phases timing (if "--stats") and save them with Enigma's counters in Prometheus format (if "--stats-file").
+    """
+    if args.stats:
+        print(timer.report(), file=sys.stderr)
+        print(f'{"chars encoded":<20} {enigma.metrics.chars_encoded:>10}', file=sys.stderr)
+        if enigma.memo is not None:
+            print(f'{"memo hit rate":<20} {enigma.memo.hit_rate:>10.1%}', file=sys.stderr)
+
+    if args.stats_file:
+        args.stats_file.write(timer.to_prometheus() + enigma.metrics.to_prometheus())
+        args.stats_file.close()
 
 
 if __name__ == "__main__":
@@ -1,12 +1,16 @@
 """
 Enigma class
 """
-import random
 from .rotor import Rotor
 from .reflector import Reflector
 from .plugboard import Plugboard
+from .stepping import ODOMETER, NOTCHED, STEPPING_MODES, MAX_NOTCHED_ROTORS, get_schedule, odometer_carries
+from .metrics import Metrics
+from .memo import EncodeMemo, memo_key
 
-from .utils import parse_configuration, prepare_string
+from .utils import parse_configuration, keep_only_alph, keep_passthrough, copy_case, replace_letters
+from .keygen import random_configuration
+from .spec import MachineSpec, Cursor, plugboard_map, LETTER_TO_INDEX, INDEX_TO_LETTER
 
 DEFAULT_ROTORS_LIST = [Rotor.I(), Rotor.II()]
 DEFAULT_REFLECTOR = Reflector.A()
@@ -22,59 +26,102 @@ class Enigma:
         reflector (Reflector): Reflector.
         plugboard (Plugboard): Plugboard.
         debug (bool):          Enable debug mode
+        stepping (str):        Rotors stepping: 'odometer' (default) or 'notched' (historical, with double stepping).
+        memo (EncodeMemo):     Memo of encoded messages (see 'EncodeMemo'). Default: messages are always encoded.
 
     Attributes:
         debug (bool): Debug mode.
+        stepping (str):        Rotors stepping mode.
         first_rotor (Rotor):   The first rotor.
         last_rotor (Rotor):    The last rotor.
         reflector (Reflector): Reflector.
         plugboard (Plugboard): Plugboard.
+        metrics (Metrics):     Counters (encoded characters, rotors carries, configuration parses, memo counters).
+        memo (EncodeMemo):     Memo of encoded messages (None - not used).
 
     """
 
-    def __init__(self, random_cnfg: bool = False, rotors: list[Rotor] = None, reflector: Reflector = None, plugboard: Plugboard = None, debug: bool = False):
+    def __init__(self, random_cnfg: bool = False, rotors: list[Rotor] = None, reflector: Reflector = None, plugboard: Plugboard = None, debug: bool = False, stepping: str = ODOMETER,
+                 memo: EncodeMemo = None):
+        if stepping not in STEPPING_MODES:
+            raise ValueError(f'Unknown stepping mode "{stepping}"')
+
         self.debug = debug
+        self.stepping = stepping
+        self.metrics = Metrics()
+        self.memo = memo
         self.first_rotor = None
         self.last_rotor = None
 
+        # notched stepping: schedule from the current start positions and amount of steps made
+        self._schedule = None
+        self._offset = 0
+
+        # spec of current wirings, used for encoding (see '_get_cached_spec')
+        self._spec_cache = None
+
         if random_cnfg:
             self.set_random_configuration()
         else:
-            rotors = rotors if rotors is not None else DEFAULT_ROTORS_LIST
-            reflector = reflector if reflector is not None else DEFAULT_REFLECTOR
-            plugboard = plugboard if plugboard is not None else DEFAULT_PLUGBOARD
+            # defaults are copied, so that different instances never share (and move) the same rotors
+            if rotors is None:
+                rotors = [Rotor.by_num(rotor.num, pos=rotor.pos, debug=debug) for rotor in DEFAULT_ROTORS_LIST]
+            if reflector is None:
+                reflector = Reflector.by_num(DEFAULT_REFLECTOR.num, debug=debug)
+            if plugboard is None:
+                plugboard = Plugboard(pairs=[set(pair) for pair in DEFAULT_PLUGBOARD.pairs], debug=debug)
 
             self.create_rotors_dll(rotors)
 
             self.reflector = reflector
             self.plugboard = plugboard
 
+    def __reduce__(self):
+        # compact state: rotors (without links), reflector, plugboard and counters;
+        # linked list and cached spec are rebuilt in the other process, memo is not pickled
+        metrics = (self.metrics.chars_encoded, self.metrics.configuration_parses, tuple(self.metrics.carries))
+        return _restore_enigma, (tuple(self.get_rotors_list(reverse=True)), self.reflector, self.plugboard,
+                                 self.stepping, self.debug, metrics)
+
+    @property
+    def memo(self):
+        """Memo of encoded messages (its counters are exported with 'metrics')."""
+        return self._memo
+
+    @memo.setter
+    def memo(self, memo: EncodeMemo):
+        self._memo = memo
+        self.metrics.memo = memo
+
     def create_rotors_dll(self, rotors_list: list[Rotor]):
         """Create doubly linked list of rotors.
 
         Args:
-            rotors_list (list[Rotor]): List of rotors.
+            rotors_list (list[Rotor]): List of rotors (the last one is the first rotor). List itself is not changed.
 
         Returns:
             None
 
         Raises:
-            ValueError: If 'rotors_list' is empty.
+            ValueError: If 'rotors_list' is empty or has too many rotors for notched stepping.
         """
 
         if len(rotors_list) == 0:
             raise ValueError('Empty rotors list')
+        if self.stepping == NOTCHED and len(rotors_list) > MAX_NOTCHED_ROTORS:
+            raise ValueError(f'Notched stepping supports at most {MAX_NOTCHED_ROTORS} rotors')
 
         self.first_rotor = None
         self.last_rotor = None
+        self._schedule = None
 
-        rotors_list.reverse()
-        prev_rotor = rotors_list[0]
-        for rotor in rotors_list:
+        prev_rotor = None
+        for rotor in reversed(rotors_list):
+            rotor.prev_rotor = prev_rotor
+            rotor.next_rotor = None
             if self.first_rotor is None:
                 self.first_rotor = rotor
             else:
-                rotor.prev_rotor = prev_rotor
                 prev_rotor.next_rotor = rotor
 
             prev_rotor = rotor
@@ -115,9 +162,9 @@ class Enigma:
         reflector_num = self.reflector.num
 
         rotor = self.last_rotor
-        rotors_conf = []
+        rotors_conf = [str(self.reflector.greek)] if self.reflector.greek is not None else []
         while rotor is not None:
-            rotors_conf.append(rotor.num + ':' + str(rotor.pos))
+            rotors_conf.append(str(rotor))
             rotor = rotor.prev_rotor
         rotors_conf_str = '-'.join(rotors_conf)
 
@@ -128,6 +175,46 @@ class Enigma:
         else:
             return ' '.join([reflector_num, rotors_conf_str, plugboard_conf])
 
+    def get_spec(self):
+        """Get immutable spec of current wirings (see 'MachineSpec').
+
+        Returns:
+            MachineSpec: Machine spec.
+        """
+        rotors_list = self.get_rotors_list()
+        return MachineSpec(
+            rotors=tuple(bytes(rotor.coding_list) for rotor in rotors_list),
+            reflector=bytes(self.reflector.coding_list),
+            plugboard=plugboard_map(self.plugboard),
+            notches=tuple(rotor.notches for rotor in rotors_list),
+            stepping=self.stepping,
+            rotor_nums=tuple(rotor.num for rotor in rotors_list),
+            reflector_num=self.reflector.num,
+            rings=tuple(rotor.ring for rotor in rotors_list),
+            greek=str(self.reflector.greek) if self.reflector.greek is not None else '',
+        )
+
+    def get_cursor(self):
+        """Get cursor at current rotors positions (see 'Cursor').
+
+        Returns:
+            Cursor: Cursor instance.
+        """
+        return Cursor(rotor.pos for rotor in self.get_rotors_list())
+
+    def set_cursor(self, cursor: Cursor):
+        """Set rotors positions from cursor (see 'get_cursor'). Wirings are not changed, so nothing is parsed again.
+
+        Args:
+            cursor (Cursor): Cursor.
+
+        Returns:
+            None
+        """
+        for rotor, pos in zip(self.get_rotors_list(), cursor.positions):
+            rotor.pos = pos
+        self._schedule = None
+
     def set_configuration(self, conf_str: str):
         """Set configuraion by configuration string.
 
@@ -136,8 +223,12 @@ class Enigma:
 
         Returns:
             None
+
+        Raises:
+            ValueError: If configuration has too many rotors for notched stepping (see 'create_rotors_dll').
         """
         reflector, rotors_list, plugboard = parse_configuration(conf_str, debug=self.debug)
+        self.metrics.configuration_parses += 1
         self.create_rotors_dll(rotors_list)
         self.reflector = reflector
         self.plugboard = plugboard
@@ -152,22 +243,70 @@ class Enigma:
         Returns:
             None
         """
-        available_rotors_list = Rotor.list()
-        rotors_list = []
-        for _ in range(rotors_amount):
-            rotor = random.choice(available_rotors_list)
-            rotor.debug = self.debug
-            rotor.pos = random.randint(0, 24)
-            rotors_list.append(rotor)
-            available_rotors_list.remove(rotor)
+        self.set_configuration(random_configuration(rotors_amount, plugpairs_amount))
 
-        self.create_rotors_dll(rotors_list)
-        self.reflector = random.choice(Reflector.list())
-        self.reflector.debug = self.debug
-        self.plugboard = Plugboard()
-        self.plugboard.debug = self.debug
-        for _ in range(plugpairs_amount):
-            self.plugboard.plug_random()
+    def advance(self, steps: int):
+        """Move rotors by 'steps' key presses without encoding anything.
+
+        Rotors work as an odometer (the first rotor is the least significant digit),
+        so positions after N key presses are computed directly instead of shifting N times.
+        Negative 'steps' moves rotors backwards.
+        In notched stepping mode, positions are taken from precomputed stepping schedule.
+
+        Args:
+            steps (int): Amount of key presses.
+
+        Returns:
+            None
+
+        Raises:
+            ValueError: If 'steps' is negative in notched stepping mode.
+        """
+        if self.stepping == NOTCHED:
+            self._set_schedule_offset(self._get_schedule_offset() + steps)
+            return
+
+        rotors_list = self.get_rotors_list()
+
+        value = 0
+        for rotor in reversed(rotors_list):
+            value = value * 26 + rotor.pos
+        value = (value + steps) % 26 ** len(rotors_list)
+
+        for rotor in rotors_list:
+            value, rotor.pos = divmod(value, 26)
+
+    def _get_schedule_offset(self):
+        """Get amount of steps made since the start of notched stepping schedule.
+
+        Schedule is built from the current positions, if there is no schedule yet.
+
+        Returns:
+            int: Amount of steps.
+        """
+        if self._schedule is None:
+            rotors_list = self.get_rotors_list()
+            self._schedule = get_schedule(
+                tuple(rotor.pos for rotor in rotors_list),
+                tuple(rotor.notches for rotor in rotors_list),
+            )
+            self._offset = 0
+        return self._offset
+
+    def _set_schedule_offset(self, offset: int):
+        """Set rotors positions from notched stepping schedule.
+
+        Args:
+            offset (int): Amount of steps since the start of schedule.
+
+        Returns:
+            None
+        """
+        self._offset = self._schedule.normalize(offset)
+        rotor = self.first_rotor
+        for pos in self._schedule.positions[self._offset]:
+            rotor.pos = pos
+            rotor = rotor.next_rotor
 
     def _encode_char(self, char: str):
         """Encode char.
@@ -184,7 +323,10 @@ class Enigma:
         if len(char) != 1:
             raise ValueError('"char" length must be 1')
 
-        self.first_rotor.shift()                                    # shift (rotate by 1) the first rotor
+        if self.stepping == NOTCHED:
+            self._set_schedule_offset(self._get_schedule_offset() + 1)   # move rotors by schedule
+        else:
+            self.first_rotor.shift()                                # shift (rotate by 1) the first rotor
 
         encoded_char = self.plugboard.encode(char)                  # through plugboard
         encoded_char = self.first_rotor.encode(encoded_char)        # through all rotors 1-N
@@ -197,24 +339,124 @@ class Enigma:
 
         return encoded_char
 
-    def encode(self, string: str = '', save_state: bool = False):
+    def _get_cached_spec(self):
+        """Get spec of current wirings, reusing it while wirings, notches, plugboard and stepping are the same.
+
+        Spec is compared by value (not by rotors and reflector objects), so it is reused after 'set_configuration'
+        with the same key, i.e. when only positions are changed.
+
+        Returns:
+            MachineSpec: Machine spec.
+        """
+        rotors_list = self.get_rotors_list()
+        key = (
+            tuple((bytes(rotor.coding_list), rotor.notches, rotor.num, rotor.ring) for rotor in rotors_list),
+            bytes(self.reflector.coding_list), self.reflector.num, str(self.reflector.greek),
+            plugboard_map(self.plugboard), self.stepping,
+        )
+        if self._spec_cache is None or self._spec_cache[0] != key:
+            self._spec_cache = (key, self.get_spec())
+        return self._spec_cache[1]
+
+    def _encode_letters(self, letters: str):
+        """Encode lower-cased eng alph chars.
+
+        In debug mode letters are encoded one by one (each step is printed),
+        otherwise all of them are encoded at once by machine spec (see 'MachineSpec.encode_indices').
+        If memo is set, letters, encoded before by the same spec at the same positions, are taken from it
+        (rotors are only advanced).
+
+        Args:
+            letters (str): Letters to encode.
+
+        Returns:
+            str: Encoded letters.
+        """
+        if self.debug:
+            return ''.join(self._encode_char(char) for char in letters)
+
+        spec = self._get_cached_spec()
+        if self.memo is not None and letters:
+            key = memo_key(spec, tuple(rotor.pos for rotor in self.get_rotors_list()), letters)
+            encoded = self.memo.get(key)
+            if encoded is not None:
+                self.advance(len(letters))
+                return encoded
+
+        if self.stepping == NOTCHED:
+            offset = self._get_schedule_offset()
+            cursor = Cursor(self._schedule.positions[0])
+            cursor.offset = offset
+        else:
+            cursor = self.get_cursor()
+
+        encoded = spec.encode_indices(letters.encode('ascii').translate(LETTER_TO_INDEX), cursor)
+
+        if self.stepping == NOTCHED:
+            self._set_schedule_offset(cursor.offset)
+        else:
+            for rotor, pos in zip(self.get_rotors_list(), cursor.positions):
+                rotor.pos = pos
+
+        encoded = encoded.translate(INDEX_TO_LETTER).decode('ascii')
+        if self.memo is not None and letters:
+            self.memo.put(key, encoded)
+        return encoded
+
+    def encode(self, string: str = '', save_state: bool = False, keep_spaces: bool = False, keep_new_line: bool = False, keep_special: bool = False, keep_case: bool = False):
         """Encode string.
 
+        By default only letters are encoded and everything else is removed.
+        Passthrough policy keeps other characters in place (they are not encoded and don't move rotors).
+        Whole string is processed in one pass.
+
         Args:
-            string (str):      String to encode.
-            save_state (bool): Save state after encoding
+            string (str):         String to encode.
+            save_state (bool):    Save state after encoding
+            keep_spaces (bool):   Keep spaces.
+            keep_new_line (bool): Keep new line characters.
+            keep_special (bool):  Keep all other characters (except non-ASCII letters, which can't be encoded).
+            keep_case (bool):     Keep case of letters (by default encoded letters are lower-cased).
 
         Returns:
             str: Encoded string.
         """
         if save_state:
-            cnfg_string = self.get_configuration()
+            cursor = self.get_cursor()
+
+        text = keep_passthrough(string, keep_spaces, keep_new_line, keep_special)
+        letters = keep_only_alph(text) if keep_spaces or keep_new_line or keep_special else text
 
-        encoded_string = ''
-        for char in prepare_string(string):
-            encoded_string += self._encode_char(char)
+        if self.stepping == NOTCHED:
+            offset = self._get_schedule_offset()
+            schedule = self._schedule
+        else:
+            positions = [rotor.pos for rotor in self.get_rotors_list()]
+
+        encoded_string = self._encode_letters(letters.lower())
+
+        self.metrics.chars_encoded += len(letters)
+        if self.stepping == NOTCHED:
+            self.metrics.add_carries([
+                after - before for after, before in zip(schedule.carries_at(offset + len(letters)), schedule.carries_at(offset))
+            ])
+        else:
+            self.metrics.add_carries(odometer_carries(positions, len(letters)))
+
+        if keep_case:
+            encoded_string = copy_case(letters, encoded_string)
+        if len(letters) != len(text):
+            encoded_string = replace_letters(text, encoded_string)
 
         if save_state:
-            self.set_configuration(cnfg_string)
+            self.set_cursor(cursor)   # only positions are restored, wirings (and spec) are kept
 
         return encoded_string
+
+
+def _restore_enigma(rotors: tuple, reflector: Reflector, plugboard: Plugboard, stepping: str, debug: bool, metrics: tuple):
+    """Rebuild pickled Enigma (see 'Enigma.__reduce__')."""
+    enigma = Enigma(rotors=list(rotors), reflector=reflector, plugboard=plugboard, debug=debug, stepping=stepping)
+    enigma.metrics.chars_encoded, enigma.metrics.configuration_parses, carries = metrics
+    enigma.metrics.carries = list(carries)
+    return enigma
@@ -0,0 +1,296 @@
+"""
+Differential harness: every engine is checked against the reference implementation
+"""
+import json
+import os
+import random
+import time
+
+from .common import ALPH
+from .enigma import Enigma
+from .byte_enigma import ByteEnigma
+from .keygen import ROTOR_NUMS, generate_configurations
+from .pool import MachinePool
+from .reflector import Reflector
+from .spec import MachineSpec, LETTER_TO_INDEX, INDEX_TO_LETTER
+from .stepping import ODOMETER, NOTCHED, STEPPING_MODES, MAX_NOTCHED_ROTORS
+from .sweep import Sweep, position_index
+from .utils import parse_configuration, prepare_string, GREEK_ROTOR_NUMS, THIN_REFLECTOR_NUMS
+
+# characters of random messages: letters (more often) and some characters, which must be skipped
+MESSAGE_CHARS = ALPH * 4 + [char.upper() for char in ALPH] + list(' .,!?\n1')
+
+# throughput of engine may drop to this fraction of its baseline, before it is counted as regression
+DEFAULT_THRESHOLD = 0.8
+
+
+def reference_encode(conf_str: str, message: str, stepping: str = ODOMETER):
+    """Encode message char by char through linked rotors (Rotor.shift, Rotor.encode, Plugboard.encode, ...).
+    Reference for all engines.
+
+    Nothing is shared with engines' fast paths: notched stepping is made key by key by the model of pawls
+    (see '_reference_notched_step'), not by stepping schedules, and Greek rotor is passed by letter
+    on both ways, instead of being folded into thin reflector.
+
+    Args:
+        conf_str (str): Configuration string.
+        message (str):  Message.
+        stepping (str): Rotors stepping mode.
+
+    Returns:
+        tuple[str, tuple[int]]: Encoded message and final rotors positions (from the first rotor to the last).
+    """
+    reflector, rotors_list, plugboard = parse_configuration(conf_str)
+    greek = reflector.greek
+    if greek is not None:
+        reflector = Reflector.by_num(reflector.num)
+
+    enigma = Enigma(rotors=rotors_list, reflector=reflector, plugboard=plugboard)
+    rotors = enigma.get_rotors_list()
+
+    encoded = []
+    for char in prepare_string(message):
+        if stepping == NOTCHED:
+            _reference_notched_step(rotors)
+        else:
+            enigma.first_rotor.shift()
+
+        char = enigma.first_rotor.encode(plugboard.encode(char))
+        if greek is not None:
+            char = greek.encode(reflector.encode(greek.encode(char)), reverse=True)
+        else:
+            char = reflector.encode(char)
+        encoded.append(plugboard.encode(enigma.last_rotor.encode(char, True)))
+    return ''.join(encoded), tuple(rotor.pos for rotor in rotors)
+
+
+def _reference_notched_step(rotors: list):
+    """Make one key press of notched stepping (rotors from the first one).
+
+    Pawl k stands between rotors k - 1 and k. When rotor k - 1 is at its notch, pawl engages it and pushes
+    both rotors: so rotor k is turned over, and rotor k - 1 moves once more (double stepping).
+    The first rotor moves at every key press.
+    """
+    moving = {0}
+    for k in range(1, len(rotors)):
+        if rotors[k - 1].pos in rotors[k - 1].notches:
+            moving.update((k - 1, k))
+    for k in moving:
+        rotors[k].pos = (rotors[k].pos + 1) % 26
+
+
+def _odometer_positions(state: int, rotors_amount: int):
+    """Get positions of odometer state (see 'position_index'), after it is wrapped around."""
+    state %= 26 ** rotors_amount
+    positions = []
+    for _ in range(rotors_amount):
+        state, pos = divmod(state, 26)
+        positions.append(pos)
+    return tuple(positions)
+
+
+def _encode_enigma(conf_str: str, message: str, stepping: str):
+    """Engine: 'Enigma.encode' of the whole message."""
+    enigma = Enigma(stepping=stepping)
+    enigma.set_configuration(conf_str)
+    encoded = enigma.encode(message)
+    return encoded, tuple(rotor.pos for rotor in enigma.get_rotors_list())
+
+
+def _encode_enigma_passthrough(conf_str: str, message: str, stepping: str):
+    """Engine: 'Enigma.encode' of the whole message, keeping all characters and case (letters are compared)."""
+    enigma = Enigma(stepping=stepping)
+    enigma.set_configuration(conf_str)
+    encoded = enigma.encode(message, keep_spaces=True, keep_new_line=True, keep_special=True, keep_case=True)
+    return prepare_string(encoded), tuple(rotor.pos for rotor in enigma.get_rotors_list())
+
+
+def _encode_spec(conf_str: str, message: str, stepping: str):
+    """Engine: 'MachineSpec.encode'."""
+    spec, cursor = MachineSpec.from_configuration(conf_str, stepping)
+    encoded = spec.encode(message, cursor)
+    return encoded, tuple(cursor.positions)
+
+
+def _encode_byte_enigma(conf_str: str, message: str, stepping: str):
+    """Engine: 'ByteEnigma.encode' over alphabet of 26 letters."""
+    spec, cursor = MachineSpec.from_configuration(conf_str, stepping)
+    byte_enigma = ByteEnigma(rotors=list(spec.rotors), reflector=spec.reflector, plugboard=spec.plugboard,
+                             positions=cursor.positions, size=len(ALPH))
+    indices = prepare_string(message).encode('ascii').translate(LETTER_TO_INDEX)
+    encoded = byte_enigma.encode(indices).translate(INDEX_TO_LETTER).decode('ascii')
+    return encoded, tuple(byte_enigma.positions)
+
+
+def _encode_pool(conf_str: str, message: str, stepping: str):
+    """Engine: 'MachinePool.encode' of one session."""
+    pool = MachinePool(max_rotors=len(ROTOR_NUMS))
+    session = pool.alloc_configuration(conf_str, stepping)
+    encoded = pool.encode(session, message)
+    return encoded, tuple(pool.get_cursor(session).positions)
+
+
+def _encode_permutations(conf_str: str, message: str, stepping: str):
+    """Engine: 'PermutationBatch.apply' of machine's permutations at all states (see 'MachineSpec.permutations')."""
+    spec, cursor = MachineSpec.from_configuration(conf_str, stepping)
+    indices = prepare_string(message).encode('ascii').translate(LETTER_TO_INDEX)
+    state = position_index(cursor.positions)
+    encoded = spec.permutations().apply(indices, start=state + 1).translate(INDEX_TO_LETTER).decode('ascii')
+    return encoded, _odometer_positions(state + len(indices), len(spec.rotors))
+
+
+def _encode_sweep(conf_str: str, message: str, stepping: str):
+    """Engine: output of 'Sweep' (message under all start positions) at configuration's positions."""
+    spec, cursor = MachineSpec.from_configuration(conf_str, stepping)
+    sweep = Sweep(spec, message)
+    return sweep.output(cursor.positions), _odometer_positions(position_index(cursor.positions) + sweep.length, len(spec.rotors))
+
+
+# engine name => (function(conf_str, message, stepping) -> (encoded message, final positions), supported stepping modes,
+#                 max amount of rotors: engines with tables of all 26^N states are checked only on a few rotors)
+ENGINES = {
+    'enigma': (_encode_enigma, STEPPING_MODES, len(ROTOR_NUMS)),
+    'enigma_passthrough': (_encode_enigma_passthrough, STEPPING_MODES, len(ROTOR_NUMS)),
+    'spec': (_encode_spec, STEPPING_MODES, len(ROTOR_NUMS)),
+    'byte_enigma': (_encode_byte_enigma, [ODOMETER], len(ROTOR_NUMS)),
+    'pool': (_encode_pool, STEPPING_MODES, len(ROTOR_NUMS)),
+    'permutations': (_encode_permutations, [ODOMETER], 3),
+    'sweep': (_encode_sweep, [ODOMETER], 2),
+}
+
+
+def _rotors_amount(conf_str: str):
+    """Get amount of stepping rotors of configuration (Greek rotor is not counted)."""
+    return sum(rotor_conf.split(':')[0] not in GREEK_ROTOR_NUMS for rotor_conf in conf_str.split(' ')[1].split('-'))
+
+
+def random_cases(count: int, seed=None, max_length: int = 2000):
+    """Generate random test cases: configuration (any amount of rotors and plugpairs, ring settings, thin reflector
+    with Greek rotor), message and stepping mode.
+
+    Args:
+        count (int):      Amount of cases.
+        seed (int | str): Random numbers generator seed.
+        max_length (int): Max length of message.
+
+    Yields:
+        tuple[str, str, str]: Configuration string, message and stepping mode.
+    """
+    rng = random.Random(seed)
+    for i in range(count):
+        stepping = STEPPING_MODES[i % len(STEPPING_MODES)]
+        max_rotors = MAX_NOTCHED_ROTORS if stepping == NOTCHED else len(ROTOR_NUMS)
+        rotors_amount = rng.randint(1, max_rotors)
+        # every other case has full plugboard
+        plugpairs_amount = len(ALPH) // 2 if rng.random() < 0.5 else rng.randint(0, len(ALPH) // 2)
+
+        conf_str = next(generate_configurations(1, rotors_amount, plugpairs_amount, seed=rng.getrandbits(64)))
+        reflector, rotors_conf, *plugboard = conf_str.split(' ')
+        rotor_confs = rotors_conf.split('-')
+        # every other case has ring settings, every fourth one is four-rotor machine
+        if rng.random() < 0.5:
+            rotor_confs = [f'{rotor_conf}:{rng.randrange(26)}' for rotor_conf in rotor_confs]
+        if rng.random() < 0.25:
+            reflector = rng.choice(THIN_REFLECTOR_NUMS)
+            rotor_confs.insert(0, f'{rng.choice(GREEK_ROTOR_NUMS)}:{rng.randrange(26)}:{rng.randrange(26)}')
+        conf_str = ' '.join([reflector, '-'.join(rotor_confs)] + plugboard)
+
+        message = ''.join(rng.choices(MESSAGE_CHARS, k=rng.randint(0, max_length)))
+        yield conf_str, message, stepping
+
+
+def check_engines(count: int = 100, seed=None, max_length: int = 2000, engines: list[str] = None):
+    """Compare every engine with the reference implementation on random cases.
+
+    Args:
+        count (int):         Amount of random cases.
+        seed (int | str):    Random numbers generator seed.
+        max_length (int):    Max length of message.
+        engines (list[str]): Names of engines to check. Default: all engines.
+
+    Returns:
+        list[dict]: Mismatches (engine, configuration, stepping, message, expected and actual results).
+    """
+    engines = engines if engines is not None else list(ENGINES)
+    mismatches = []
+    for conf_str, message, stepping in random_cases(count, seed=seed, max_length=max_length):
+        expected = reference_encode(conf_str, message, stepping)
+        for name in engines:
+            function, stepping_modes, max_rotors = ENGINES[name]
+            if stepping not in stepping_modes or _rotors_amount(conf_str) > max_rotors:
+                continue
+
+            actual = function(conf_str, message, stepping)
+            if actual != expected:
+                mismatches.append({
+                    'engine': name,
+                    'configuration': conf_str,
+                    'stepping': stepping,
+                    'message': message,
+                    'expected': expected,
+                    'actual': actual,
+                })
+    return mismatches
+
+
+def measure_throughput(engines: list[str] = None, length: int = 100000, repeats: int = 3, seed: int = 0):
+    """Measure throughput of engines (the best of 'repeats' runs) on the same random message (3 rotors).
+
+    Args:
+        engines (list[str]): Names of engines. Default: all engines, which support 3 rotors.
+        length (int):        Message length.
+        repeats (int):       Amount of runs of each engine.
+        seed (int | str):    Random numbers generator seed.
+
+    Returns:
+        dict[str, float]: Engine name => encoded characters per second.
+    """
+    engines = engines if engines is not None else [name for name, (_, _, max_rotors) in ENGINES.items() if max_rotors >= 3]
+    rng = random.Random(seed)
+    conf_str = next(generate_configurations(1, 3, 10, seed=rng.getrandbits(64)))
+    message = ''.join(rng.choices(ALPH, k=length))
+
+    throughput = {}
+    for name in engines:
+        function, _, _ = ENGINES[name]
+        best = float('inf')
+        for _ in range(repeats):
+            start = time.perf_counter()
+            function(conf_str, message, ODOMETER)
+            best = min(best, time.perf_counter() - start)
+        throughput[name] = length / best if best > 0 else float('inf')
+    return throughput
+
+
+def check_baselines(path: str, threshold: float = DEFAULT_THRESHOLD, update: bool = False, **kwargs):
+    """Measure throughput of engines and compare it with baselines, saved in JSON file.
+
+    Baselines file is created, if it doesn't exist (or if 'update').
+    Format: {"engine name": characters per second, ...}.
+
+    Args:
+        path (str):        Path to baselines file.
+        threshold (float): Allowed fraction of baseline throughput.
+        update (bool):     Save measured throughput as new baselines.
+        **kwargs:          Arguments of 'measure_throughput'.
+
+    Returns:
+        dict[str, tuple[float, float]]: Regressions: engine name => (baseline, measured throughput).
+    """
+    measured = measure_throughput(**kwargs)
+
+    if update or not os.path.exists(path):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump(measured, file, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+        return {}
+
+    with open(path) as file:
+        baselines = json.load(file)
+
+    return {
+        name: (baselines[name], value)
+        for name, value in measured.items()
+        if name in baselines and value < baselines[name] * threshold
+    }
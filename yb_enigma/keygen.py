@@ -0,0 +1,165 @@
+"""
+Bulk generation of random configuration strings (keys)
+"""
+import itertools
+import math
+import random
+import secrets
+
+from .common import ALPH
+from .reflector import Reflector
+from .rotor import Rotor
+
+REFLECTOR_NUMS = [reflector.num for reflector in Reflector.list()]
+ROTOR_NUMS = [rotor.num for rotor in Rotor.list()]
+PLUG_LETTERS = [char.upper() for char in ALPH]
+
+# amount of keys, generated and written at once
+KEYSHEET_BATCH = 65536
+
+
+def plugboards_amount(plugpairs_amount: int):
+    """Get amount of different plugboards with exactly 'plugpairs_amount' pairs.
+
+    Args:
+        plugpairs_amount (int): Amount of plugpairs.
+
+    Returns:
+        int: Amount of plugboards.
+    """
+    letters = 2 * plugpairs_amount
+    return math.comb(len(ALPH), letters) * math.prod(range(1, letters, 2))
+
+
+def keyspace_size(rotors_amount: int = 3, plugpairs_amount: int = 6):
+    """Get amount of different keys, that can be generated (see 'generate_configurations').
+
+    Args:
+        rotors_amount (int):    Amount of rotors.
+        plugpairs_amount (int): Amount of plugpairs.
+
+    Returns:
+        int: Amount of keys.
+    """
+    return (len(REFLECTOR_NUMS) * math.perm(len(ROTOR_NUMS), rotors_amount)
+            * 26 ** rotors_amount * plugboards_amount(plugpairs_amount))
+
+
+def generate_configurations(count: int, rotors_amount: int = 3, plugpairs_amount: int = 6, seed=None, unique: bool = False):
+    """Generate uniformly distributed random configuration strings.
+
+    Each configuration uses different rotors (like 'Enigma.set_random_configuration').
+    Plugpairs are written in canonical form (letters and pairs sorted), so equal keys are equal strings.
+
+    Args:
+        count (int):            Amount of configurations.
+        rotors_amount (int):    Amount of rotors.
+        plugpairs_amount (int): Amount of plugpairs.
+        seed (int | str):       Random numbers generator seed. If None, 'secrets' module is used.
+        unique (bool):          Do not repeat configurations.
+
+    Yields:
+        str: Configuration string.
+
+    Raises:
+        ValueError: If arguments are out of range.
+    """
+    if not 1 <= rotors_amount <= len(ROTOR_NUMS):
+        raise ValueError(f'"rotors_amount" must be in range 1...{len(ROTOR_NUMS)}')
+    if not 0 <= plugpairs_amount <= len(ALPH) // 2:
+        raise ValueError(f'"plugpairs_amount" must be in range 0...{len(ALPH) // 2}')
+    if unique and count > keyspace_size(rotors_amount, plugpairs_amount):
+        raise ValueError('Not enough unique configurations')
+
+    rng = random.Random(seed) if seed is not None else secrets.SystemRandom()
+    getrandbits = rng.getrandbits
+
+    # "A ", "B ", ...: reflectors prefix, "I:0", "I:1", ...: rotors with positions
+    reflectors = [num + ' ' for num in REFLECTOR_NUMS]
+    rotors = [[f'{num}:{pos}' for pos in range(26)] for num in ROTOR_NUMS]
+
+    # every key is decoded from one random number: reflector, rotors order, positions and letters of plugpairs
+    # (plugpairs are made of consecutive letters of random ordered sample, so each plugboard is equally likely)
+    letters = 2 * plugpairs_amount
+    key_size = (len(reflectors) * math.perm(len(ROTOR_NUMS), rotors_amount)
+                * 26 ** rotors_amount * math.perm(len(PLUG_LETTERS), letters))
+    bits = key_size.bit_length()
+    seen = set()
+
+    generated = 0
+    while generated < count:
+        key = getrandbits(bits)
+        if key >= key_size:
+            continue
+
+        key, reflector = divmod(key, len(reflectors))
+        available = list(range(len(ROTOR_NUMS)))
+        rotors_conf = []
+        for i in range(rotors_amount):
+            key, rotor = divmod(key, len(available) - i)
+            key, pos = divmod(key, 26)
+            rotors_conf.append(rotors[available[rotor]][pos])
+            available[rotor] = available[-1 - i]
+
+        conf = reflectors[reflector] + '-'.join(rotors_conf)
+
+        if letters:
+            available = PLUG_LETTERS.copy()
+            pairs = []
+            for i in range(0, letters, 2):
+                key, a = divmod(key, len(available) - i)
+                first = available[a]
+                available[a] = available[-1 - i]
+                key, b = divmod(key, len(available) - i - 1)
+                second = available[b]
+                available[b] = available[-2 - i]
+                pairs.append(first + second if first < second else second + first)
+            pairs.sort()
+            conf += ' ' + ':'.join(pairs)
+
+        if unique:
+            if conf in seen:
+                continue
+            seen.add(conf)
+
+        generated += 1
+        yield conf
+
+
+def random_configuration(rotors_amount: int = 3, plugpairs_amount: int = 6, seed=None):
+    """Generate one random configuration string.
+
+    Args:
+        rotors_amount (int):    Amount of rotors.
+        plugpairs_amount (int): Amount of plugpairs.
+        seed (int | str):       Random numbers generator seed. If None, 'secrets' module is used.
+
+    Returns:
+        str: Configuration string.
+    """
+    return next(generate_configurations(1, rotors_amount, plugpairs_amount, seed=seed))
+
+
+def write_keysheet(file, count: int, rotors_amount: int = 3, plugpairs_amount: int = 6, seed=None, unique: bool = False):
+    """Write random configuration strings to keysheet file, one per line.
+
+    Keys are written in batches, so memory usage does not depend on 'count'
+    (except 'unique' mode, which has to remember all generated keys).
+
+    Args:
+        file (TextIO):          Keysheet file, opened for writing.
+        count (int):            Amount of configurations.
+        rotors_amount (int):    Amount of rotors.
+        plugpairs_amount (int): Amount of plugpairs.
+        seed (int | str):       Random numbers generator seed. If None, 'secrets' module is used.
+        unique (bool):          Do not repeat configurations.
+
+    Returns:
+        None
+    """
+    configurations = generate_configurations(count, rotors_amount, plugpairs_amount, seed=seed, unique=unique)
+    while True:
+        batch = list(itertools.islice(configurations, KEYSHEET_BATCH))
+        if not batch:
+            break
+        file.write('\n'.join(batch) + '\n')
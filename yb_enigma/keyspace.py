@@ -0,0 +1,292 @@
+"""
+Keyspace: ranking and unranking of configurations (compact integer keys)
+"""
+import math
+import random
+import secrets
+
+from .common import ALPH
+from .keygen import REFLECTOR_NUMS, ROTOR_NUMS, PLUG_LETTERS
+from .utils import GREEK_ROTOR_NUMS, THIN_REFLECTOR_NUMS
+
+PLUG_INDEX = {char: i for i, char in enumerate(PLUG_LETTERS)}
+
+
+def _matchings_table(n: int):
+    """Amounts of plugboards on first i letters with exactly k pairs: table[i][k] = f(i, k).
+
+    The first letter is either unplugged (f(i - 1, k)), or plugged with one of i - 1 others (f(i - 2, k - 1) each).
+    """
+    table = [[1] + [0] * (n // 2) for _ in range(n + 1)]
+    for i in range(2, n + 1):
+        for k in range(1, n // 2 + 1):
+            table[i][k] = table[i - 1][k] + (i - 1) * table[i - 2][k - 1]
+    return table
+
+
+MATCHINGS = _matchings_table(len(ALPH))
+
+
+class Keyspace:
+    """Bijection between configurations and integers 0...size-1 (rank of configuration).
+
+    Configuration is reflector (with Greek rotor, its position and ring in four-rotor keyspace), different rotors
+    in order, their ring settings (if 'rings' is set), plugboard and rotors positions. Rank is mixed radix number
+    of these parts, the first of them is the most significant:
+    rotors order is Lehmer code of selection, plugboard is its index among plugboards with the same amount of pairs
+    (letters are taken from 'A': unplugged, or plugged with one of remaining letters), and positions are
+    odometer value (see 'position_index'), so consecutive ranks with the same wiring are consecutive machine states,
+    and range of ranks is a simple unit of work for search.
+
+    Ranks are Python integers: the whole keyspace of 3 rotors (any plugboard) takes 73 bits, so 'byte_length' bytes
+    are needed to store the key (8 bytes are enough for keyspaces of up to 64 bits, i.e. a fixed amount of plugpairs).
+
+    Args:
+        rotors_amount (int):                Amount of rotors (without Greek rotor).
+        plugpairs (int | list[int]):        Amount of plugpairs: exact amount, allowed amounts or None (0...13).
+        rings (bool):                       Include ring settings of rotors (default: all rings are 0).
+        greek (bool):                       Four-rotor keyspace: thin reflector and Greek rotor.
+
+    Attributes:
+        size (int):                         Amount of configurations.
+        byte_length (int):                  Size of rank in bytes.
+
+    Raises:
+        ValueError: If arguments are out of range.
+    """
+
+    def __init__(self, rotors_amount: int = 3, plugpairs=None, rings: bool = False, greek: bool = False):
+        if not 1 <= rotors_amount <= len(ROTOR_NUMS):
+            raise ValueError(f'"rotors_amount" must be in range 1...{len(ROTOR_NUMS)}')
+        if plugpairs is None:
+            plugpairs = range(len(ALPH) // 2 + 1)
+        elif isinstance(plugpairs, int):
+            plugpairs = [plugpairs]
+        plugpairs = sorted(set(plugpairs))
+        if not plugpairs or not all(0 <= k <= len(ALPH) // 2 for k in plugpairs):
+            raise ValueError(f'"plugpairs" must be in range 0...{len(ALPH) // 2}')
+
+        self.rotors_amount = rotors_amount
+        self.plugpairs = plugpairs
+        self.rings = rings
+        self.greek = greek
+
+        self._reflectors = THIN_REFLECTOR_NUMS if greek else REFLECTOR_NUMS
+        self._ring_radix = 26 if rings else 1
+        # reflector part: reflector, and Greek rotor with its position and ring
+        self._reflectors_size = len(self._reflectors)
+        if greek:
+            self._reflectors_size *= len(GREEK_ROTOR_NUMS) * 26 * self._ring_radix
+        self._orders_size = math.perm(len(ROTOR_NUMS), rotors_amount)
+        self._rings_size = self._ring_radix ** rotors_amount
+        self._positions_size = 26 ** rotors_amount
+
+        # plugboards with k pairs start at offset of all plugboards with allowed amounts of pairs less than k
+        self._plug_offsets = {}
+        self._plugboards_size = 0
+        for k in plugpairs:
+            self._plug_offsets[k] = self._plugboards_size
+            self._plugboards_size += MATCHINGS[len(ALPH)][k]
+
+        self.size = (self._reflectors_size * self._orders_size * self._rings_size
+                     * self._plugboards_size * self._positions_size)
+        self.byte_length = ((self.size - 1).bit_length() + 7) // 8
+
+    def __contains__(self, conf_str: str):
+        try:
+            self.rank(conf_str)
+        except ValueError:
+            return False
+        return True
+
+    def rank(self, conf_str: str):
+        """Get rank of configuration string (plugpairs may be in any order).
+
+        Args:
+            conf_str (str): Configuration string.
+
+        Returns:
+            int: Rank in range 0...size-1.
+
+        Raises:
+            ValueError: If configuration is invalid, or not in keyspace (i.e. repeated rotor, position 26,
+                        ring setting, when rings aren't included, or not allowed amount of plugpairs).
+        """
+        parts = conf_str.strip().split(' ')
+        if not 2 <= len(parts) <= 3:
+            raise ValueError('Invalid configuration string')
+        if parts[0] not in self._reflectors:
+            raise ValueError(f'Reflector "{parts[0]}" is not in keyspace')
+        rotor_confs = parts[1].split('-')
+
+        value = self._reflectors.index(parts[0])
+        if self.greek:
+            num, pos, ring = self._rotor_conf(rotor_confs.pop(0) if rotor_confs else '')
+            if num not in GREEK_ROTOR_NUMS:
+                raise ValueError('Greek rotor is missing')
+            value = ((value * len(GREEK_ROTOR_NUMS) + GREEK_ROTOR_NUMS.index(num)) * 26 + pos) * self._ring_radix + ring
+        if len(rotor_confs) != self.rotors_amount:
+            raise ValueError(f'Amount of rotors must be {self.rotors_amount}')
+
+        # rotors order: index of each rotor among not used ones
+        available = list(ROTOR_NUMS)
+        positions = 0
+        rings = 0
+        for rotor_conf in rotor_confs:
+            num, pos, ring = self._rotor_conf(rotor_conf)
+            if num not in available:
+                raise ValueError(f'Rotor "{num}" is not in keyspace (or repeated)')
+            value = value * len(available) + available.index(num)
+            available.remove(num)
+            positions = positions * 26 + pos
+            rings = rings * self._ring_radix + ring
+
+        value = value * self._rings_size + rings
+        value = value * self._plugboards_size + self._rank_plugboard(parts[2] if len(parts) == 3 else '')
+        return value * self._positions_size + positions
+
+    def _rotor_conf(self, rotor_conf: str):
+        """Split rotor configuration ("num:pos:ring") into its num, position and ring setting."""
+        num, *settings = rotor_conf.split(':')
+        if len(settings) > 2 or not all(setting.isdigit() for setting in settings):
+            raise ValueError(f'Invalid rotor configuration "{rotor_conf}"')
+        pos = int(settings[0]) if settings else 0
+        ring = int(settings[1]) if len(settings) > 1 else 0
+        if pos > 25:
+            raise ValueError(f'Position of rotor "{rotor_conf}" is not in keyspace')
+        if ring >= self._ring_radix:
+            raise ValueError(f'Ring setting of rotor "{rotor_conf}" is not in keyspace')
+        return num, pos, ring
+
+    def _rank_plugboard(self, pairs_str: str):
+        """Get index of plugboard (pairs, separated by ':') among all plugboards of keyspace."""
+        partner = [None] * len(PLUG_LETTERS)
+        pairs = pairs_str.split(':') if pairs_str else []
+        for pair in pairs:
+            if len(pair) != 2 or pair[0] not in PLUG_INDEX or pair[1] not in PLUG_INDEX:
+                raise ValueError(f'Invalid plugpair "{pair}"')
+            a, b = PLUG_INDEX[pair[0]], PLUG_INDEX[pair[1]]
+            if a == b or partner[a] is not None or partner[b] is not None:
+                raise ValueError(f'Invalid plugpair "{pair}"')
+            partner[a], partner[b] = b, a
+
+        k = len(pairs)
+        if k not in self._plug_offsets:
+            raise ValueError(f'Amount of plugpairs {k} is not in keyspace')
+
+        value = 0
+        remaining = list(range(len(PLUG_LETTERS)))
+        while k:
+            n = len(remaining)
+            a = remaining.pop(0)
+            if partner[a] is None:
+                continue
+            # plugboards with unplugged letter come first, then blocks of plugboards for each partner
+            j = remaining.index(partner[a])
+            value += MATCHINGS[n - 1][k] + j * MATCHINGS[n - 2][k - 1]
+            del remaining[j]
+            k -= 1
+        return self._plug_offsets[len(pairs)] + value
+
+    def unrank(self, n: int):
+        """Get configuration string of rank.
+
+        Configuration string is canonical: plugpairs are sorted (letters in pair too), ring settings are written
+        only if they are included in keyspace and not 0, so 'rank(unrank(n)) == n' and equal keys are equal strings.
+
+        Args:
+            n (int): Rank in range 0...size-1.
+
+        Returns:
+            str: Configuration string.
+
+        Raises:
+            ValueError: If rank is out of range.
+        """
+        if not 0 <= n < self.size:
+            raise ValueError(f'Rank must be in range 0...{self.size - 1}')
+
+        n, positions = divmod(n, self._positions_size)
+        n, plugboard = divmod(n, self._plugboards_size)
+        n, rings = divmod(n, self._rings_size)
+
+        # rotors order is decoded from the last rotor (its radix is the least one)
+        indices = []
+        for i in range(self.rotors_amount):
+            n, index = divmod(n, len(ROTOR_NUMS) - self.rotors_amount + 1 + i)
+            indices.append(index)
+        available = list(ROTOR_NUMS)
+        nums = [available.pop(index) for index in reversed(indices)]
+
+        rotor_confs = [''] * self.rotors_amount
+        for i in reversed(range(self.rotors_amount)):
+            positions, pos = divmod(positions, 26)
+            rings, ring = divmod(rings, self._ring_radix)
+            rotor_confs[i] = f'{nums[i]}:{pos}:{ring}' if ring else f'{nums[i]}:{pos}'
+
+        if self.greek:
+            n, ring = divmod(n, self._ring_radix)
+            n, pos = divmod(n, 26)
+            n, greek = divmod(n, len(GREEK_ROTOR_NUMS))
+            num = GREEK_ROTOR_NUMS[greek]
+            rotor_confs.insert(0, f'{num}:{pos}:{ring}' if ring else f'{num}:{pos}')
+
+        conf = self._reflectors[n] + ' ' + '-'.join(rotor_confs)
+        pairs = self._unrank_plugboard(plugboard)
+        if pairs:
+            conf += ' ' + ':'.join(pairs)
+        return conf
+
+    def _unrank_plugboard(self, value: int):
+        """Get sorted plugpairs of plugboard by its index among all plugboards of keyspace."""
+        for k in reversed(self.plugpairs):
+            if value >= self._plug_offsets[k]:
+                value -= self._plug_offsets[k]
+                break
+
+        pairs = []
+        remaining = list(range(len(PLUG_LETTERS)))
+        while k:
+            n = len(remaining)
+            a = remaining.pop(0)
+            unplugged = MATCHINGS[n - 1][k]
+            if value < unplugged:
+                continue
+            j, value = divmod(value - unplugged, MATCHINGS[n - 2][k - 1])
+            pairs.append(PLUG_LETTERS[a] + PLUG_LETTERS[remaining.pop(j)])
+            k -= 1
+        return pairs
+
+    def to_bytes(self, conf_str: str):
+        """Get rank of configuration as 'byte_length' bytes (big-endian, so bytes are sorted as ranks)."""
+        return self.rank(conf_str).to_bytes(self.byte_length, 'big')
+
+    def from_bytes(self, key: bytes):
+        """Get configuration string from its rank as bytes (see 'to_bytes')."""
+        return self.unrank(int.from_bytes(key, 'big'))
+
+    def sample(self, count: int = 1, seed=None):
+        """Get uniformly distributed random configurations (one random rank each, without rejection of keys).
+
+        Args:
+            count (int):       Amount of configurations.
+            seed (int | str):  Random numbers generator seed. If None, 'secrets' module is used.
+
+        Returns:
+            list[str]: Configuration strings.
+        """
+        rng = random.Random(seed) if seed is not None else secrets.SystemRandom()
+        return [self.unrank(rng.randrange(self.size)) for _ in range(count)]
+
+    def ranges(self, shards: int):
+        """Split keyspace into ranges of ranks of (almost) equal size, i.e. for parallel workers.
+
+        Args:
+            shards (int): Amount of ranges.
+
+        Returns:
+            list[range]: Ranges of ranks, covering keyspace without gaps.
+        """
+        if shards < 1:
+            raise ValueError('"shards" must be positive')
+        return [range(self.size * i // shards, self.size * (i + 1) // shards) for i in range(shards)]
@@ -0,0 +1,139 @@
+"""
+EncodeMemo: bounded LRU cache of encoded messages
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+DEFAULT_MEMO_ENTRIES = 4096
+DEFAULT_MEMO_BYTES = 16 * 2 ** 20
+
+# approximate memory of one entry besides its encoded text: key, digest and links of ordered dict
+MEMO_ENTRY_OVERHEAD = 200
+
+
+def memo_key(spec, positions: tuple, letters: str):
+    """Get memo key of message: the same spec, start positions and letters give the same encoded letters.
+
+    Args:
+        spec (MachineSpec):   Spec of machine (canonical wirings and stepping).
+        positions (tuple):    Current rotors positions, from the first rotor to the last.
+        letters (str):        Normalized message (lower-cased letters only).
+
+    Returns:
+        tuple: Key.
+    """
+    return spec, positions, len(letters), hashlib.blake2b(letters.encode('ascii'), digest_size=16).digest()
+
+
+class EncodeMemo:
+    """Opt-in memoization of encoded messages (see 'Enigma' argument 'memo').
+
+    Traffic often repeats: the same message, encoded under the same key at the same start positions.
+    Such message is encoded once, and then its encoded letters are taken from memo (rotors are only advanced).
+    Entries are evicted in least recently used order, when there are more than 'max_entries' of them,
+    or they take more than 'max_bytes'. Memo can be shared by many machines (and threads).
+
+    Args:
+        max_entries (int): Max amount of entries.
+        max_bytes (int):   Max approximate memory of all entries in bytes.
+
+    Attributes:
+        max_entries (int): Max amount of entries.
+        max_bytes (int):   Max approximate memory of all entries in bytes.
+        size (int):        Approximate memory of all entries in bytes.
+        hits (int):        Amount of messages, found in memo.
+        misses (int):      Amount of messages, not found in memo.
+        evictions (int):   Amount of evicted entries.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MEMO_ENTRIES, max_bytes: int = DEFAULT_MEMO_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_rate(self):
+        """Share of messages, found in memo (0, if nothing was requested)."""
+        requests = self.hits + self.misses
+        return self.hits / requests if requests else 0.0
+
+    def get(self, key: tuple):
+        """Get encoded letters of message (entry becomes the most recently used one).
+
+        Args:
+            key (tuple): Key (see 'memo_key').
+
+        Returns:
+            str | None: Encoded letters (None, if message is not in memo).
+        """
+        with self._lock:
+            encoded = self._entries.get(key)
+            if encoded is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return encoded
+
+    def put(self, key: tuple, encoded: str):
+        """Add encoded letters of message and evict the least recently used entries.
+
+        Message, which alone is larger than 'max_bytes', is not added.
+
+        Args:
+            key (tuple):   Key (see 'memo_key').
+            encoded (str): Encoded letters.
+
+        Returns:
+            None
+        """
+        entry_size = len(encoded) + MEMO_ENTRY_OVERHEAD
+        if entry_size > self.max_bytes or self.max_entries <= 0:
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous) + MEMO_ENTRY_OVERHEAD
+            self._entries[key] = encoded
+            self.size += entry_size
+
+            while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted) + MEMO_ENTRY_OVERHEAD
+                self.evictions += 1
+
+    def clear(self):
+        """Remove all entries (counters are kept).
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def to_dict(self):
+        """Get counters as dictionary.
+
+        Returns:
+            dict: Counters.
+        """
+        return {
+            'entries': len(self._entries),
+            'bytes': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hit_rate,
+        }
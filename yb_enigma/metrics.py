@@ -0,0 +1,222 @@
+"""
+Metrics: counters and timing of phases
+"""
+import sys
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+def peak_rss():
+    """Get peak resident set size of current process.
+
+    Returns:
+        int: Peak RSS in bytes (0, if it can't be measured on this platform).
+    """
+    if resource is None:
+        return 0
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, others - kilobytes
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def _prometheus_metric(name: str, metric_type: str, help_text: str, samples: list):
+    """Format one metric in Prometheus text format.
+
+    Args:
+        name (str):        Metric name.
+        metric_type (str): Metric type ('counter' or 'gauge').
+        help_text (str):   Metric description.
+        samples (list[tuple[str, float]]): Labels string (e.g. '{phase="encode"}' or '') and value.
+
+    Returns:
+        str: Formatted metric.
+    """
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} {metric_type}']
+    for labels, value in samples:
+        lines.append(f'{name}{labels} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+class Metrics:
+    """Cheap counters of Enigma's work.
+
+    Attributes:
+        chars_encoded (int):        Amount of encoded characters.
+        configuration_parses (int): Amount of parsed configuration strings.
+        carries (list[int]):        Amount of times each rotor (from the first one) turned over the next one.
+        memo (EncodeMemo):          Memo of Enigma, whose counters are exported too (None - no memo).
+    """
+
+    def __init__(self):
+        self.chars_encoded = 0
+        self.configuration_parses = 0
+        self.carries = []
+        self.memo = None
+
+    def add_carries(self, carries: list[int]):
+        """Add amount of carries of each rotor.
+
+        Args:
+            carries (list[int]): Amount of carries of each rotor (from the first one).
+
+        Returns:
+            None
+        """
+        if len(carries) > len(self.carries):
+            self.carries += [0] * (len(carries) - len(self.carries))
+        for i, amount in enumerate(carries):
+            self.carries[i] += amount
+
+    def to_dict(self):
+        """Get counters as dictionary.
+
+        Returns:
+            dict: Counters (with counters of memo as 'memo', if it is attached).
+        """
+        counters = {
+            'chars_encoded': self.chars_encoded,
+            'configuration_parses': self.configuration_parses,
+            'carries': list(self.carries),
+        }
+        if self.memo is not None:
+            counters['memo'] = self.memo.to_dict()
+        return counters
+
+    def to_prometheus(self, prefix: str = 'enigma'):
+        """Get counters in Prometheus text format.
+
+        Args:
+            prefix (str): Metrics names prefix.
+
+        Returns:
+            str: Metrics (with counters of memo, if it is attached).
+        """
+        return ''.join([
+            _prometheus_metric(f'{prefix}_chars_encoded_total', 'counter',
+                               'Amount of encoded characters.',
+                               [('', self.chars_encoded)]),
+            _prometheus_metric(f'{prefix}_configuration_parses_total', 'counter',
+                               'Amount of parsed configuration strings.',
+                               [('', self.configuration_parses)]),
+            _prometheus_metric(f'{prefix}_rotor_carries_total', 'counter',
+                               'Amount of times rotor turned over the next one (rotor 0 is the first rotor).',
+                               [(f'{{rotor="{i}"}}', amount) for i, amount in enumerate(self.carries)]),
+        ]) + (_memo_to_prometheus([('', self.memo.to_dict())], prefix) if self.memo is not None else '')
+
+
+def _memo_to_prometheus(samples: list, prefix: str = 'enigma'):
+    """Format counters of memos in Prometheus text format.
+
+    Args:
+        samples (list[tuple[str, dict]]): Labels string (e.g. '{worker="1"}' or '') and counters of memo
+                                          (see 'EncodeMemo.to_dict').
+        prefix (str):                     Metrics names prefix.
+
+    Returns:
+        str: Metrics.
+    """
+    metrics = [
+        ('hits', 'memo_hits_total', 'counter', 'Amount of messages, found in memo.'),
+        ('misses', 'memo_misses_total', 'counter', 'Amount of messages, not found in memo.'),
+        ('evictions', 'memo_evictions_total', 'counter', 'Amount of entries, evicted from memo.'),
+        ('hit_rate', 'memo_hit_rate', 'gauge', 'Share of messages, found in memo.'),
+        ('entries', 'memo_entries', 'gauge', 'Amount of entries in memo.'),
+        ('bytes', 'memo_bytes', 'gauge', 'Approximate memory of all entries of memo in bytes.'),
+    ]
+    return ''.join(
+        _prometheus_metric(f'{prefix}_{name}', metric_type, help_text,
+                           [(labels, counters[counter]) for labels, counters in samples])
+        for counter, name, metric_type, help_text in metrics
+    )
+
+
+class PhaseTimer:
+    """Wall and CPU time of named phases. The same phase can be entered many times (time is summed).
+
+    Attributes:
+        phases (dict[str, list[float]]): Phase name => [wall time, CPU time] in seconds.
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self._started = {}
+
+    def start(self, name: str):
+        """Start measuring phase.
+
+        Args:
+            name (str): Phase name.
+
+        Returns:
+            None
+        """
+        self._started[name] = (time.perf_counter(), time.process_time())
+
+    def stop(self, name: str):
+        """Stop measuring phase (see 'start').
+
+        Args:
+            name (str): Phase name.
+
+        Returns:
+            None
+        """
+        wall, cpu = self._started.pop(name)
+        times = self.phases.setdefault(name, [0.0, 0.0])
+        times[0] += time.perf_counter() - wall
+        times[1] += time.process_time() - cpu
+
+    @contextmanager
+    def phase(self, name: str):
+        """Measure block of code as phase.
+
+        Args:
+            name (str): Phase name.
+
+        Returns:
+            ContextManager: Context manager.
+        """
+        self.start(name)
+        try:
+            yield
+        finally:
+            self.stop(name)
+
+    def report(self):
+        """Get phases as human readable table.
+
+        Returns:
+            str: Table.
+        """
+        lines = [f'{"phase":<20} {"wall, s":>10} {"cpu, s":>10}']
+        for name, (wall, cpu) in self.phases.items():
+            lines.append(f'{name:<20} {wall:>10.4f} {cpu:>10.4f}')
+        lines.append(f'{"peak RSS, MiB":<20} {peak_rss() / 2 ** 20:>10.1f}')
+        return '\n'.join(lines)
+
+    def to_prometheus(self, prefix: str = 'enigma'):
+        """Get phases in Prometheus text format.
+
+        Args:
+            prefix (str): Metrics names prefix.
+
+        Returns:
+            str: Metrics.
+        """
+        return ''.join([
+            _prometheus_metric(f'{prefix}_phase_wall_seconds', 'gauge',
+                               'Wall time of phase.',
+                               [(f'{{phase="{name}"}}', wall) for name, (wall, _) in self.phases.items()]),
+            _prometheus_metric(f'{prefix}_phase_cpu_seconds', 'gauge',
+                               'CPU time of phase.',
+                               [(f'{{phase="{name}"}}', cpu) for name, (_, cpu) in self.phases.items()]),
+            _prometheus_metric(f'{prefix}_peak_rss_bytes', 'gauge',
+                               'Peak resident set size of process.',
+                               [('', peak_rss())]),
+        ])
@@ -0,0 +1,321 @@
+"""
+Permutation and PermutationBatch classes
+"""
+import math
+
+from .common import ALPH
+
+LETTERS = len(ALPH)
+
+
+class Permutation:
+    """Permutation of symbols 0...n-1 (26 letters by default), backed by bytes.
+
+    Composition is one 'bytes.translate' call, so permutations of rotors, reflector, plugboard and the whole machine
+    are composed without Python loops. Symbols n...255 are kept in place by translate table.
+
+    Convention: 'p.then(q)' applies p first (x => q(p(x))), and 'p * q' is composition of functions (q first).
+
+    Args:
+        table (bytes | list[int]): Image of each symbol (table[x] = p(x)).
+
+    Attributes:
+        table (bytes): Image of each symbol.
+
+    Raises:
+        ValueError: If table is not permutation of 0...n-1, or n > 256.
+    """
+
+    __slots__ = ('table', '_translate')
+
+    def __init__(self, table):
+        table = bytes(table)
+        if sorted(table) != list(range(len(table))):
+            raise ValueError('Table must contain each symbol 0...n-1 exactly once')
+        self.table = table
+        self._translate = table + bytes(range(len(table), 256))
+
+    @classmethod
+    def _from_table(cls, table: bytes):
+        """Create permutation from table, which is known to be permutation (no check)."""
+        permutation = cls.__new__(cls)
+        permutation.table = table
+        permutation._translate = table + bytes(range(len(table), 256))
+        return permutation
+
+    @classmethod
+    def identity(cls, n: int = LETTERS):
+        """Identity permutation of n symbols."""
+        return cls._from_table(bytes(range(n)))
+
+    @classmethod
+    def shift(cls, k: int, n: int = LETTERS):
+        """Cyclic shift by k: x => (x + k) % n (rotation of rotor by k positions)."""
+        return cls._from_table(bytes((x + k) % n for x in range(n)))
+
+    @classmethod
+    def from_key(cls, key: str):
+        """Create permutation of letters from alphabet permutation, i.e. 'ekmflgdqvzntowyhxuspaibrcj'.
+
+        Raises:
+            ValueError: If key is not permutation of alphabet.
+        """
+        if sorted(key.lower()) != ALPH:
+            raise ValueError('Key must contain each letter exactly once')
+        return cls._from_table(bytes(ALPH.index(char) for char in key.lower()))
+
+    def __len__(self):
+        return len(self.table)
+
+    def __getitem__(self, x: int):
+        return self.table[x]
+
+    def __call__(self, x: int):
+        return self.table[x]
+
+    def __iter__(self):
+        return iter(self.table)
+
+    def __eq__(self, other):
+        return isinstance(other, Permutation) and self.table == other.table
+
+    def __hash__(self):
+        return hash(self.table)
+
+    def __repr__(self):
+        return f'Permutation({str(self)!r})' if len(self) == LETTERS else f'Permutation({list(self.table)})'
+
+    def __str__(self):
+        if len(self) == LETTERS:
+            return ''.join(ALPH[x] for x in self.table)
+        return ' '.join(str(x) for x in self.table)
+
+    def __mul__(self, other):
+        return other.then(self)
+
+    def __pow__(self, k: int):
+        return self.power(k)
+
+    def then(self, other):
+        """Compose: apply this permutation, then the other one (x => other(self(x))).
+
+        Args:
+            other (Permutation): Permutation of the same size.
+
+        Returns:
+            Permutation: Composition.
+        """
+        if len(other) != len(self):
+            raise ValueError('Permutations must have the same size')
+        return Permutation._from_table(self.table.translate(other._translate))
+
+    def inverse(self):
+        """Inverse permutation.
+
+        Returns:
+            Permutation: Inverse.
+        """
+        inverse = bytearray(len(self))
+        for x, y in enumerate(self.table):
+            inverse[y] = x
+        return Permutation._from_table(bytes(inverse))
+
+    def conjugate(self, k: int):
+        """Conjugate by cyclic shift: x => self(x + k) - k (wiring of rotor, rotated by k positions).
+
+        Ring setting r of rotor is conjugation by -r.
+
+        Args:
+            k (int): Shift.
+
+        Returns:
+            Permutation: Conjugated permutation.
+        """
+        n = len(self)
+        return Permutation._from_table(bytes((self.table[(x + k) % n] - k) % n for x in range(n)))
+
+    def conjugate_by(self, other):
+        """Conjugate by other permutation: other, then self, then inverse of other.
+
+        Args:
+            other (Permutation): Permutation of the same size.
+
+        Returns:
+            Permutation: Conjugated permutation.
+        """
+        return other.then(self).then(other.inverse())
+
+    def power(self, k: int):
+        """Apply permutation k times (negative k - inverse permutation).
+
+        Args:
+            k (int): Exponent.
+
+        Returns:
+            Permutation: Power.
+        """
+        base = self if k >= 0 else self.inverse()
+        result = Permutation.identity(len(self))
+        k = abs(k)
+        while k:
+            if k & 1:
+                result = result.then(base)
+            base = base.then(base)
+            k >>= 1
+        return result
+
+    def cycles(self, fixed_points: bool = True):
+        """Cycle decomposition, each cycle starts with its least symbol.
+
+        Args:
+            fixed_points (bool): Include cycles of length 1.
+
+        Returns:
+            list[tuple[int]]: Cycles, ordered by their least symbols.
+        """
+        seen = bytearray(len(self))
+        cycles = []
+        for start in range(len(self)):
+            if seen[start]:
+                continue
+            cycle = []
+            x = start
+            while not seen[x]:
+                seen[x] = 1
+                cycle.append(x)
+                x = self.table[x]
+            if fixed_points or len(cycle) > 1:
+                cycles.append(tuple(cycle))
+        return cycles
+
+    def cycle_type(self):
+        """Lengths of cycles, the longest first (characteristic of permutation, used in analysis).
+
+        Returns:
+            list[int]: Lengths.
+        """
+        return sorted((len(cycle) for cycle in self.cycles()), reverse=True)
+
+    def order(self):
+        """Least k > 0, for which permutation applied k times is identity.
+
+        Returns:
+            int: Order.
+        """
+        return math.lcm(*self.cycle_type())
+
+    def fixed_points(self):
+        """Symbols, which are kept in place.
+
+        Returns:
+            list[int]: Symbols.
+        """
+        return [x for x, y in enumerate(self.table) if x == y]
+
+    def is_involution(self):
+        """Check, that permutation is its own inverse (as reflector and plugboard are)."""
+        return self.table.translate(self._translate) == bytes(range(len(self)))
+
+    def apply(self, data: bytes):
+        """Apply permutation to each symbol of data.
+
+        Args:
+            data (bytes): Symbols.
+
+        Returns:
+            bytes: Permuted symbols.
+        """
+        return data.translate(self._translate)
+
+
+class PermutationBatch:
+    """Many permutations of the same size in one flat buffer (i-th one is table[i * n:(i + 1) * n]).
+
+    Machine at each of its states is one such batch (see 'MachineSpec.permutations'), so encoding a message is
+    applying i-th permutation to i-th letter, and the same permutation can be composed with all of them at once.
+
+    Args:
+        table (bytes):  Tables of all permutations, one after another (not checked).
+        n (int):        Size of each permutation.
+
+    Attributes:
+        table (bytes): Tables of all permutations.
+        n (int):       Size of each permutation.
+    """
+
+    def __init__(self, table: bytes, n: int = LETTERS):
+        if len(table) % n:
+            raise ValueError(f'Size of table must be multiple of {n}')
+        self.table = table
+        self.n = n
+
+    @classmethod
+    def from_permutations(cls, permutations: list[Permutation]):
+        """Create batch from permutations of the same size."""
+        permutations = list(permutations)
+        return cls(b''.join(permutation.table for permutation in permutations),
+                   len(permutations[0]) if permutations else LETTERS)
+
+    def __len__(self):
+        return len(self.table) // self.n
+
+    def __getitem__(self, i: int):
+        if not -len(self) <= i < len(self):
+            raise IndexError('Permutation index out of range')
+        i %= len(self)
+        return Permutation._from_table(bytes(self.table[i * self.n:(i + 1) * self.n]))
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def then(self, other: Permutation):
+        """Compose each permutation with the other one (applied after it), in one translate call.
+
+        Args:
+            other (Permutation): Permutation of the same size.
+
+        Returns:
+            PermutationBatch: Compositions.
+        """
+        if len(other) != self.n:
+            raise ValueError('Permutations must have the same size')
+        return PermutationBatch(bytes(self.table).translate(other._translate), self.n)
+
+    def inverse(self):
+        """Inverse of each permutation.
+
+        Returns:
+            PermutationBatch: Inverses.
+        """
+        return PermutationBatch.from_permutations(permutation.inverse() for permutation in self)
+
+    def apply(self, data: bytes, start: int = 0):
+        """Apply permutations to symbols one by one: symbol i by permutation (start + i), cyclically.
+
+        Args:
+            data (bytes): Symbols.
+            start (int):  Index of permutation for the first symbol.
+
+        Returns:
+            bytearray: Permuted symbols.
+        """
+        table, n, count = self.table, self.n, len(self)
+        result = bytearray(len(data))
+        i = start % count
+        for j, x in enumerate(data):
+            result[j] = table[i * n + x]
+            i += 1
+            if i == count:
+                i = 0
+        return result
+
+    def apply_all(self, data: bytes):
+        """Apply each permutation to all symbols of data.
+
+        Args:
+            data (bytes): Symbols.
+
+        Returns:
+            list[bytes]: Permuted symbols, by each permutation.
+        """
+        return [permutation.apply(data) for permutation in self]
@@ -4,6 +4,7 @@ Plugboard class
 import random
 from .common import ALPH
 from .exceptions import NotUniquePair, InvalidPlugboardPair
+from .permutation import Permutation
 
 
 class Plugboard():
@@ -30,6 +31,10 @@ class Plugboard():
     def __str__(self):
         return self.get_pairs_string()
 
+    def __reduce__(self):
+        # compact state: letters of pairs in order (at most 26 characters)
+        return _restore_plugboard, (''.join(i + j for i, j in self.pairs), self.debug)
+
     def _letter_in_pairs(self, letter: str):
         """Check if letter is already in pairs.
 
@@ -122,6 +127,18 @@ class Plugboard():
         """
         return ':'.join((i+j).upper() for i, j in self.pairs)
 
+    def permutation(self):
+        """Get plugboard as permutation of letters indices (involution: each pair is swapped).
+
+        Returns:
+            Permutation: Permutation.
+        """
+        table = list(range(len(ALPH)))
+        for i, j in self.pairs:
+            i, j = ALPH.index(i), ALPH.index(j)
+            table[i], table[j] = j, i
+        return Permutation(table)
+
     def encode(self, char: str):
         """Encode char.
         Described in "Docs -> How it works -> Plugboard"
@@ -153,3 +170,8 @@ class Plugboard():
             print(f'  Plugboard | {char} => {encoded_char}')
 
         return encoded_char
+
+
+def _restore_plugboard(letters: str, debug: bool):
+    """Rebuild pickled plugboard (see 'Plugboard.__reduce__')."""
+    return Plugboard(pairs=[{letters[i], letters[i + 1]} for i in range(0, len(letters), 2)], debug=debug)
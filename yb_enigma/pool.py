@@ -0,0 +1,262 @@
+"""
+MachinePool: state of many machines (sessions) in flat arrays
+"""
+from array import array
+
+from .spec import MachineSpec, Cursor, plugboard_map, LETTER_TO_INDEX, INDEX_TO_LETTER
+from .stepping import ODOMETER
+from .utils import parse_configuration, prepare_string
+
+# spec id of freed session
+FREE = 0xffffffff
+
+DEFAULT_MAX_ROTORS = 4
+
+
+class MachinePool:
+    """Many machines, stored as rows of flat arrays instead of graphs of Rotor objects.
+
+    Wirings are shared: each distinct spec (rotors, reflector, plugboard, stepping) is stored once,
+    and session keeps only its index. Session's own state is its current rotors positions ('max_rotors' bytes),
+    so it costs a few bytes.
+
+    Positions are the state of session in both stepping modes: notched sessions are stepped by step table,
+    shared by all sessions with the same notches (see 'StepTable'), so nothing is built per session.
+
+    Args:
+        max_rotors (int): Max amount of rotors of machine (width of positions rows).
+
+    Attributes:
+        specs (list[MachineSpec]): Shared specs.
+        spec_ids (array):          Index of spec of each session (FREE, if session is freed).
+        positions (array):         Current rotors positions of each session (bytes, 'max_rotors' per session).
+    """
+
+    def __init__(self, max_rotors: int = DEFAULT_MAX_ROTORS):
+        self.max_rotors = max_rotors
+        self.specs = []
+        self.spec_ids = array('I')
+        self.positions = array('B')
+
+        self._spec_ids = {}
+        self._free = array('I')
+
+    def __len__(self):
+        return len(self.spec_ids) - len(self._free)
+
+    @property
+    def session_size(self):
+        """Size of one session's state in bytes (shared specs are not counted)."""
+        return self.spec_ids.itemsize + self.max_rotors * self.positions.itemsize
+
+    def _spec_id(self, key: tuple, create):
+        """Get index of shared spec, adding it, if there is no such spec.
+
+        Args:
+            key (tuple):        All fields of spec.
+            create (Callable):  Creates spec.
+
+        Returns:
+            int: Spec index.
+        """
+        spec_id = self._spec_ids.get(key)
+        if spec_id is None:
+            spec = create()
+            if len(spec.rotors) > self.max_rotors:
+                raise ValueError(f'Machine has more than {self.max_rotors} rotors')
+            spec_id = len(self.specs)
+            self.specs.append(spec)
+            self._spec_ids[key] = spec_id
+        return spec_id
+
+    def alloc(self, spec: MachineSpec, positions: list[int] = None):
+        """Add session.
+
+        Args:
+            spec (MachineSpec):     Spec of session's machine.
+            positions (list[int]):  Start positions, from the first rotor to the last. Default: all 0.
+
+        Returns:
+            int: Session id.
+
+        Raises:
+            ValueError: If machine has more than 'max_rotors' rotors.
+        """
+        key = (spec.rotors, spec.reflector, spec.plugboard, spec.notches, spec.stepping, spec.rotor_nums, spec.reflector_num,
+               spec.rings, spec.greek)
+        spec_id = self._spec_id(key, lambda: spec)
+        return self._alloc(spec_id, positions if positions is not None else [0] * len(spec.rotors))
+
+    def alloc_configuration(self, conf_str: str, stepping: str = ODOMETER):
+        """Add session from configuration string (spec is created only for new wirings).
+
+        Args:
+            conf_str (str): Configuration string (more in documentation).
+            stepping (str): Rotors stepping mode ('odometer' or 'notched').
+
+        Returns:
+            int: Session id.
+
+        Raises:
+            ValueError: If machine has more than 'max_rotors' rotors.
+        """
+        reflector, rotors_list, plugboard = parse_configuration(conf_str)
+        rotors_list.reverse()
+
+        key = (
+            tuple(bytes(rotor.coding_list) for rotor in rotors_list),
+            bytes(reflector.coding_list),
+            plugboard_map(plugboard),
+            tuple(rotor.notches for rotor in rotors_list),
+            stepping,
+            tuple(rotor.num for rotor in rotors_list),
+            reflector.num,
+            tuple(rotor.ring for rotor in rotors_list),
+            str(reflector.greek) if reflector.greek is not None else '',
+        )
+        spec_id = self._spec_id(key, lambda: MachineSpec(*key))
+        return self._alloc(spec_id, [rotor.pos for rotor in rotors_list])
+
+    def _alloc(self, spec_id: int, positions: list[int]):
+        """Write session to free row (or to new row at the end).
+
+        Args:
+            spec_id (int):          Spec index.
+            positions (list[int]):  Start positions.
+
+        Returns:
+            int: Session id.
+        """
+        row = array('B', positions) + array('B', bytes(self.max_rotors - len(positions)))
+        if self._free:
+            session = self._free.pop()
+            self.spec_ids[session] = spec_id
+            self.positions[session * self.max_rotors:(session + 1) * self.max_rotors] = row
+        else:
+            session = len(self.spec_ids)
+            self.spec_ids.append(spec_id)
+            self.positions.extend(row)
+        return session
+
+    def free(self, session: int):
+        """Remove session (its row is reused by the next allocated session).
+
+        Args:
+            session (int): Session id.
+
+        Returns:
+            None
+
+        Raises:
+            KeyError: If there is no such session.
+        """
+        self._check(session)
+        self.spec_ids[session] = FREE
+        self._free.append(session)
+
+    def _check(self, session: int):
+        """Check, that session exists.
+
+        Args:
+            session (int): Session id.
+
+        Returns:
+            MachineSpec: Spec of session.
+
+        Raises:
+            KeyError: If there is no such session.
+        """
+        if not 0 <= session < len(self.spec_ids) or self.spec_ids[session] == FREE:
+            raise KeyError(f'Unknown session {session}')
+        return self.specs[self.spec_ids[session]]
+
+    def get_spec(self, session: int):
+        """Get spec of session.
+
+        Args:
+            session (int): Session id.
+
+        Returns:
+            MachineSpec: Spec.
+        """
+        return self._check(session)
+
+    def get_cursor(self, session: int):
+        """Get cursor at session's current positions (changes of cursor don't change session).
+
+        Args:
+            session (int): Session id.
+
+        Returns:
+            Cursor: Cursor instance.
+        """
+        spec = self._check(session)
+        start = session * self.max_rotors
+        return Cursor(self.positions[start:start + len(spec.rotors)])
+
+    def set_cursor(self, session: int, cursor: Cursor):
+        """Set session's positions from cursor (see 'get_cursor').
+
+        Args:
+            session (int):   Session id.
+            cursor (Cursor): Cursor.
+
+        Returns:
+            None
+        """
+        spec = self._check(session)
+        start = session * self.max_rotors
+        self.positions[start:start + len(spec.rotors)] = array('B', cursor.positions)
+
+    def get_configuration(self, session: int):
+        """Get configuration string of session at its current positions.
+
+        Args:
+            session (int): Session id.
+
+        Returns:
+            str: Configuration string.
+        """
+        return self.get_spec(session).get_configuration(self.get_cursor(session))
+
+    def encode(self, session: int, string: str):
+        """Encode string by session's machine (like 'MachineSpec.encode': only letters are kept). Session's rotors are moved.
+
+        Args:
+            session (int): Session id.
+            string (str):  String to encode.
+
+        Returns:
+            str: Encoded string.
+        """
+        return self.encode_many([session], [string])[0]
+
+    def encode_many(self, sessions: list[int], strings: list[str]):
+        """Encode strings of many sessions in one call (i-th string by i-th session).
+
+        Sessions are processed grouped by spec, so tables of each spec are used while they are hot.
+        Session may occur more than once: its strings are encoded one after another, in the given order.
+
+        Args:
+            sessions (list[int]): Session ids.
+            strings (list[str]):  Strings to encode.
+
+        Returns:
+            list[str]: Encoded strings.
+
+        Raises:
+            KeyError: If there is no such session (nothing is encoded).
+        """
+        if len(sessions) != len(strings):
+            raise ValueError('Amount of sessions and strings must be the same')
+
+        specs = [self._check(session) for session in sessions]
+        order = sorted(range(len(sessions)), key=lambda i: self.spec_ids[sessions[i]])
+        encoded = [''] * len(sessions)
+        for i in order:
+            session, spec = sessions[i], specs[i]
+            cursor = self.get_cursor(session)
+            indices = prepare_string(strings[i]).encode('ascii').translate(LETTER_TO_INDEX)
+            encoded[i] = spec.encode_indices(indices, cursor).translate(INDEX_TO_LETTER).decode('ascii')
+            self.set_cursor(session, cursor)
+        return encoded
@@ -0,0 +1,190 @@
+"""
+Random-access decoding of ciphertext files
+"""
+import os
+import re
+
+# every byte, that is not an english letter (used to count letters with bytes.translate)
+NON_ALPH_BYTES = bytes(i for i in range(256) if not (65 <= i <= 90 or 97 <= i <= 122))
+
+DEFAULT_INDEX_STRIDE = 65536
+
+
+def count_letters(data: bytes):
+    """Count english letters in bytes.
+
+    Args:
+        data (bytes): Bytes to check.
+
+    Returns:
+        int: Amount of [a-zA-Z] bytes.
+    """
+    return len(data.translate(None, NON_ALPH_BYTES))
+
+
+class RangeIndex:
+    """Sparse index of ciphertext file: letters count at every 'stride' bytes.
+
+    Needed only if ciphertext contains something except letters
+    (e.g. it was encoded with '--keep-spaces' or '--keep-special').
+
+    Args:
+        stride (int):       Distance (in bytes) between indexed offsets.
+        counts (list[int]): Amount of letters before offset "i * stride".
+
+    Attributes:
+        stride (int):       Distance (in bytes) between indexed offsets.
+        counts (list[int]): Amount of letters before offset "i * stride".
+    """
+
+    def __init__(self, stride: int = DEFAULT_INDEX_STRIDE, counts: list[int] = None):
+        if stride <= 0:
+            raise ValueError('"stride" must be positive')
+
+        self.stride = stride
+        self.counts = counts if counts is not None else [0]
+
+    @staticmethod
+    def build(file, stride: int = DEFAULT_INDEX_STRIDE):
+        """Build index by reading whole file once.
+
+        Args:
+            file (BinaryIO): Ciphertext file, opened in binary mode.
+            stride (int):    Distance (in bytes) between indexed offsets.
+
+        Returns:
+            RangeIndex: Index instance.
+        """
+        file.seek(0)
+        counts = [0]
+        chunk = file.read(stride)
+        while len(chunk) == stride:
+            counts.append(counts[-1] + count_letters(chunk))
+            chunk = file.read(stride)
+
+        return RangeIndex(stride=stride, counts=counts)
+
+    @staticmethod
+    def load(path: str):
+        """Load index from file (first line is stride, then one count per line).
+
+        Args:
+            path (str): Path to index file.
+
+        Returns:
+            RangeIndex: Index instance.
+        """
+        with open(path, 'r') as index_file:
+            stride = int(index_file.readline())
+            counts = [int(line) for line in index_file if line.strip()]
+
+        return RangeIndex(stride=stride, counts=counts)
+
+    def save(self, path: str):
+        """Save index to file.
+
+        Args:
+            path (str): Path to index file.
+
+        Returns:
+            None
+        """
+        with open(path, 'w') as index_file:
+            index_file.write(str(self.stride) + '\n')
+            index_file.write('\n'.join(str(count) for count in self.counts) + '\n')
+
+    def letters_before(self, file, offset: int):
+        """Get amount of letters before byte offset.
+
+        Reads at most 'stride' bytes of the file.
+
+        Args:
+            file (BinaryIO): Ciphertext file, opened in binary mode.
+            offset (int):    Byte offset.
+
+        Returns:
+            int: Amount of letters before offset.
+        """
+        checkpoint = min(offset // self.stride, len(self.counts) - 1)
+        file.seek(checkpoint * self.stride)
+        return self.counts[checkpoint] + count_letters(file.read(offset - checkpoint * self.stride))
+
+
+def letters_before(file, offset: int, index: RangeIndex = None, groups: bool = False, max_char_num: int = 5):
+    """Get amount of letters before byte offset of ciphertext file.
+
+    Without index, ciphertext is considered to contain only letters
+    (or letters, divided to groups by spaces, if 'groups' is set).
+
+    Args:
+        file (BinaryIO):    Ciphertext file, opened in binary mode.
+        offset (int):       Byte offset.
+        index (RangeIndex): Sparse index of the file.
+        groups (bool):      Ciphertext is divided to groups (see 'format_output_string').
+        max_char_num (int): Num of chars in one group.
+
+    Returns:
+        int: Amount of letters before offset.
+    """
+    if index is not None:
+        return index.letters_before(file, offset)
+    if groups:
+        return offset - offset // (max_char_num + 1)
+    return offset
+
+
+def decode_range(file, start: int, end: int, enigma, index: RangeIndex = None, groups: bool = False,
+                 keep_case: bool = False):
+    """Decode bytes [start, end) of ciphertext file without decoding anything before them.
+
+    Enigma must be set to configuration, that was used to encode the whole file.
+    Enigma's state is not changed (it is restored, even if decoding fails).
+
+    Args:
+        file (BinaryIO):    Ciphertext file, opened in binary mode.
+        start (int):        First byte offset (including).
+        end (int):          Last byte offset (excluding).
+        enigma (Enigma):    Enigma instance.
+        index (RangeIndex): Sparse index of the file (see 'RangeIndex').
+        groups (bool):      Ciphertext is divided to groups (see 'format_output_string').
+        keep_case (bool):   Keep case of letters (by default decoded letters are lower-cased).
+
+    Returns:
+        bytes: Decoded bytes. Everything except letters is kept as it is.
+
+    Raises:
+        ValueError: If range is invalid.
+    """
+    if start < 0 or end < start:
+        raise ValueError('Invalid range')
+
+    # only positions are moved, so they are restored even if reading or decoding fails
+    cursor = enigma.get_cursor()
+    try:
+        enigma.advance(letters_before(file, start, index=index, groups=groups))
+
+        file.seek(start)
+        data = file.read(end - start)
+
+        decoded = bytearray()
+        for part in re.split(rb'([a-zA-Z]+)', data):
+            if part[:1].isalpha():
+                decoded += enigma.encode(part.decode('ascii'), keep_case=keep_case).encode('ascii')
+            else:
+                decoded += part
+    finally:
+        enigma.set_cursor(cursor)
+
+    return bytes(decoded)
+
+
+def index_path(path: str):
+    """Get path of index file for ciphertext file.
+
+    Args:
+        path (str): Path to ciphertext file.
+
+    Returns:
+        str: /path/to/ciphertext_file_name.idx
+    """
+    return os.path.realpath(path) + '.idx'
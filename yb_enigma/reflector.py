@@ -1,8 +1,11 @@
 """
 Reflector class
 """
+from functools import lru_cache
+
 from .common import ALPH
 from .exceptions import NotFound
+from .permutation import Permutation
 
 
 class Reflector:
@@ -12,14 +15,16 @@ class Reflector:
         key (str):    Special alphabet permutation (more in documentation).
         num (str):    Reflectors's num.
         debug (bool): Debug mode
+        greek (Rotor): Greek rotor (non-stepping rotor between thin reflector and the other rotors).
 
     Attributes:
         debug (bool):            Debug mode.
         num (str):               Number
-        coding_list (list[int]): Coding list (more in documentation).
+        coding_list (list[int]): Coding list (more in documentation), with Greek rotor folded in.
+        greek (Rotor):           Greek rotor, if any.
     """
 
-    def __init__(self, key: str = '', num: str = '', debug: bool = False):
+    def __init__(self, key: str = '', num: str = '', debug: bool = False, greek=None):
         self.debug = debug
 
         self.num = num
@@ -28,9 +33,30 @@ class Reflector:
         for char in key:
             self.coding_list.append(ALPH.index(char))
 
+        # Greek rotor never moves, so together with reflector it is one fixed involution (letter => letter):
+        # it is composed once here and encoding passes no extra rotor
+        self.greek = greek
+        if greek is not None:
+            self.coding_list = list(Permutation(self.coding_list).conjugate_by(greek.permutation()))
+
+    def __reduce__(self):
+        # compact state: reflector of registry is rebuilt by its number (and Greek rotor), custom one - from its wiring
+        greek = (self.greek.num, self.greek.pos, self.greek.ring) if self.greek is not None else None
+        if bytes(self.coding_list) == _registered_reflector(self.num, greek):
+            return _restore_reflector, (self.num, self.debug, self.greek)
+        return _restore_reflector, (self.num, self.debug, self.greek, bytes(self.coding_list))
+
     def __str__(self):
         return self.num
 
+    def permutation(self):
+        """Get reflector (with Greek rotor, if any) as permutation of letters indices (involution).
+
+        Returns:
+            Permutation: Permutation.
+        """
+        return Permutation(self.coding_list)
+
     def encode(self, char: str):
         """Encode char.
         Described in "Docs -> How it works -> Reflector"
@@ -71,12 +97,23 @@ class Reflector:
         return Reflector(key='fvpjiaoyedrzxwgctkuqsbnmhl', num='C', debug=debug)
 
     @staticmethod
-    def by_num(num: str, debug=False):
+    def B_thin(debug=False, greek=None):
+        """Thin reflector B (M4)"""
+        return Reflector(key='enkqauywjicopblmdxzvfthrgs', num='B-thin', debug=debug, greek=greek)
+
+    @staticmethod
+    def C_thin(debug=False, greek=None):
+        """Thin reflector C (M4)"""
+        return Reflector(key='rdobjntkvehmlfcwzaxgyipsuq', num='C-thin', debug=debug, greek=greek)
+
+    @staticmethod
+    def by_num(num: str, debug=False, greek=None):
         """Get reflector by its num.
 
         Args:
-            num (str):    Reflector's number (A, B, C).
+            num (str):    Reflector's number (A, B, C, B-thin, C-thin).
             debug (bool): Debug mode
+            greek (Rotor): Greek rotor (only for thin reflectors).
 
         Returns:
             Reflector: Reflector instance
@@ -91,6 +128,10 @@ class Reflector:
             return Reflector.B(debug=debug)
         if num == "C":
             return Reflector.C(debug=debug)
+        if num == "B-thin":
+            return Reflector.B_thin(debug=debug, greek=greek)
+        if num == "C-thin":
+            return Reflector.C_thin(debug=debug, greek=greek)
 
         raise NotFound(f'Reflector "{num}"')
 
@@ -109,3 +150,38 @@ class Reflector:
             Reflector.B(),
             Reflector.C(),
         ]
+
+    @staticmethod
+    def thin_list():
+        """List of thin reflectors (M4), which are used with Greek rotor.
+
+        Returns:
+            list[Reflector]: List of thin reflectors.
+        """
+        return [
+            Reflector.B_thin(),
+            Reflector.C_thin(),
+        ]
+
+
+@lru_cache(maxsize=None)
+def _registered_reflector(num: str, greek: tuple):
+    """Get wiring of reflector from registry, with Greek rotor (number, position, ring) folded in (None, if there is no such reflector)."""
+    from .rotor import Rotor
+    try:
+        greek_rotor = Rotor.by_num(greek[0], pos=greek[1], ring=greek[2]) if greek is not None else None
+        return bytes(Reflector.by_num(num, greek=greek_rotor).coding_list)
+    except NotFound:
+        return None
+
+
+def _restore_reflector(num: str, debug: bool, greek=None, wiring: bytes = None):
+    """Rebuild pickled reflector (see 'Reflector.__reduce__') from wiring, without parsing key again."""
+    if wiring is None:
+        wiring = _registered_reflector(num, (greek.num, greek.pos, greek.ring) if greek is not None else None)
+    reflector = Reflector.__new__(Reflector)
+    reflector.debug = debug
+    reflector.num = num
+    reflector.coding_list = list(wiring)
+    reflector.greek = greek  # already folded into wiring
+    return reflector
@@ -1,10 +1,12 @@
 """
 Rotor class
 """
+from functools import lru_cache
 from random import shuffle
 
 from .common import ALPH
 from .exceptions import NotFound
+from .permutation import Permutation
 
 
 class Rotor:
@@ -15,6 +17,8 @@ class Rotor:
         key (str):    Alphabet permutation (more in documentation).
         num (str):    Rotor's num.
         debug (bool): Debug mode
+        notches (str): Letters, at which rotor turns over the next one (used only by notched stepping).
+        ring (int):   Ring setting (Ringstellung): offset of wiring relative to rotor's position.
 
     Attributes:
         debug (bool):            Debug mode.
@@ -22,11 +26,13 @@ class Rotor:
         prev_rotor (Rotor):      The previous rotor.
         num (str):               Number
         pos (int):               Current position (rotation step).
-        coding_list (list[int]): Coding list (more in documentation).
+        coding_list (list[int]): Coding list (more in documentation), with ring setting applied.
+        notches (frozenset[int]): Positions, at which rotor turns over the next one.
+        ring (int):              Ring setting.
 
     """
 
-    def __init__(self, pos=0, key=None, num='', debug=False):
+    def __init__(self, pos=0, key=None, num='', debug=False, notches='', ring=0):
         self.debug = debug
 
         self.next_rotor = None  # pointer to next rotor, if any
@@ -34,6 +40,7 @@ class Rotor:
 
         self.num = num          # rotor's number (e.g. I, II, ..., VIII)
         self.pos = pos          # position (rotation step)
+        self.ring = ring        # ring setting
 
         # if key was not provided, use random permutation of alphabet
         key = key if key is not None else shuffle(ALPH.copy())
@@ -41,9 +48,38 @@ class Rotor:
         for char in key:
             self.coding_list.append(ALPH.index(char))  # creating coding_list (more in documentation).
 
+        # ring setting rotates wiring against the position: it is applied once here, so encoding doesn't depend on it
+        if ring:
+            self.coding_list = list(Permutation(self.coding_list).conjugate(-ring))
+
+        self.notches = frozenset(ALPH.index(char) for char in notches)
+
+    def __reduce__(self):
+        # compact state: rotor of registry is rebuilt by its number, custom one - from its wiring;
+        # links to other rotors are not pickled (see 'Enigma.__reduce__')
+        wiring = bytes(self.coding_list)
+        if (wiring, self.notches) == _registered_rotor(self.num, self.ring):
+            return _restore_rotor, (self.num, self.pos, self.ring, self.debug)
+        return _restore_rotor, (self.num, self.pos, self.ring, self.debug, wiring, bytes(sorted(self.notches)))
+
     def __str__(self):
+        if self.ring:
+            return self.num+':'+str(self.pos)+':'+str(self.ring)
         return self.num+':'+str(self.pos)
 
+    def permutation(self, pos: int = None):
+        """Get rotor at position as permutation of letters indices (from plugboard side to reflector side).
+
+        Reverse direction is its inverse.
+
+        Args:
+            pos (int): Position. Default: current position.
+
+        Returns:
+            Permutation: Permutation.
+        """
+        return Permutation.shift(self.pos if pos is None else pos).then(Permutation(self.coding_list))
+
     def encode(self, char: str, reverse: bool = False):
         """Encode char.
         Described in "Docs -> How it works -> Rotor"
@@ -94,53 +130,64 @@ class Rotor:
                 self.next_rotor.shift()
 
     @staticmethod
-    def I(pos=0, debug=False):
+    def I(pos=0, debug=False, ring=0):
         """Rotor I"""
-        return Rotor(pos=pos, key='ekmflgdqvzntowyhxuspaibrcj', num='I', debug=debug)
+        return Rotor(pos=pos, key='ekmflgdqvzntowyhxuspaibrcj', num='I', debug=debug, notches='q', ring=ring)
 
     @staticmethod
-    def II(pos=0, debug=False):
+    def II(pos=0, debug=False, ring=0):
         """Rotor II"""
-        return Rotor(pos=pos, key='wyhxuspaibrcjekmflgdqvznto', num='II', debug=debug)
+        return Rotor(pos=pos, key='wyhxuspaibrcjekmflgdqvznto', num='II', debug=debug, notches='e', ring=ring)
 
     @staticmethod
-    def III(pos=0, debug=False):
+    def III(pos=0, debug=False, ring=0):
         """Rotor III """
-        return Rotor(pos=pos, key='bdfhjlcprtxvznyeiwgakmusqo', num='III', debug=debug)
+        return Rotor(pos=pos, key='bdfhjlcprtxvznyeiwgakmusqo', num='III', debug=debug, notches='v', ring=ring)
 
     @staticmethod
-    def IV(pos=0, debug=False):
+    def IV(pos=0, debug=False, ring=0):
         """Rotor IV"""
-        return Rotor(pos=pos, key='esovpzjayquirhxlnftgkdcmwb', num='IV', debug=debug)
+        return Rotor(pos=pos, key='esovpzjayquirhxlnftgkdcmwb', num='IV', debug=debug, notches='j', ring=ring)
 
     @staticmethod
-    def V(pos=0, debug=False):
+    def V(pos=0, debug=False, ring=0):
         """Rotor V"""
-        return Rotor(pos=pos, key='vzbrgityupsdnhlxawmjqofeck', num='V', debug=debug)
+        return Rotor(pos=pos, key='vzbrgityupsdnhlxawmjqofeck', num='V', debug=debug, notches='z', ring=ring)
 
     @staticmethod
-    def VI(pos=0, debug=False):
+    def VI(pos=0, debug=False, ring=0):
         """Rotor VI"""
-        return Rotor(pos=pos, key='jpgvoumfyqbenhzrdkasxlictw', num='VI', debug=debug)
+        return Rotor(pos=pos, key='jpgvoumfyqbenhzrdkasxlictw', num='VI', debug=debug, notches='zm', ring=ring)
 
     @staticmethod
-    def VII(pos=0, debug=False):
+    def VII(pos=0, debug=False, ring=0):
         """Rotor VII"""
-        return Rotor(pos=pos, key='nzjhgrcxmyswboufaivlpekqdt', num='VII', debug=debug)
+        return Rotor(pos=pos, key='nzjhgrcxmyswboufaivlpekqdt', num='VII', debug=debug, notches='zm', ring=ring)
 
     @staticmethod
-    def VIII(pos=0, debug=False):
+    def VIII(pos=0, debug=False, ring=0):
         """Rotor VIII"""
-        return Rotor(pos=pos, key='fkqhtlxocbjspdzramewniuygv', num='VIII', debug=debug)
+        return Rotor(pos=pos, key='fkqhtlxocbjspdzramewniuygv', num='VIII', debug=debug, notches='zm', ring=ring)
+
+    @staticmethod
+    def Beta(pos=0, debug=False, ring=0):
+        """Greek rotor Beta (doesn't step, used only with thin reflector)"""
+        return Rotor(pos=pos, key='leyjvcnixwpbqmdrtakzgfuhos', num='Beta', debug=debug, ring=ring)
 
     @staticmethod
-    def by_num(num: str, pos: int = 0, debug: bool = False):
+    def Gamma(pos=0, debug=False, ring=0):
+        """Greek rotor Gamma (doesn't step, used only with thin reflector)"""
+        return Rotor(pos=pos, key='fsokanuerhmbtiycwlqpzxvgjd', num='Gamma', debug=debug, ring=ring)
+
+    @staticmethod
+    def by_num(num: str, pos: int = 0, debug: bool = False, ring: int = 0):
         """Get Rotor by num.
 
         Args:
-            num (str):    Rotors number (I, II, ..., VIII).
+            num (str):    Rotors number (I, II, ..., VIII, Beta, Gamma).
             pos (int):    Initial position.
             debug (bool): Debug mode
+            ring (int):   Ring setting.
 
         Returns:
             Rotor: Rotor instance
@@ -149,21 +196,25 @@ class Rotor:
             NotFound: If rotor with such "num" was not found
         """
         if num == 'I':
-            return Rotor.I(pos=pos, debug=debug)
+            return Rotor.I(pos=pos, debug=debug, ring=ring)
         if num == 'II':
-            return Rotor.II(pos=pos, debug=debug)
+            return Rotor.II(pos=pos, debug=debug, ring=ring)
         if num == 'III':
-            return Rotor.III(pos=pos, debug=debug)
+            return Rotor.III(pos=pos, debug=debug, ring=ring)
         if num == 'IV':
-            return Rotor.IV(pos=pos, debug=debug)
+            return Rotor.IV(pos=pos, debug=debug, ring=ring)
         if num == 'V':
-            return Rotor.V(pos=pos, debug=debug)
+            return Rotor.V(pos=pos, debug=debug, ring=ring)
         if num == 'VI':
-            return Rotor.VI(pos=pos, debug=debug)
+            return Rotor.VI(pos=pos, debug=debug, ring=ring)
         if num == 'VII':
-            return Rotor.VII(pos=pos, debug=debug)
+            return Rotor.VII(pos=pos, debug=debug, ring=ring)
         if num == 'VIII':
-            return Rotor.VIII(pos=pos, debug=debug)
+            return Rotor.VIII(pos=pos, debug=debug, ring=ring)
+        if num == 'Beta':
+            return Rotor.Beta(pos=pos, debug=debug, ring=ring)
+        if num == 'Gamma':
+            return Rotor.Gamma(pos=pos, debug=debug, ring=ring)
 
         raise NotFound(f'Rotor "{num}"')
 
@@ -187,3 +238,41 @@ class Rotor:
             Rotor.VII(),
             Rotor.VIII(),
         ]
+
+    @staticmethod
+    def greek_list():
+        """Get list of Greek rotors (the fourth, non-stepping rotor of M4, used with thin reflectors).
+
+        Returns:
+            list[Rotor]: List of Greek rotors.
+        """
+        return [
+            Rotor.Beta(),
+            Rotor.Gamma(),
+        ]
+
+
+@lru_cache(maxsize=None)
+def _registered_rotor(num: str, ring: int):
+    """Get wiring (with ring setting) and notches of rotor from registry (None, if there is no such rotor)."""
+    try:
+        rotor = Rotor.by_num(num, ring=ring)
+    except NotFound:
+        return None
+    return bytes(rotor.coding_list), rotor.notches
+
+
+def _restore_rotor(num: str, pos: int, ring: int, debug: bool, wiring: bytes = None, notches: bytes = None):
+    """Rebuild pickled rotor (see 'Rotor.__reduce__') from wiring, without parsing key again."""
+    if wiring is None:
+        wiring, notches = _registered_rotor(num, ring)
+    rotor = Rotor.__new__(Rotor)
+    rotor.debug = debug
+    rotor.next_rotor = None
+    rotor.prev_rotor = None
+    rotor.num = num
+    rotor.pos = pos
+    rotor.ring = ring  # already applied to wiring
+    rotor.coding_list = list(wiring)
+    rotor.notches = frozenset(notches)
+    return rotor
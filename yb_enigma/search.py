@@ -0,0 +1,234 @@
+"""
+Checkpointed key search over reflectors, rotors orders and positions
+"""
+import hashlib
+import heapq
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .keygen import REFLECTOR_NUMS, ROTOR_NUMS
+from .solver import NgramScorer, PlugboardSolver
+from .spec import MachineSpec, LETTER_TO_INDEX
+from .sweep import Sweep
+from .utils import prepare_string
+
+CHECKPOINT_VERSION = 1
+
+# start positions of shard are ranked by score of ciphertext's prefix: n-grams of a few hundred letters are enough,
+# and sweep (26^N outputs of the prefix) stays within memory limit
+SEARCH_PREFIX_LETTERS = 300
+SEARCH_SWEEP_BYTES = 64 * 2 ** 20
+
+
+def _save_checkpoint(path: str, state: dict):
+    """Write checkpoint atomically: to temporary file, which then replaces the old checkpoint.
+
+    Args:
+        path (str):   Path to checkpoint file.
+        state (dict): Checkpoint.
+
+    Returns:
+        None
+    """
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as file:
+        json.dump(state, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+class SearchJob:
+    """Search for key of ciphertext: every reflector, order of rotors and their start positions is tried.
+
+    Keyspace is split into deterministic shards: one shard is one reflector with one order of rotors
+    (all 26^N start positions of shard are scored in one sweep, see 'Sweep'). Sweep encodes only prefix
+    of ciphertext (at most SEARCH_PREFIX_LETTERS letters, and at most SEARCH_SWEEP_BYTES of outputs),
+    and the best start positions are then scored by the whole ciphertext.
+    Shards are processed in process pool; after each of them, set of done shards and top-K candidates
+    are written to checkpoint file, so search, which was interrupted, continues from the checkpoint.
+
+    Args:
+        ciphertext (str):         Ciphertext (only letters are used).
+        scorer (NgramScorer):     Scorer of candidate plaintexts.
+        checkpoint_path (str):    Path to checkpoint file.
+        rotors_amount (int):      Amount of rotors.
+        top_k (int):              Amount of the best candidates to keep.
+        plugboard (str):          Plugboard part of configuration string, used by all candidates (i.e. "AB:CD").
+        plugboard_restarts (int): If greater than 0, plugboard of each shard's candidate is recovered by hill climbing
+                                  (see 'PlugboardSolver') with this amount of restarts, and candidate is rescored.
+        max_pairs (int):          Max amount of plugpairs to recover.
+
+    Attributes:
+        shards (list[tuple[str, tuple[str]]]): Reflector number and rotors numbers of each shard.
+        done (set[int]):                       Indices of processed shards.
+        candidates (list[tuple[float, str]]):  The best candidates: score and configuration string (the best first).
+    """
+
+    def __init__(self, ciphertext: str, scorer: NgramScorer, checkpoint_path: str, rotors_amount: int = 3, top_k: int = 10,
+                 plugboard: str = '', plugboard_restarts: int = 0, max_pairs: int = 10):
+        self.ciphertext = prepare_string(ciphertext)
+        self.scorer = scorer
+        self.checkpoint_path = checkpoint_path
+        self.rotors_amount = rotors_amount
+        self.top_k = top_k
+        self.plugboard = plugboard
+        self.plugboard_restarts = plugboard_restarts
+        self.max_pairs = max_pairs
+
+        self.shards = [
+            (reflector, rotors)
+            for reflector in REFLECTOR_NUMS
+            for rotors in itertools.permutations(ROTOR_NUMS, rotors_amount)
+        ]
+        self.done = set()
+        self.candidates = []
+        self._fingerprint = None
+
+    def fingerprint(self):
+        """Get hash of all job parameters (checkpoint of another job must not be resumed).
+
+        Returns:
+            str: Hex digest.
+        """
+        if self._fingerprint is None:
+            digest = hashlib.sha256()
+            parameters = [self.ciphertext, self.rotors_amount, self.top_k, self.plugboard, self.plugboard_restarts, self.max_pairs]
+            digest.update(json.dumps(parameters).encode('utf-8'))
+            digest.update(self.scorer.bigrams.tobytes())
+            digest.update(self.scorer.trigrams.tobytes())
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def load_checkpoint(self):
+        """Load progress from checkpoint file, if it exists.
+
+        Returns:
+            bool: True, if checkpoint was loaded.
+
+        Raises:
+            ValueError: If checkpoint belongs to another job.
+        """
+        if not os.path.exists(self.checkpoint_path):
+            return False
+
+        with open(self.checkpoint_path) as file:
+            state = json.load(file)
+
+        if state.get('version') != CHECKPOINT_VERSION or state.get('fingerprint') != self.fingerprint():
+            raise ValueError(f'Checkpoint "{self.checkpoint_path}" belongs to another search job')
+
+        self.done = set(state['done'])
+        self.candidates = [(score, conf_str) for score, conf_str in state['candidates']]
+        return True
+
+    def save_checkpoint(self):
+        """Save progress to checkpoint file (atomically).
+
+        Returns:
+            None
+        """
+        _save_checkpoint(self.checkpoint_path, {
+            'version': CHECKPOINT_VERSION,
+            'fingerprint': self.fingerprint(),
+            'shards': len(self.shards),
+            'done': sorted(self.done),
+            'candidates': self.candidates,
+        })
+
+    def search_shard(self, index: int):
+        """Find the best candidates of one shard.
+
+        Args:
+            index (int): Shard index.
+
+        Returns:
+            list[tuple[float, str]]: Top-K candidates: score and configuration string.
+        """
+        reflector, rotors = self.shards[index]
+        conf_str = ' '.join(part for part in [reflector, '-'.join(rotors), self.plugboard] if part)
+        spec, _ = MachineSpec.from_configuration(conf_str)
+
+        states = 26 ** len(rotors)
+        prefix = min(SEARCH_PREFIX_LETTERS, max(SEARCH_SWEEP_BYTES // states, 1))
+        scores = Sweep(spec, self.ciphertext[:prefix]).scores(self.scorer.score)
+        best = heapq.nlargest(self.top_k, range(len(scores)), key=scores.__getitem__)
+        indices = self.ciphertext.encode('ascii').translate(LETTER_TO_INDEX)
+
+        candidates = []
+        for rank, state in enumerate(best):
+            positions = [(state // 26 ** i) % 26 for i in range(len(rotors))]
+            cursor = spec.cursor(positions)
+            score = self.scorer.score(spec.encode_indices(indices, cursor.copy()))
+
+            if self.plugboard_restarts > 0:
+                solver = PlugboardSolver(spec, cursor, self.ciphertext, self.scorer, max_pairs=self.max_pairs)
+                score, plugboard = solver.solve(restarts=self.plugboard_restarts, processes=1, seed=index * self.top_k + rank)
+                candidate_str = ' '.join(part for part in [reflector, spec.get_configuration(cursor).split(' ')[1],
+                                                           plugboard.get_pairs_string()] if part)
+            else:
+                candidate_str = spec.get_configuration(cursor)
+
+            candidates.append((score, candidate_str))
+        return candidates
+
+    def _merge(self, candidates: list):
+        """Merge candidates into top-K (ties are broken by configuration string, so result doesn't depend on order).
+
+        Args:
+            candidates (list[tuple[float, str]]): Candidates.
+
+        Returns:
+            None
+        """
+        self.candidates = heapq.nlargest(self.top_k, set(self.candidates) | set(candidates))
+
+    def run(self, processes: int = None, progress=None):
+        """Run (or resume from checkpoint) search.
+
+        Args:
+            processes (int):     Amount of worker processes (1 - no pool). Default: CPU count.
+            progress (Callable): Called with amount of done shards and amount of all shards after each shard.
+
+        Returns:
+            list[tuple[float, str]]: The best candidates: score and configuration string (the best first).
+        """
+        self.load_checkpoint()
+        pending = [index for index in range(len(self.shards)) if index not in self.done]
+
+        if processes == 1:
+            results = ((index, self.search_shard(index)) for index in pending)
+        else:
+            executor = ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(self,))
+            futures = [executor.submit(_worker_search_shard, index) for index in pending]
+            results = (future.result() for future in as_completed(futures))
+
+        try:
+            for index, candidates in results:
+                self._merge(candidates)
+                self.done.add(index)
+                self.save_checkpoint()
+                if progress is not None:
+                    progress(len(self.done), len(self.shards))
+        finally:
+            if processes != 1:
+                executor.shutdown(cancel_futures=True)
+
+        return self.candidates
+
+
+# search job of worker process (set once per process, so scorer tables are not sent with each shard)
+_worker_job = None
+
+
+def _init_worker(job: SearchJob):
+    """Set search job of worker process."""
+    global _worker_job
+    _worker_job = job
+
+
+def _worker_search_shard(index: int):
+    """Search one shard in worker process."""
+    return index, _worker_job.search_shard(index)
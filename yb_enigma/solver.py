@@ -0,0 +1,313 @@
+"""
+Plugboard recovery: hill climbing over plugpairs with n-gram scoring
+"""
+import math
+import random
+import sys
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
+from operator import itemgetter
+
+from .common import ALPH
+from .plugboard import Plugboard
+from .spec import MachineSpec, Cursor, IDENTITY, PADDING, LETTER_TO_INDEX
+from .stepping import ODOMETER
+from .utils import prepare_string
+
+# n-grams of letter indices are read from bytes as unsigned integers:
+# bigram (a, b) => a + 256 * b, trigram (a, b, c) => a + 256 * b + 65536 * c
+BIGRAMS_SIZE = 26 + 256 * 25
+TRIGRAMS_SIZE = 26 + 256 * 25 + 65536 * 25
+UINT32 = 'I' if array('I').itemsize == 4 else 'L'
+
+DEFAULT_MAX_PAIRS = 10
+
+
+def ngram_codes(indices: bytes, n: int):
+    """Get codes of all n-grams (n = 2 or 3) of letter indices, without Python-level loop.
+
+    Args:
+        indices (bytes): Letter indices.
+        n (int):         N-gram length (2 or 3).
+
+    Returns:
+        array: Codes (see BIGRAMS_SIZE, TRIGRAMS_SIZE).
+    """
+    count = len(indices) - n + 1
+    if count <= 0:
+        return array('H' if n == 2 else UINT32)
+
+    width = 2 if n == 2 else 4
+    buffer = bytearray(width * count)
+    for i in range(n):
+        buffer[i::width] = indices[i:i + count]
+
+    codes = array('H' if n == 2 else UINT32, buffer)
+    if sys.byteorder == 'big':
+        codes.byteswap()
+    return codes
+
+
+def _gather(data: bytes, indices: list[int]):
+    """Get bytes of 'data' at given indices (C-level loop of 'itemgetter').
+
+    Args:
+        data (bytes):        Data.
+        indices (list[int]): Indices.
+
+    Returns:
+        bytes: Gathered bytes.
+    """
+    if len(indices) == 0:
+        return b''
+    if len(indices) == 1:
+        return bytes([data[indices[0]]])
+    return bytes(itemgetter(*indices)(data))
+
+
+class NgramScorer:
+    """Log-probability tables of bigrams and trigrams, held as flat arrays indexed by n-gram codes.
+
+    Args:
+        bigrams (array):  Bigrams log-probabilities (BIGRAMS_SIZE items).
+        trigrams (array): Trigrams log-probabilities (TRIGRAMS_SIZE items).
+
+    Attributes:
+        bigrams (array):  Bigrams log-probabilities.
+        trigrams (array): Trigrams log-probabilities.
+    """
+
+    def __init__(self, bigrams: array, trigrams: array):
+        self.bigrams = bigrams
+        self.trigrams = trigrams
+
+    @staticmethod
+    def from_text(text: str):
+        """Count n-grams of sample text (only letters are used).
+
+        Args:
+            text (str): Sample text in target language.
+
+        Returns:
+            NgramScorer: Scorer instance.
+        """
+        indices = prepare_string(text).encode('ascii').translate(LETTER_TO_INDEX)
+
+        tables = []
+        for n, size in [(2, BIGRAMS_SIZE), (3, TRIGRAMS_SIZE)]:
+            counts = Counter(ngram_codes(indices, n))
+            total = max(sum(counts.values()), 1)
+            # unseen n-grams are much less likely than any seen one
+            table = array('f', [math.log10(0.01 / total)]) * size
+            for code, count in counts.items():
+                table[code] = math.log10(count / total)
+            tables.append(table)
+
+        return NgramScorer(*tables)
+
+    def score(self, indices: bytes):
+        """Score letters: sum of log-probabilities of all bigrams and trigrams.
+
+        Args:
+            indices (bytes): Letter indices.
+
+        Returns:
+            float: Score (greater is more likely).
+        """
+        return (sum(map(self.bigrams.__getitem__, ngram_codes(indices, 2)))
+                + sum(map(self.trigrams.__getitem__, ngram_codes(indices, 3))))
+
+
+class PlugboardSolver:
+    """Recover plugboard of ciphertext, when reflector, rotors and their positions are known.
+
+    With plugboard S and rotors (with reflector) permutation P_i at i-th key press, plaintext letter is S[P_i[S[c_i]]].
+    Rotors permutations are computed once: for each ciphertext letter c and each letter y = S[c],
+    letters P_i[y] at all positions i with c_i = c are stored as one bytes string.
+    So decryption with candidate plugboard is 26 lookups, 'bytes.translate' and one C-level reordering.
+
+    Args:
+        spec (MachineSpec):   Spec (its plugboard is ignored).
+        cursor (Cursor):      Cursor at message start (not moved).
+        ciphertext (str):     Ciphertext (only letters are used).
+        scorer (NgramScorer): Scorer of candidate plaintexts.
+        max_pairs (int):      Max amount of plugpairs.
+
+    Attributes:
+        scorer (NgramScorer): Scorer of candidate plaintexts.
+        max_pairs (int):      Max amount of plugpairs.
+    """
+
+    def __init__(self, spec: MachineSpec, cursor: Cursor, ciphertext: str, scorer: NgramScorer, max_pairs: int = DEFAULT_MAX_PAIRS):
+        self.scorer = scorer
+        self.max_pairs = max_pairs
+
+        cipher = prepare_string(ciphertext).encode('ascii').translate(LETTER_TO_INDEX)
+        spec = replace(spec, plugboard=IDENTITY)
+
+        # keystream[y][i] = P_i[y]
+        keystream = [spec.encode_indices(bytes([y]) * len(cipher), cursor.copy()) for y in range(26)]
+
+        positions = [[] for _ in range(26)]
+        for i, c in enumerate(cipher):
+            positions[c].append(i)
+
+        # groups[c][y]: P_i[y] for all i with c_i = c
+        self._groups = [[_gather(keystream[y], positions[c]) for y in range(26)] for c in range(26)]
+
+        # order[i]: index of i-th letter in concatenation of groups
+        concatenated = [i for group_positions in positions for i in group_positions]
+        self._order = [0] * len(cipher)
+        for k, i in enumerate(concatenated):
+            self._order[i] = k
+
+    @staticmethod
+    def from_configuration(conf_str: str, ciphertext: str, scorer: NgramScorer, max_pairs: int = DEFAULT_MAX_PAIRS, stepping: str = ODOMETER):
+        """Create solver from configuration string (its plugboard is ignored).
+
+        Args:
+            conf_str (str):        Configuration string.
+            ciphertext (str):      Ciphertext.
+            scorer (NgramScorer):  Scorer of candidate plaintexts.
+            max_pairs (int):       Max amount of plugpairs.
+            stepping (str):        Rotors stepping mode.
+
+        Returns:
+            PlugboardSolver: Solver instance.
+        """
+        spec, cursor = MachineSpec.from_configuration(conf_str, stepping)
+        return PlugboardSolver(spec, cursor, ciphertext, scorer, max_pairs=max_pairs)
+
+    def decrypt(self, plugboard: bytes):
+        """Decrypt ciphertext with candidate plugboard.
+
+        Args:
+            plugboard (bytes): Plugboard map (letter index => letter index).
+
+        Returns:
+            bytes: Plaintext letter indices.
+        """
+        grouped = b''.join(groups[y] for groups, y in zip(self._groups, plugboard)).translate(plugboard + PADDING)
+        return _gather(grouped, self._order)
+
+    def score(self, plugboard: bytes):
+        """Score candidate plugboard.
+
+        Args:
+            plugboard (bytes): Plugboard map.
+
+        Returns:
+            float: Score of decryption.
+        """
+        return self.scorer.score(self.decrypt(plugboard))
+
+    def climb(self, plugboard: bytes):
+        """Hill climb from given plugboard: try to connect (or disconnect) every pair of letters, until score grows.
+
+        Args:
+            plugboard (bytes): Start plugboard map.
+
+        Returns:
+            tuple[float, bytes]: Score and the best found plugboard map.
+        """
+        best, best_score = bytes(plugboard), self.score(plugboard)
+
+        improved = True
+        while improved:
+            improved = False
+            for a in range(26):
+                for b in range(a + 1, 26):
+                    candidate = _swap(best, a, b, self.max_pairs)
+                    if candidate is None:
+                        continue
+                    score = self.score(candidate)
+                    if score > best_score:
+                        best, best_score = candidate, score
+                        improved = True
+
+        return best_score, best
+
+    def _random_climb(self, seed):
+        """Hill climb from random plugboard (see 'climb').
+
+        Args:
+            seed (int): Random numbers generator seed.
+
+        Returns:
+            tuple[float, bytes]: Score and plugboard map.
+        """
+        rng = random.Random(seed)
+        mapping = bytearray(IDENTITY)
+        letters = rng.sample(range(26), 2 * rng.randint(0, self.max_pairs))
+        for i in range(0, len(letters), 2):
+            a, b = letters[i], letters[i + 1]
+            mapping[a], mapping[b] = b, a
+        return self.climb(bytes(mapping))
+
+    def solve(self, restarts: int = 8, processes: int = None, seed=None):
+        """Recover plugboard: hill climb from 'restarts' random plugboards (in process pool) and take the best result.
+
+        Args:
+            restarts (int):   Amount of random restarts.
+            processes (int):  Amount of worker processes (1 - no pool). Default: CPU count.
+            seed (int | str): Random numbers generator seed.
+
+        Returns:
+            tuple[float, Plugboard]: Score and recovered plugboard.
+        """
+        rng = random.Random(seed)
+        seeds = [rng.getrandbits(64) for _ in range(restarts)]
+
+        if processes == 1:
+            results = list(map(self._random_climb, seeds))
+        else:
+            with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(self,)) as executor:
+                results = list(executor.map(_worker_climb, seeds))
+
+        score, mapping = max(results, key=itemgetter(0))
+        pairs = [{ALPH[a], ALPH[b]} for a, b in enumerate(mapping) if a < b]
+        return score, Plugboard(pairs=pairs)
+
+
+def _swap(plugboard: bytes, a: int, b: int, max_pairs: int):
+    """Connect letters 'a' and 'b' (disconnecting their current pairs), or disconnect them, if they are connected.
+
+    Args:
+        plugboard (bytes): Plugboard map.
+        a (int):           Letter index.
+        b (int):           Letter index.
+        max_pairs (int):   Max amount of plugpairs.
+
+    Returns:
+        bytes | None: New plugboard map (None, if there would be too many plugpairs).
+    """
+    mapping = bytearray(plugboard)
+    if mapping[a] == b:
+        mapping[a], mapping[b] = a, b
+        return bytes(mapping)
+
+    for letter in (a, b):
+        mapping[mapping[letter]] = mapping[letter]
+        mapping[letter] = letter
+    mapping[a], mapping[b] = b, a
+
+    if sum(x > i for i, x in enumerate(mapping)) > max_pairs:
+        return None
+    return bytes(mapping)
+
+
+# solver of worker process (set once per process, so tables are not sent with each task)
+_worker_solver = None
+
+
+def _init_worker(solver: PlugboardSolver):
+    """Set solver of worker process."""
+    global _worker_solver
+    _worker_solver = solver
+
+
+def _worker_climb(seed):
+    """Hill climb from random plugboard in worker process."""
+    return _worker_solver._random_climb(seed)
@@ -0,0 +1,387 @@
+"""
+MachineSpec and Cursor classes
+"""
+import hashlib
+import itertools
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+from .common import ALPH
+from .permutation import Permutation, PermutationBatch
+from .stepping import ODOMETER, NOTCHED, STEPPING_MODES, get_schedule
+from .tables import get_table_cache
+from .utils import parse_configuration, prepare_string
+
+IDENTITY = bytes(range(26))
+
+# tables of 26 letters are padded to 256 bytes, to be used by 'bytes.translate'
+PADDING = bytes(230)
+
+# 'bytes.translate' tables: lowercase letter => its index in alphabet, and back
+LETTER_TO_INDEX = bytes(ALPH.index(chr(i)) if chr(i) in ALPH else 0 for i in range(256))
+INDEX_TO_LETTER = ''.join(ALPH).encode('ascii') + bytes(range(26, 256))
+LETTER_INDICES = {char: i for i, char in enumerate(ALPH)}
+
+
+def table_key(*parts: bytes):
+    """Get canonical key of tables, built from wirings (see 'TableCache').
+
+    Args:
+        *parts (bytes): Wirings (coding lists, plugboard map, ...).
+
+    Returns:
+        str: Hex digest.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(len(part).to_bytes(1, 'little'))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+class Cursor:
+    """Mutable state of machine: rotors positions.
+
+    Each thread (or task) encoding with shared MachineSpec must use its own cursor.
+
+    Args:
+        positions (list[int]): Rotors positions, from the first rotor to the last.
+
+    Attributes:
+        positions (list[int]): Current rotors positions, from the first rotor to the last.
+        offset (int):          Amount of key presses since cursor was created (used by notched stepping).
+        start (tuple[int]):    Positions, at which cursor was created.
+    """
+
+    def __init__(self, positions: list[int]):
+        self.positions = list(positions)
+        self.start = tuple(self.positions)
+        self.offset = 0
+
+    def copy(self):
+        """Get independent copy of cursor.
+
+        Returns:
+            Cursor: Cursor instance.
+        """
+        cursor = Cursor(self.start)
+        cursor.positions = list(self.positions)
+        cursor.offset = self.offset
+        return cursor
+
+
+@dataclass(frozen=True)
+class MachineSpec:
+    """Immutable (and hashable) description of machine: wirings and order of rotors, reflector and plugboard.
+
+    Spec has no state, so it can be shared by any amount of threads without locks,
+    each of them encoding with its own Cursor.
+
+    Args:
+        rotors (tuple[bytes]):         Rotors coding lists, from the first rotor to the last.
+        reflector (bytes):             Reflector coding list.
+        plugboard (bytes):             Plugboard map (letter index => letter index).
+        notches (tuple[frozenset]):    Notch positions of each rotor, from the first rotor to the last.
+        stepping (str):                Rotors stepping mode ('odometer' or 'notched').
+        rotor_nums (tuple[str]):       Rotors numbers, from the first rotor to the last.
+        reflector_num (str):           Reflector number.
+        rings (tuple[int]):            Ring settings of each rotor (already applied to 'rotors' wirings).
+        greek (str):                   Configuration of Greek rotor (already folded into 'reflector' wiring), i.e. "Beta:3".
+    """
+    rotors: tuple
+    reflector: bytes
+    plugboard: bytes = IDENTITY
+    notches: tuple = None
+    stepping: str = ODOMETER
+    rotor_nums: tuple = None
+    reflector_num: str = ''
+    rings: tuple = None
+    greek: str = ''
+
+    # precomputed tables (not a part of spec's identity)
+    _forward: tuple = field(init=False, repr=False, compare=False)
+    _backward: tuple = field(init=False, repr=False, compare=False)
+    _reflector: bytes = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        if len(self.rotors) == 0:
+            raise ValueError('Empty rotors list')
+        if self.stepping not in STEPPING_MODES:
+            raise ValueError(f'Unknown stepping mode "{self.stepping}"')
+        if self.notches is None:
+            object.__setattr__(self, 'notches', (frozenset(),) * len(self.rotors))
+        if self.rotor_nums is None:
+            object.__setattr__(self, 'rotor_nums', ('',) * len(self.rotors))
+        if self.rings is None:
+            object.__setattr__(self, 'rings', (0,) * len(self.rotors))
+
+        # forward[i][pos][x]:  rotor i at position pos, passing letter x from plugboard side
+        # backward[i][pos][y]: rotor i at position pos, passing letter y from reflector side
+        cache = get_table_cache()
+        if cache is not None:
+            tables = cache.get(table_key(*self.rotors), 'rotors', self._compile_rotor_tables)
+        else:
+            tables = compile_rotor_tables(self.rotors)
+
+        # tables: 26 forward tables of each rotor, then 26 backward tables of each rotor
+        views = [tables[i:i + 256] for i in range(0, len(tables), 256)]
+        forward = [tuple(views[i:i + 26]) for i in range(0, len(views) // 2, 26)]
+        backward = [tuple(views[i:i + 26]) for i in range(len(views) // 2, len(views), 26)]
+
+        object.__setattr__(self, '_forward', tuple(forward))
+        object.__setattr__(self, '_backward', tuple(backward))
+        object.__setattr__(self, '_reflector', bytes(self.reflector) + PADDING)
+
+    def __reduce__(self):
+        # tables may be memory-mapped, so only wirings are pickled (tables are loaded again)
+        return MachineSpec, (self.rotors, self.reflector, self.plugboard, self.notches, self.stepping,
+                             self.rotor_nums, self.reflector_num, self.rings, self.greek)
+
+    def _compile_rotor_tables(self):
+        """Build translate tables of every rotor at every position (see 'compile_rotor_tables')."""
+        return compile_rotor_tables(self.rotors)
+
+    @staticmethod
+    def from_configuration(conf_str: str, stepping: str = ODOMETER):
+        """Create spec and cursor from configuration string.
+
+        Args:
+            conf_str (str): Configuration string (more in documentation).
+            stepping (str): Rotors stepping mode ('odometer' or 'notched').
+
+        Returns:
+            tuple[MachineSpec, Cursor]: Spec and cursor at configuration's positions.
+        """
+        reflector, rotors_list, plugboard = parse_configuration(conf_str)
+        rotors_list.reverse()
+
+        spec = MachineSpec(
+            rotors=tuple(bytes(rotor.coding_list) for rotor in rotors_list),
+            reflector=bytes(reflector.coding_list),
+            plugboard=plugboard_map(plugboard),
+            notches=tuple(rotor.notches for rotor in rotors_list),
+            stepping=stepping,
+            rotor_nums=tuple(rotor.num for rotor in rotors_list),
+            reflector_num=reflector.num,
+            rings=tuple(rotor.ring for rotor in rotors_list),
+            greek=str(reflector.greek) if reflector.greek is not None else '',
+        )
+        return spec, Cursor(rotor.pos for rotor in rotors_list)
+
+    def cursor(self, positions: list[int] = None):
+        """Create new cursor.
+
+        Args:
+            positions (list[int]): Rotors positions, from the first rotor to the last. Default: all 0.
+
+        Returns:
+            Cursor: Cursor instance.
+        """
+        return Cursor(positions if positions is not None else [0] * len(self.rotors))
+
+    def get_configuration(self, cursor: Cursor):
+        """Get configuration string for cursor's positions.
+
+        Args:
+            cursor (Cursor): Cursor.
+
+        Returns:
+            str: Configuration string (more in documentation).
+        """
+        rotors_conf = '-'.join(([self.greek] if self.greek else []) + [
+            num + ':' + str(pos) + (':' + str(ring) if ring else '')
+            for num, pos, ring in zip(reversed(self.rotor_nums), reversed(cursor.positions), reversed(self.rings))
+        ])
+        plugboard_conf = ':'.join(
+            (ALPH[i] + ALPH[j]).upper() for i, j in enumerate(self.plugboard) if i < j
+        )
+        return ' '.join(part for part in [self.reflector_num, rotors_conf, plugboard_conf] if part)
+
+    def encode_indices(self, indices: bytes, cursor: Cursor):
+        """Encode letters, given by their indices in alphabet. Cursor is moved by len(indices) key presses.
+
+        Rotors after the first one move rarely, so they are composed with reflector into one table,
+        which is rebuilt only when they move. Each letter then costs 3 lookups (+ plugboard).
+
+        Args:
+            indices (bytes): Letters indices (0...25).
+            cursor (Cursor): Cursor.
+
+        Returns:
+            bytearray: Encoded letters indices.
+        """
+        plugboard = self.plugboard
+        first_forward, first_backward = self._forward[0], self._backward[0]
+        encoded = bytearray(len(indices))
+
+        if self.stepping == NOTCHED:
+            # states of all positions are stepped by shared successors table (see 'StepTable')
+            schedule = get_schedule(cursor.start, self.notches)
+            states, successors = schedule.table.states, schedule.table.successors
+            state = schedule.state_at(cursor.offset)
+            slow_state = None
+            for i, x in enumerate(indices):
+                state = successors[state]
+                if state // 26 != slow_state:
+                    slow_state = state // 26
+                    middle = self._middle_table(states[state][1:])
+
+                pos = state % 26
+                encoded[i] = plugboard[first_backward[pos][middle[first_forward[pos][plugboard[x]]]]]
+
+            cursor.offset = schedule.normalize(cursor.offset + len(indices))
+            cursor.positions = list(states[state])
+            return encoded
+
+        positions = cursor.positions
+        middle = self._middle_table(positions[1:])
+        pos = positions[0]
+        for i, x in enumerate(indices):
+            pos += 1
+            if pos > 25:
+                # full rotation of the first rotor: shift the rest of rotors as odometer
+                pos = 0
+                for j in range(1, len(positions)):
+                    positions[j] += 1
+                    if positions[j] <= 25:
+                        break
+                    positions[j] = 0
+                middle = self._middle_table(positions[1:])
+
+            encoded[i] = plugboard[first_backward[pos][middle[first_forward[pos][plugboard[x]]]]]
+
+        positions[0] = pos
+        return encoded
+
+    def _middle_table(self, slow_positions):
+        """Compose rotors after the first one, reflector and the same rotors backwards into one table.
+
+        Args:
+            slow_positions (list[int]): Positions of rotors after the first one.
+
+        Returns:
+            bytes: Translate table (letter index => letter index).
+        """
+        table = IDENTITY
+        for forward, pos in zip(self._forward[1:], slow_positions):
+            table = table.translate(forward[pos])
+        table = table.translate(self._reflector)
+        for backward, pos in zip(reversed(self._backward[1:]), reversed(slow_positions)):
+            table = table.translate(backward[pos])
+        return table + PADDING
+
+    def permutation(self, positions: list[int]):
+        """Get the whole machine (plugboard, rotors and reflector) at positions as one permutation.
+
+        Args:
+            positions (list[int]): Rotors positions, from the first rotor to the last.
+
+        Returns:
+            Permutation: Permutation (involution without fixed points).
+        """
+        table = self.plugboard
+        for forward, pos in zip(self._forward, positions):
+            table = table.translate(forward[pos])
+        table = table.translate(self._reflector)
+        for backward, pos in zip(reversed(self._backward), reversed(positions)):
+            table = table.translate(backward[pos])
+        return Permutation(table.translate(self.plugboard + PADDING))
+
+    def permutations(self):
+        """Get permutations of the machine at all states (see 'state_table').
+
+        Returns:
+            PermutationBatch: Permutations, indexed by state.
+        """
+        return PermutationBatch(self.state_table())
+
+    def state_table(self):
+        """Get permutation of the whole machine (plugboard, rotors and reflector) at every rotors positions.
+
+        Positions are enumerated as odometer (the first rotor is the least significant digit),
+        so after key press at state s machine is at state s + 1.
+        If table cache is set (see 'set_table_cache'), table is built once and then memory-mapped from cache.
+
+        Returns:
+            bytes | memoryview: Permutations (26 letter indices each) of all 26^N states, one after another.
+        """
+        cache = get_table_cache()
+        if cache is not None:
+            return cache.get(self.table_key(), 'states', self._compile_state_table)
+        return self._compile_state_table()
+
+    def table_key(self):
+        """Get canonical key of spec's tables (stepping and rotors numbers don't change them).
+
+        Returns:
+            str: Hex digest.
+        """
+        return table_key(self.reflector, self.plugboard, *self.rotors)
+
+    def _compile_state_table(self):
+        """Build permutations of all states (see 'state_table').
+
+        Returns:
+            bytes: Permutations.
+        """
+        plugboard = self.plugboard + PADDING
+        # plugboard with the first rotor at each position, forward and backward
+        first = [self.plugboard.translate(forward) for forward in self._forward[0]]
+        last = [bytes(backward[:26]).translate(plugboard) + PADDING for backward in self._backward[0]]
+
+        permutations = []
+        for slow_positions in itertools.product(range(26), repeat=len(self.rotors) - 1):
+            middle = self._middle_table(slow_positions[::-1])
+            permutations.extend(first[pos].translate(middle).translate(last[pos]) for pos in range(26))
+        return b''.join(permutations)
+
+    def encode(self, string: str, cursor: Cursor):
+        """Encode string (like 'Enigma.encode': only letters are kept). Cursor is moved.
+
+        Args:
+            string (str):    String to encode.
+            cursor (Cursor): Cursor.
+
+        Returns:
+            str: Encoded string.
+        """
+        indices = prepare_string(string).encode('ascii').translate(LETTER_TO_INDEX)
+        return self.encode_indices(indices, cursor).translate(INDEX_TO_LETTER).decode('ascii')
+
+
+@lru_cache(maxsize=64)
+def compile_rotor_tables(rotors: tuple):
+    """Build (cached) translate tables of every rotor at every position.
+
+    Specs with the same rotors wirings (i.e. the same key at other positions) share the same tables.
+
+    Args:
+        rotors (tuple[bytes]): Rotors coding lists, from the first rotor to the last.
+
+    Returns:
+        bytes: 26 forward tables of each rotor, then 26 backward tables of each rotor (256 bytes each).
+    """
+    forward, backward = [], []
+    for wiring in rotors:
+        inverse = [0] * 26
+        for x, y in enumerate(wiring):
+            inverse[y] = x
+        forward.extend(bytes(wiring[(x + pos) % 26] for x in range(26)) + PADDING for pos in range(26))
+        backward.extend(bytes((inverse[y] - pos) % 26 for y in range(26)) + PADDING for pos in range(26))
+    return b''.join(forward + backward)
+
+
+def plugboard_map(plugboard):
+    """Get plugboard as map: letter index => letter index.
+
+    Args:
+        plugboard (Plugboard): Plugboard.
+
+    Returns:
+        bytes: Plugboard map.
+    """
+    mapping = bytearray(IDENTITY)
+    for i, j in plugboard.pairs:
+        i, j = LETTER_INDICES[i], LETTER_INDICES[j]
+        mapping[i], mapping[j] = j, i
+    return bytes(mapping)
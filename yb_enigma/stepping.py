@@ -0,0 +1,290 @@
+"""
+Rotors stepping
+"""
+import itertools
+from functools import lru_cache
+
+ODOMETER = 'odometer'
+NOTCHED = 'notched'
+
+STEPPING_MODES = [ODOMETER, NOTCHED]
+
+MAX_NOTCHED_ROTORS = 3
+
+
+def odometer_carries(positions: list[int], steps: int):
+    """Get amount of times each rotor turns over the next one during 'steps' key presses (odometer stepping).
+
+    Args:
+        positions (list[int]): Rotors positions (from the first rotor to the last).
+        steps (int):           Amount of key presses.
+
+    Returns:
+        list[int]: Amount of carries for each rotor, except the last one.
+    """
+    value = 0
+    for pos in reversed(positions):
+        value = value * 26 + pos
+
+    return [(value + steps) // 26 ** i - value // 26 ** i for i in range(1, len(positions))]
+
+
+def notched_step(positions: tuple, notches: tuple):
+    """Make one step of notched (historical) stepping.
+
+    First rotor steps every time. Every other rotor steps, if previous rotor is at its notch,
+    or if the rotor itself is at its notch and there is a next rotor (double stepping).
+
+    Args:
+        positions (tuple[int]):     Rotors positions (from the first rotor to the last).
+        notches (tuple[frozenset]): Notch positions of each rotor.
+
+    Returns:
+        tuple[int]: Rotors positions after step.
+    """
+    last = len(positions) - 1
+    new_positions = [(positions[0] + 1) % 26]
+    for i in range(1, len(positions)):
+        if positions[i - 1] in notches[i - 1] or (i < last and positions[i] in notches[i]):
+            new_positions.append((positions[i] + 1) % 26)
+        else:
+            new_positions.append(positions[i])
+
+    return tuple(new_positions)
+
+
+class StepTable:
+    """Notched stepping of all 26^N rotors positions at once, shared by all machines with the same notches.
+
+    Each state (positions as odometer value, the first rotor is the least significant digit) has one successor,
+    so states form functional graph: short tails (states, which can't be reached by stepping, i.e. middle rotor
+    at its notch), leading into cycles. Each cycle is stored once in step order, with amount of carries of each rotor
+    before each of its states, and each state knows its cycle, place of entry into it and length of its tail.
+
+    Args:
+        notches (tuple[frozenset]): Notch positions of each rotor.
+
+    Attributes:
+        states (list[tuple[int]]):       Positions of each state.
+        successors (list[int]):          State after one key press.
+        cycles (list[list[int]]):        States of each cycle, in step order.
+        cycle_carries (list[list[tuple[int]]]): Carries of each rotor (except the last one) before each state of cycle
+                                         (one more item than cycle: the last one is after the whole cycle).
+        cycle_of (list[int]):            Cycle of each state.
+        entry (list[int]):               Place in cycle, at which state enters it.
+        tail (list[int]):                Amount of steps before state enters its cycle (0 - state is in cycle).
+
+    Raises:
+        ValueError: If there are too many rotors.
+    """
+
+    def __init__(self, notches: tuple):
+        if len(notches) > MAX_NOTCHED_ROTORS:
+            raise ValueError(f'Notched stepping supports at most {MAX_NOTCHED_ROTORS} rotors')
+
+        self.notches = notches
+        self.states = [tuple(reversed(positions)) for positions in itertools.product(range(26), repeat=len(notches))]
+        index = {state: i for i, state in enumerate(self.states)}
+        self.successors = [index[notched_step(state, notches)] for state in self.states]
+
+        self.cycles = []
+        self.cycle_carries = []
+        self.cycle_of = [-1] * len(self.states)
+        self.entry = [0] * len(self.states)
+        self.tail = [0] * len(self.states)
+
+        for first in range(len(self.states)):
+            if self.cycle_of[first] >= 0:
+                continue
+            # walk until known state, or until the path closes into new cycle
+            path = []
+            on_path = {}
+            state = first
+            while self.cycle_of[state] < 0 and state not in on_path:
+                on_path[state] = len(path)
+                path.append(state)
+                state = self.successors[state]
+
+            if self.cycle_of[state] < 0:
+                cycle = path[on_path[state]:]
+                path = path[:on_path[state]]
+                for place, cycle_state in enumerate(cycle):
+                    self.cycle_of[cycle_state] = len(self.cycles)
+                    self.entry[cycle_state] = place
+                self.cycles.append(cycle)
+                self.cycle_carries.append(self._carries(cycle))
+
+            for tail_state in reversed(path):
+                self.cycle_of[tail_state] = self.cycle_of[state]
+                self.entry[tail_state] = self.entry[state]
+                self.tail[tail_state] = self.tail[state] + 1
+                state = tail_state
+
+    def _carries(self, states: list[int]):
+        """Get carries of each rotor (except the last one) before each of states, and after all of them."""
+        carries = [(0,) * (len(self.notches) - 1)]
+        for state in states:
+            carries.append(tuple(
+                rotor_carries + (pos in rotor_notches)
+                for rotor_carries, pos, rotor_notches in zip(carries[-1], self.states[state], self.notches)
+            ))
+        return carries
+
+    def state_index(self, positions):
+        """Get state of positions (from the first rotor to the last)."""
+        index = 0
+        for pos in reversed(positions):
+            index = index * 26 + pos
+        return index
+
+
+class SteppingSchedule:
+    """Stepping schedule from the start positions: rotors positions at each step.
+
+    Sequence of positions always ends up in cycle, so schedule is tail (a few steps before the start enters
+    its cycle) plus the cycle of shared step table (see 'StepTable'): nothing is stepped, when schedule is created.
+
+    Args:
+        start (tuple[int]):         Start positions (from the first rotor to the last).
+        notches (tuple[frozenset]): Notch positions of each rotor.
+
+    Attributes:
+        table (StepTable):            Step table of notches.
+        positions (Sequence[tuple[int]]): Positions at each step (until the first repetition).
+        cycle_start (int):            Step, from which schedule is periodic.
+        period (int):                 Period of the cycle.
+
+    Raises:
+        ValueError: If there are too many rotors.
+    """
+
+    def __init__(self, start: tuple, notches: tuple):
+        if len(start) > MAX_NOTCHED_ROTORS:
+            raise ValueError(f'Notched stepping supports at most {MAX_NOTCHED_ROTORS} rotors')
+
+        self.table = table = get_step_table(notches)
+        state = table.state_index(start)
+        self.cycle_start = table.tail[state]
+        self._tail = []
+        for _ in range(self.cycle_start):
+            self._tail.append(state)
+            state = table.successors[state]
+
+        self._cycle = table.cycles[table.cycle_of[state]]
+        self._cycle_carries = table.cycle_carries[table.cycle_of[state]]
+        self._entry = table.entry[state]
+        self.period = len(self._cycle)
+        self._tail_carries = table._carries(self._tail)
+        self.positions = _SchedulePositions(self)
+
+    def state_at(self, offset: int):
+        """Get state (see 'StepTable') after 'offset' key presses.
+
+        Args:
+            offset (int): Step (amount of key presses from the start).
+
+        Returns:
+            int: State.
+        """
+        offset = self.normalize(offset)
+        if offset < self.cycle_start:
+            return self._tail[offset]
+        return self._cycle[(self._entry + offset - self.cycle_start) % self.period]
+
+    def carries_at(self, offset: int):
+        """Get amount of times each rotor has turned over the next one during 'offset' key presses.
+
+        Args:
+            offset (int): Step (amount of key presses from the start), not normalized.
+
+        Returns:
+            tuple[int]: Amount of carries for each rotor, except the last one.
+        """
+        if offset <= self.cycle_start:
+            return self._tail_carries[offset]
+
+        cycles, rest = divmod(offset - self.cycle_start, self.period)
+        carries = self._cycle_carries
+        end = self._entry + rest
+        if end <= self.period:
+            ranges = [(self._entry, end)]
+        else:
+            ranges = [(self._entry, self.period), (0, end - self.period)]
+        return tuple(
+            tail_carries + cycles * carries[-1][i] + sum(carries[b][i] - carries[a][i] for a, b in ranges)
+            for i, tail_carries in enumerate(self._tail_carries[-1])
+        )
+
+    def normalize(self, offset: int):
+        """Get the smallest step with the same positions as at 'offset'.
+
+        Args:
+            offset (int): Step (amount of key presses from the start).
+
+        Returns:
+            int: Normalized step.
+
+        Raises:
+            ValueError: If 'offset' is negative.
+        """
+        if offset < 0:
+            raise ValueError('"offset" must not be negative')
+        if offset < self.cycle_start + self.period:
+            return offset
+        return self.cycle_start + (offset - self.cycle_start) % self.period
+
+    def positions_at(self, offset: int):
+        """Get rotors positions after 'offset' key presses.
+
+        Args:
+            offset (int): Step (amount of key presses from the start).
+
+        Returns:
+            tuple[int]: Rotors positions (from the first rotor to the last).
+        """
+        return self.table.states[self.state_at(offset)]
+
+
+class _SchedulePositions:
+    """Read-only sequence of positions at steps 0...cycle_start+period-1 of schedule (without copying the cycle)."""
+
+    def __init__(self, schedule: SteppingSchedule):
+        self._schedule = schedule
+
+    def __len__(self):
+        return self._schedule.cycle_start + self._schedule.period
+
+    def __getitem__(self, offset: int):
+        if not 0 <= offset < len(self):
+            raise IndexError('Step out of schedule')
+        return self._schedule.positions_at(offset)
+
+    def __iter__(self):
+        return (self[offset] for offset in range(len(self)))
+
+
+@lru_cache(maxsize=32)
+def get_step_table(notches: tuple):
+    """Get (cached) step table of notches. It is built once and shared by all start positions.
+
+    Args:
+        notches (tuple[frozenset]): Notch positions of each rotor.
+
+    Returns:
+        StepTable: Step table.
+    """
+    return StepTable(notches)
+
+
+@lru_cache(maxsize=1024)
+def get_schedule(start: tuple, notches: tuple):
+    """Get (cached) stepping schedule. Machines with the same key share the same schedule.
+
+    Args:
+        start (tuple[int]):         Start positions (from the first rotor to the last).
+        notches (tuple[frozenset]): Notch positions of each rotor.
+
+    Returns:
+        SteppingSchedule: Stepping schedule.
+    """
+    return SteppingSchedule(start, notches)
@@ -0,0 +1,164 @@
+"""
+Compressed streams (gzip, bz2, xz) and reading in background thread
+"""
+import bz2
+import gzip
+import io
+import lzma
+import queue
+import threading
+
+# compression => magic bytes at the start of compressed stream
+COMPRESSION_MAGIC = {
+    'gzip': b'\x1f\x8b',
+    'bz2': b'BZh',
+    'xz': b'\xfd7zXZ\x00',
+}
+
+COMPRESSIONS = list(COMPRESSION_MAGIC)
+
+COMPRESSION_EXTENSIONS = {
+    '.gz': 'gzip',
+    '.bz2': 'bz2',
+    '.xz': 'xz',
+}
+
+# amount of chunks, which background thread reads ahead
+PREFETCH_CHUNKS = 4
+
+
+def detect_compression(head: bytes):
+    """Detect compression of stream by its first bytes.
+
+    Args:
+        head (bytes): The first bytes of stream (at least 6 for all compressions).
+
+    Returns:
+        str | None: Compression ('gzip', 'bz2', 'xz'), None - stream isn't compressed.
+    """
+    for compression, magic in COMPRESSION_MAGIC.items():
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def compression_by_extension(path: str):
+    """Get compression by file extension.
+
+    Args:
+        path (str): Path to file.
+
+    Returns:
+        str | None: Compression ('gzip', 'bz2', 'xz'), None - unknown extension.
+    """
+    for extension, compression in COMPRESSION_EXTENSIONS.items():
+        if path.endswith(extension):
+            return compression
+    return None
+
+
+def open_compressed(fileobj, mode: str, compression: str):
+    """Wrap binary file into compressor or decompressor (data is processed as stream, by blocks).
+
+    Args:
+        fileobj (BinaryIO): Binary file (it isn't closed, when returned file is closed).
+        mode (str):         'rb' or 'wb'.
+        compression (str):  'gzip', 'bz2' or 'xz'.
+
+    Returns:
+        BinaryIO: Binary file of uncompressed data.
+
+    Raises:
+        ValueError: If compression is unknown.
+    """
+    if compression == 'gzip':
+        return gzip.GzipFile(fileobj=fileobj, mode=mode)
+    if compression == 'bz2':
+        return bz2.BZ2File(fileobj, mode=mode)
+    if compression == 'xz':
+        return lzma.LZMAFile(fileobj, mode=mode)
+    raise ValueError(f'Unknown compression "{compression}"')
+
+
+def open_text_input(file: io.TextIOWrapper, newline: str = None):
+    """Get text file, which is decompressed on the fly, if file is compressed (detected by magic bytes).
+
+    Nothing must be read from file before, because its first bytes are peeked from its binary buffer.
+
+    Args:
+        file (TextIOWrapper): Text file (or stdin).
+        newline (str):        Newline mode of decompressed text file ('' for CSV files).
+
+    Returns:
+        tuple[TextIOWrapper, str | None]: Text file (the same one, if it isn't compressed) and its compression.
+    """
+    buffer = file.buffer
+    head = buffer.peek(max(len(magic) for magic in COMPRESSION_MAGIC.values()))
+    compression = detect_compression(head)
+    if compression is None:
+        return file, None
+
+    decompressed = open_compressed(buffer, 'rb', compression)
+    return io.TextIOWrapper(decompressed, encoding=file.encoding, errors=file.errors, newline=newline), compression
+
+
+def open_text_output(file: io.TextIOWrapper, compression: str, newline: str = None):
+    """Get text file, which is compressed on the fly. It must be closed to finish compressed stream.
+
+    Args:
+        file (TextIOWrapper): Text file (or stdout).
+        compression (str):    'gzip', 'bz2' or 'xz'.
+        newline (str):        Newline mode ('' for CSV files).
+
+    Returns:
+        TextIOWrapper: Text file.
+    """
+    compressed = open_compressed(file.buffer, 'wb', compression)
+    return io.TextIOWrapper(compressed, encoding=file.encoding, errors=file.errors, newline=newline)
+
+
+def prefetch(iterable, size: int = PREFETCH_CHUNKS):
+    """Iterate in background thread, 'size' items ahead (i.e. reading and decompression of the next chunks
+    are overlapped with encoding of the current one: codecs and file reads release GIL).
+
+    Args:
+        iterable (Iterable): Items.
+        size (int):          Max amount of items, read ahead.
+
+    Yields:
+        Items of iterable (exception of iterable is raised here).
+    """
+    items = queue.Queue(maxsize=size)
+    end = object()
+    errors = []
+    stop = threading.Event()
+
+    def read():
+        try:
+            for item in iterable:
+                if stop.is_set():
+                    return
+                items.put(item)
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            items.put(end)
+
+    thread = threading.Thread(target=read, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = items.get()
+            if item is end:
+                break
+            yield item
+        if errors:
+            raise errors[0]
+    finally:
+        # consumer may stop early: unblock reader and let it finish
+        stop.set()
+        while thread.is_alive():
+            try:
+                items.get_nowait()
+            except queue.Empty:
+                thread.join(0.01)
@@ -0,0 +1,106 @@
+"""
+Encoding of one message under every start position
+"""
+from array import array
+
+from .spec import MachineSpec, INDEX_TO_LETTER, LETTER_TO_INDEX
+from .stepping import ODOMETER
+from .utils import prepare_string
+
+
+def position_index(positions: list[int]):
+    """Get index of start positions in sweep (positions as odometer value, the first rotor is the least significant digit).
+
+    Args:
+        positions (list[int]): Rotors positions, from the first rotor to the last.
+
+    Returns:
+        int: Index.
+    """
+    index = 0
+    for pos in reversed(positions):
+        index = index * 26 + pos
+    return index
+
+
+class Sweep:
+    """Message encoded under all 26^N start positions of spec's rotors (odometer stepping).
+
+    Start position p encodes j-th letter at state p + j + 1, so all outputs are made of one keystream:
+    permutations of all states are computed once (see 'MachineSpec.state_table'), column 'P_s[x] for every state s'
+    is its strided slice, and j-th letters of all outputs are the same column, rotated by j + 1 (one slice assignment).
+
+    Args:
+        spec (MachineSpec):  Spec (reflector, rotors and plugboard).
+        message (str):       Message (only letters are used).
+
+    Attributes:
+        spec (MachineSpec):  Spec.
+        length (int):        Amount of letters in message.
+        states (int):        Amount of start positions (26^N).
+        outputs (bytearray): Encoded letter indices: output of start position with index p is outputs[p * length:(p + 1) * length].
+
+    Raises:
+        ValueError: If spec uses notched stepping.
+    """
+
+    def __init__(self, spec: MachineSpec, message: str):
+        if spec.stepping != ODOMETER:
+            raise ValueError('Sweep supports only odometer stepping')
+
+        self.spec = spec
+        self.states = 26 ** len(spec.rotors)
+
+        letters = prepare_string(message).encode('ascii').translate(LETTER_TO_INDEX)
+        self.length = len(letters)
+
+        # columns[x][s]: letter x encoded at state s
+        table = spec.state_table()
+        columns = {x: bytes(table[x::26]) for x in set(letters)}
+
+        self.outputs = bytearray(self.states * self.length)
+        for j, x in enumerate(letters):
+            shift = (j + 1) % self.states
+            self.outputs[j::self.length] = columns[x][shift:] + columns[x][:shift]
+
+    @staticmethod
+    def from_configuration(conf_str: str, message: str):
+        """Create sweep from configuration string (rotors positions are ignored).
+
+        Args:
+            conf_str (str): Configuration string.
+            message (str):  Message.
+
+        Returns:
+            Sweep: Sweep instance.
+        """
+        spec, _ = MachineSpec.from_configuration(conf_str)
+        return Sweep(spec, message)
+
+    def output(self, positions: list[int]):
+        """Get message encoded from start positions.
+
+        Args:
+            positions (list[int]): Rotors positions, from the first rotor to the last.
+
+        Returns:
+            str: Encoded message.
+        """
+        start = position_index(positions) * self.length
+        return self.outputs[start:start + self.length].translate(INDEX_TO_LETTER).decode('ascii')
+
+    def scores(self, score):
+        """Score outputs of all start positions.
+
+        Args:
+            score (Callable[[bytes], float]): Score function of letter indices (i.e. 'NgramScorer.score').
+
+        Returns:
+            array: Scores (doubles), indexed by start position index (see 'position_index').
+        """
+        length = self.length
+        if length == 0:
+            return array('d', [score(b'')]) * self.states
+
+        outputs = self.outputs
+        return array('d', (score(outputs[i:i + length]) for i in range(0, len(outputs), length)))
@@ -0,0 +1,200 @@
+"""
+Persistent cache of compiled tables: memory-mapped files, shared by all processes
+"""
+import mmap
+import os
+import struct
+import tempfile
+
+# version of tables format: files of other versions are ignored (and rebuilt)
+TABLES_VERSION = 1
+
+# file header: magic, tables version, payload size
+TABLES_MAGIC = b'YBET'
+TABLES_HEADER = struct.Struct('<4sIQ')
+
+TABLES_SUFFIX = '.tbl'
+
+DEFAULT_CACHE_SIZE = 256 * 2 ** 20
+
+# environment variable with path to default cache directory
+TABLE_CACHE_ENV = 'YB_ENIGMA_TABLE_CACHE'
+
+
+class TableCache:
+    """Directory of compiled tables (raw bytes with versioned header), memory-mapped read-only.
+
+    All processes using the same directory share one copy of each table in OS page cache.
+    Files are written atomically (temporary file, then rename), and the least recently used ones
+    are removed, when size of directory exceeds 'max_size'.
+
+    Args:
+        directory (str): Path to cache directory (created, if it doesn't exist).
+        max_size (int):  Max size of all tables in bytes.
+
+    Attributes:
+        directory (str): Path to cache directory.
+        max_size (int):  Max size of all tables in bytes.
+    """
+
+    def __init__(self, directory: str, max_size: int = DEFAULT_CACHE_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+
+    def path(self, key: str, kind: str):
+        """Get path to table file.
+
+        Args:
+            key (str):  Canonical key of configuration (see 'MachineSpec.table_key').
+            kind (str): Kind of table.
+
+        Returns:
+            str: Path.
+        """
+        return os.path.join(self.directory, f'{key}-{kind}{TABLES_SUFFIX}')
+
+    def load(self, key: str, kind: str):
+        """Memory-map table, if it is in cache.
+
+        Args:
+            key (str):  Canonical key of configuration.
+            kind (str): Kind of table.
+
+        Returns:
+            memoryview | None: Read-only table (None, if there is no valid table file).
+        """
+        path = self.path(key, kind)
+        try:
+            with open(path, 'rb') as file:
+                mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):  # no file, or empty file
+            return None
+
+        if len(mapped) < TABLES_HEADER.size:
+            mapped.close()
+            return None
+        magic, version, size = TABLES_HEADER.unpack_from(mapped)
+        if magic != TABLES_MAGIC or version != TABLES_VERSION or size != len(mapped) - TABLES_HEADER.size:
+            mapped.close()
+            return None
+
+        # file is recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        return memoryview(mapped)[TABLES_HEADER.size:]
+
+    def save(self, key: str, kind: str, table: bytes):
+        """Write table to cache atomically and evict the least recently used tables.
+
+        Args:
+            key (str):     Canonical key of configuration.
+            kind (str):    Kind of table.
+            table (bytes): Table.
+
+        Returns:
+            None
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(TABLES_HEADER.pack(TABLES_MAGIC, TABLES_VERSION, len(table)))
+                file.write(table)
+            os.replace(tmp_path, self.path(key, kind))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        self.evict()
+
+    def get(self, key: str, kind: str, build):
+        """Get table from cache, or build and save it.
+
+        Args:
+            key (str):                   Canonical key of configuration.
+            kind (str):                  Kind of table.
+            build (Callable[[], bytes]): Builds table, if it is not in cache.
+
+        Returns:
+            memoryview | bytes: Table (built one is returned as is, if it can't be saved).
+        """
+        table = self.load(key, kind)
+        if table is not None:
+            return table
+
+        table = build()
+        try:
+            self.save(key, kind, table)
+        except OSError:
+            return table
+
+        mapped = self.load(key, kind)
+        return mapped if mapped is not None else table
+
+    def evict(self):
+        """Remove the least recently used tables, until size of cache is not greater than 'max_size'.
+
+        Returns:
+            None
+        """
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(TABLES_SUFFIX):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)  # processes, which have it mapped, keep their copy
+            except OSError:
+                continue
+            total -= size
+
+    def clear(self):
+        """Remove all tables.
+
+        Returns:
+            None
+        """
+        if not os.path.isdir(self.directory):
+            return
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(TABLES_SUFFIX):
+                os.remove(entry.path)
+
+
+_table_cache = TableCache(os.environ[TABLE_CACHE_ENV]) if os.environ.get(TABLE_CACHE_ENV) else None
+
+
+def set_table_cache(directory: str = None, max_size: int = DEFAULT_CACHE_SIZE):
+    """Set cache of compiled tables, used by all machines (see 'MachineSpec').
+
+    Args:
+        directory (str): Path to cache directory. None - don't cache tables.
+        max_size (int):  Max size of all tables in bytes.
+
+    Returns:
+        TableCache | None: Cache.
+    """
+    global _table_cache
+    _table_cache = TableCache(directory, max_size) if directory else None
+    return _table_cache
+
+
+def get_table_cache():
+    """Get cache of compiled tables (by default it is set by YB_ENIGMA_TABLE_CACHE environment variable).
+
+    Returns:
+        TableCache | None: Cache.
+    """
+    return _table_cache
@@ -0,0 +1,254 @@
+"""
+Column-wise encoding of CSV/TSV files
+"""
+import csv
+import hashlib
+from multiprocessing import Pool
+
+from .spec import MachineSpec, Cursor, LETTER_TO_INDEX, INDEX_TO_LETTER
+from .stepping import ODOMETER, NOTCHED, get_schedule
+from .sweep import position_index
+from .utils import keep_only_alph, copy_case, replace_letters
+
+# offset of cell's state from base configuration
+ROW_OFFSET = 'row'      # row number and column: every cell has its own state
+HASH_OFFSET = 'hash'    # hash of column name (and value of key column): equal values are encoded equally
+
+OFFSET_MODES = [ROW_OFFSET, HASH_OFFSET]
+
+# amount of rows, sent to worker process at once
+CSV_CHUNK_ROWS = 2048
+
+
+class ColumnEncoder:
+    """Encode selected columns of table rows. Each cell is encoded at its own state: base configuration,
+    moved by offset of the cell. Rotors are jumped to the state (as odometer value, or by stepping schedule),
+    so nothing is parsed or stepped per cell, and any row can be encoded independently of the others.
+
+    Letters of cell are encoded keeping their case, all other characters are kept in place,
+    so encoding the encoded table again with the same arguments gives the original table.
+
+    Args:
+        conf_str (str):       Base configuration string.
+        columns (list[int]):  Indices of encoded columns.
+        names (list[str]):    Names of encoded columns (used by hash offset). Default: column indices.
+        offset (str):         'row' - offset is row number * amount of columns + column's place,
+                              'hash' - offset is hash of column name and value of key column.
+        key_column (int):     Index of key column for hash offset (not encoded). Default: only column name is hashed.
+        stepping (str):       Rotors stepping mode ('odometer' or 'notched').
+
+    Attributes:
+        spec (MachineSpec):   Spec of machine.
+        cursor (Cursor):      Cursor at base positions.
+
+    Raises:
+        ValueError: If offset mode is unknown, or key column is encoded.
+    """
+
+    def __init__(self, conf_str: str, columns: list[int], names: list[str] = None, offset: str = ROW_OFFSET,
+                 key_column: int = None, stepping: str = ODOMETER):
+        if offset not in OFFSET_MODES:
+            raise ValueError(f'Unknown offset mode "{offset}"')
+        if key_column is not None and key_column in columns:
+            raise ValueError('Key column can\'t be encoded')
+
+        self.spec, self.cursor = MachineSpec.from_configuration(conf_str, stepping)
+        self.columns = list(columns)
+        self.names = list(names) if names is not None else [str(column) for column in columns]
+        self.offset = offset
+        self.key_column = key_column
+
+        self._base = position_index(self.cursor.positions)
+        self._states = 26 ** len(self.spec.rotors)
+
+    def cursor_at(self, offset: int):
+        """Get cursor, moved from base positions by 'offset' key presses (computed directly).
+
+        Args:
+            offset (int): Amount of key presses.
+
+        Returns:
+            Cursor: Cursor instance.
+        """
+        if self.spec.stepping == NOTCHED:
+            schedule = get_schedule(self.cursor.start, self.spec.notches)
+            cursor = Cursor(self.cursor.start)
+            cursor.offset = schedule.normalize(offset)
+            cursor.positions = list(schedule.positions[cursor.offset])
+            return cursor
+
+        value = (self._base + offset) % self._states
+        positions = []
+        for _ in self.spec.rotors:
+            value, pos = divmod(value, 26)
+            positions.append(pos)
+        return Cursor(positions)
+
+    def cell_offset(self, row: list[str], row_number: int, place: int):
+        """Get offset of cell.
+
+        Args:
+            row (list[str]):  Row.
+            row_number (int): Row number (0 - the first row after header).
+            place (int):      Place of cell's column among encoded columns.
+
+        Returns:
+            int: Offset.
+        """
+        if self.offset == ROW_OFFSET:
+            return row_number * len(self.columns) + place
+
+        digest = hashlib.blake2b(self.names[place].encode('utf-8'), digest_size=8)
+        if self.key_column is not None and self.key_column < len(row):
+            digest.update(b'\0' + row[self.key_column].encode('utf-8'))
+        return int.from_bytes(digest.digest(), 'little')
+
+    def encode_cell(self, text: str, offset: int):
+        """Encode letters of cell, keeping their case and all other characters.
+
+        Args:
+            text (str):   Cell.
+            offset (int): Offset of cell's state.
+
+        Returns:
+            str: Encoded cell.
+        """
+        letters = keep_only_alph(text)
+        if not letters:
+            return text
+
+        indices = letters.lower().encode('ascii').translate(LETTER_TO_INDEX)
+        encoded = self.spec.encode_indices(indices, self.cursor_at(offset)).translate(INDEX_TO_LETTER).decode('ascii')
+        encoded = copy_case(letters, encoded)
+        return replace_letters(text, encoded) if len(letters) != len(text) else encoded
+
+    def encode_row(self, row: list[str], row_number: int):
+        """Encode selected columns of row (missing cells are skipped).
+
+        Args:
+            row (list[str]):  Row.
+            row_number (int): Row number (0 - the first row after header).
+
+        Returns:
+            list[str]: Encoded row.
+        """
+        encoded = list(row)
+        for place, column in enumerate(self.columns):
+            if column < len(row):
+                encoded[column] = self.encode_cell(row[column], self.cell_offset(row, row_number, place))
+        return encoded
+
+    def encode_rows(self, rows: list[list[str]], first_row: int = 0):
+        """Encode rows.
+
+        Args:
+            rows (list[list[str]]): Rows.
+            first_row (int):        Row number of the first row.
+
+        Returns:
+            list[list[str]]: Encoded rows.
+        """
+        return [self.encode_row(row, row_number) for row_number, row in enumerate(rows, first_row)]
+
+
+def encode_csv(input_file, output_file, conf_str: str, columns: list, header: bool = True, delimiter: str = ',',
+               offset: str = ROW_OFFSET, key_column=None, stepping: str = ODOMETER, jobs: int = None):
+    """Encode columns of CSV file, streaming: rows are read, encoded by chunks in process pool and written in order.
+
+    Args:
+        input_file (TextIO):   CSV file (opened with newline='').
+        output_file (TextIO):  File for encoded CSV (opened with newline='').
+        conf_str (str):        Base configuration string.
+        columns (list):        Encoded columns: names (if file has header) or indices.
+        header (bool):         The first row is header (it is written as is).
+        delimiter (str):       Delimiter of cells.
+        offset (str):          Offset mode (see 'ColumnEncoder').
+        key_column:            Key column for hash offset: name (if file has header) or index.
+        stepping (str):        Rotors stepping mode.
+        jobs (int):            Amount of worker processes (1 - no pool). Default: CPU count.
+
+    Returns:
+        int: Amount of encoded rows (without header).
+
+    Raises:
+        ValueError: If column is not found.
+    """
+    reader = csv.reader(input_file, delimiter=delimiter)
+    writer = csv.writer(output_file, delimiter=delimiter, lineterminator='\n')
+
+    names = None
+    if header:
+        names = next(reader, [])
+        writer.writerow(names)
+
+    def column_index(column):
+        if isinstance(column, int) or (names is None and str(column).isdigit()):
+            return int(column)
+        if names is None or column not in names:
+            raise ValueError(f'Unknown column "{column}"')
+        return names.index(column)
+
+    indices = [column_index(column) for column in columns]
+    encoder = ColumnEncoder(
+        conf_str, indices,
+        names=[names[i] if names is not None and i < len(names) else str(i) for i in indices],
+        offset=offset,
+        key_column=column_index(key_column) if key_column is not None else None,
+        stepping=stepping,
+    )
+
+    chunks = _read_row_chunks(reader)
+    if jobs == 1:
+        results = (encoder.encode_rows(rows, first_row) for first_row, rows in chunks)
+        return _write_rows(results, writer, output_file)
+
+    with Pool(jobs, initializer=_init_worker, initargs=(encoder,)) as pool:
+        return _write_rows(pool.imap(_worker_encode_rows, chunks), writer, output_file)
+
+
+def _read_row_chunks(reader):
+    """Split rows into chunks of CSV_CHUNK_ROWS rows.
+
+    Yields:
+        tuple[int, list[list[str]]]: Row number of the first row and rows.
+    """
+    rows = []
+    first_row = 0
+    for row in reader:
+        rows.append(row)
+        if len(rows) == CSV_CHUNK_ROWS:
+            yield first_row, rows
+            first_row += len(rows)
+            rows = []
+    if rows:
+        yield first_row, rows
+
+
+def _write_rows(results, writer, output_file):
+    """Write chunks of encoded rows (file is flushed after each chunk).
+
+    Returns:
+        int: Amount of rows.
+    """
+    count = 0
+    for rows in results:
+        writer.writerows(rows)
+        output_file.flush()
+        count += len(rows)
+    return count
+
+
+# encoder of worker process (set once per process)
+_worker_encoder = None
+
+
+def _init_worker(encoder: ColumnEncoder):
+    """Set encoder of worker process."""
+    global _worker_encoder
+    _worker_encoder = encoder
+
+
+def _worker_encode_rows(chunk: tuple):
+    """Encode chunk of rows in worker process."""
+    first_row, rows = chunk
+    return _worker_encoder.encode_rows(rows, first_row)
@@ -2,11 +2,16 @@
 Utils
 """
 import re
+from functools import lru_cache
 from .reflector import Reflector
 from .rotor import Rotor
 from .plugboard import Plugboard
 from .exceptions import InvalidConfigurationString, InvalidPlugboardPair
 
+# M4: non-stepping Greek rotors and thin reflectors, which they are used with
+GREEK_ROTOR_NUMS = [rotor.num for rotor in Rotor.greek_list()]
+THIN_REFLECTOR_NUMS = [reflector.num for reflector in Reflector.thin_list()]
+
 
 def parse_configuration(conf_str: str, debug=False):
     """Parse configuration string
@@ -25,14 +30,17 @@ def parse_configuration(conf_str: str, debug=False):
 
     conf = conf_str.split(' ')
 
-    reflector = Reflector.by_num(conf[0], debug=debug)
-
     rotors_list = []
     for rotor_conf in conf[1].split('-'):
         rotor_conf = rotor_conf.split(':')
         rotor_num = rotor_conf[0]
         rotor_pos = int(rotor_conf[1]) if len(rotor_conf) > 1 else 0
-        rotors_list.append(Rotor.by_num(num=rotor_num, pos=rotor_pos, debug=debug))
+        rotor_ring = int(rotor_conf[2]) if len(rotor_conf) > 2 else 0
+        rotors_list.append(Rotor.by_num(num=rotor_num, pos=rotor_pos, debug=debug, ring=rotor_ring))
+
+    # Greek rotor (the leftmost one) doesn't step: it becomes a part of thin reflector
+    greek = rotors_list.pop(0) if rotors_list[0].num in GREEK_ROTOR_NUMS else None
+    reflector = Reflector.by_num(conf[0], debug=debug, greek=greek)
 
     plugboard = Plugboard()
     if len(conf) > 2 and conf[2] != '':
@@ -64,17 +72,22 @@ def validate_configuration_string(conf_str: str):
     if len(conf) < 2 or len(conf) > 3:
         raise InvalidConfigurationString()
 
-    if conf[0] == '' or conf[0] not in [reflector.num for reflector in Reflector.list()]:
+    if conf[0] == '' or conf[0] not in [reflector.num for reflector in Reflector.list() + Reflector.thin_list()]:
         raise InvalidConfigurationString()
 
     if conf[1] == '':
         raise InvalidConfigurationString()
 
     rotor_confs = conf[1].split('-')
-    for rotor_conf in rotor_confs:
-        if not re.fullmatch(r"^(I|II|III|IV|V|VI|VII|VIII)(\:((1[0-9]?)|(2[0-6]?)|([0-9])))?$", rotor_conf):
+    for i, rotor_conf in enumerate(rotor_confs):
+        if not re.fullmatch(r"^(I|II|III|IV|V|VI|VII|VIII|Beta|Gamma)(\:((1[0-9]?)|(2[0-6]?)|([0-9]))(\:((1[0-9]?)|(2[0-5]?)|([0-9])))?)?$", rotor_conf):
             raise InvalidConfigurationString()
 
+        # Greek rotor: only the leftmost one, only with thin reflector, and there must be other rotors
+        if rotor_conf.split(':')[0] in GREEK_ROTOR_NUMS:
+            if i != 0 or len(rotor_confs) < 2 or conf[0] not in THIN_REFLECTOR_NUMS:
+                raise InvalidConfigurationString()
+
     if len(conf) == 3:
         if conf[2] == '':
             raise InvalidConfigurationString()
@@ -85,24 +98,33 @@ def validate_configuration_string(conf_str: str):
                 raise InvalidConfigurationString()
 
 
-def format_output_string(string: str, max_char_num=5):
+def format_output_string(string: str, max_char_num=5, start=0):
     """Format string, as people used to do with real Enigma
 
     Args:
         string (str):           String to format
         max_char_num (int):     Num of chars in one 'block',
                                 i.e. max_char_num = 4; "helloworld" => 'HELL OWOR LD'
+        start (int):            Num of chars, already formatted before this string (when string is formatted by parts),
+                                i.e. max_char_num = 4, start = 2; "lloworld" => 'LL OWOR LD'
 
     Returns:
         formated_string (str):  Formatted string
     """
-    result_string = ''
-    for i, char in enumerate(string):
-        if i % max_char_num == 0 and i != 0:
-            result_string += ' '
-        result_string += char.upper()
+    # finish the group, started by previous part
+    head_len = (-start) % max_char_num
+    head, rest = string[:head_len], string[head_len:]
+
+    groups = [rest[i:i + max_char_num] for i in range(0, len(rest), max_char_num)]
+    if head:
+        groups.insert(0, head)
+    result_string = ' '.join(groups)
 
-    return result_string
+    # previous part ended with the whole group
+    if start > 0 and not head and groups:
+        result_string = ' ' + result_string
+
+    return result_string.upper()
 
 
 def keep_only_alph(string: str):
@@ -127,3 +149,88 @@ def prepare_string(string: str):
         formated_string (str):  Formatted string
     """
     return keep_only_alph(string).lower().replace(' ', '')
+
+
+# bytes.translate table: case bit (0x20) for uppercase ASCII letters, 0 for anything else
+UPPERCASE_BITS = bytes(0x20 if chr(i).isupper() and chr(i).isascii() else 0 for i in range(256))
+
+
+@lru_cache(maxsize=8)
+def passthrough_table(keep_spaces: bool = False, keep_new_line: bool = False, keep_special: bool = False):
+    """Get str.translate table, which removes ASCII characters, that are neither letters nor kept by policy
+
+    Args:
+        keep_spaces (bool):     Keep spaces
+        keep_new_line (bool):   Keep new line characters
+        keep_special (bool):    Keep all other characters
+
+    Returns:
+        table (dict[int, None]): Translate table
+    """
+    table = {}
+    for i in range(128):
+        char = chr(i)
+        if char.isalpha():
+            continue
+        keep = keep_spaces if char == ' ' else keep_new_line if char == '\n' else keep_special
+        if not keep:
+            table[i] = None
+    return table
+
+
+def keep_passthrough(string: str, keep_spaces: bool = False, keep_new_line: bool = False, keep_special: bool = False):
+    """Format string, keeping only eng alph chars and characters kept by policy (in one pass).
+    Other letters (i.e. non-ASCII) are always removed, because they can't be encoded
+
+    Args:
+        string (str):           String to format
+        keep_spaces (bool):     Keep spaces
+        keep_new_line (bool):   Keep new line characters
+        keep_special (bool):    Keep all other characters
+
+    Returns:
+        formated_string (str):  Formatted string
+    """
+    table = passthrough_table(keep_spaces, keep_new_line, keep_special)
+    if not string.isascii():
+        # classify each distinct non-ASCII character only once
+        table = dict(table)
+        for char in set(string):
+            if not char.isascii() and (char.isalpha() or not keep_special):
+                table[ord(char)] = None
+    return string.translate(table)
+
+
+def copy_case(source: str, string: str):
+    """Make letters of 'string' upper-cased, where letters of 'source' are (both strings contain only eng alph chars)
+
+    Args:
+        source (str):           String, which case is copied
+        string (str):           Lower-cased string of the same length
+
+    Returns:
+        formated_string (str):  Formatted string
+    """
+    # lower-cased letter differs from upper-cased one only by bit 0x20: xor all of them at once
+    case_bits = source.encode('ascii').translate(UPPERCASE_BITS)
+    result = int.from_bytes(string.encode('ascii'), 'big') ^ int.from_bytes(case_bits, 'big')
+    return result.to_bytes(len(string), 'big').decode('ascii')
+
+
+def replace_letters(string: str, letters: str):
+    """Replace eng alph chars of 'string' by 'letters' (in the same order), keeping all other characters
+
+    Args:
+        string (str):           String
+        letters (str):          New letters (the same amount as in 'string')
+
+    Returns:
+        formated_string (str):  Formatted string
+    """
+    parts = re.split('([a-zA-Z]+)', string)
+    pos = 0
+    for i in range(1, len(parts), 2):
+        end = pos + len(parts[i])
+        parts[i] = letters[pos:end]
+        pos = end
+    return ''.join(parts)
@@ -0,0 +1,225 @@
+"""
+WiringSolver: recovery of unknown rotors wirings from known plaintext
+"""
+from .common import ALPH
+from .permutation import Permutation
+from .rotor import Rotor
+from .spec import LETTER_TO_INDEX
+from .utils import parse_configuration, prepare_string
+
+# amount of wirings, after which rotor is considered ambiguous (more messages are needed)
+DEFAULT_MAX_SOLUTIONS = 2
+
+
+class WiringSolver:
+    """Recover wirings of custom rotors from messages with known plaintext, key and rotors positions.
+
+    Unknown rotors are written in configuration strings by their names, i.e. "B X:4-I:17-II:9 AQ:EZ" (stepping is odometer).
+    If rotor X with wiring W is at position p (ring r), and everything else is known, each letter x => c gives
+    permutation equation W(b) = N(W(a)): a and b are x and c, passed through plugboard and rotors before X (shifted
+    by p - r), and N is the rest of machine (rotors after X, reflector and the same rotors backwards, conjugated by r).
+
+    Equations of all messages are one graph on 26 letters (edge a - b, labelled by N). Hypothesis W(a) = y
+    determines W of every letter, connected with a, so each connected component has at most 26 hypotheses,
+    and each of them is propagated and checked against all equations at once. Components are combined by
+    depth-first search, while wiring stays one-to-one.
+
+    Rotors are recovered one by one: rotor is solved from messages, in which all other rotors are known
+    (the given ones, or recovered before), so messages with many unknown rotors are used later.
+
+    Args:
+        messages (list[tuple[str, str, str]]): Plaintext, ciphertext and configuration string at start of message.
+        unknown (list[str]):                   Names of unknown rotors, used in configuration strings.
+        max_solutions (int):                   Amount of wirings, at which search for rotor stops.
+
+    Attributes:
+        solutions (dict[str, list[str]]):      Found wirings of each rotor (as 'key' of Rotor), at most 'max_solutions'.
+
+    Raises:
+        ValueError: If plaintext and ciphertext of message have different amount of letters.
+    """
+
+    def __init__(self, messages: list[tuple[str, str, str]], unknown: list[str],
+                 max_solutions: int = DEFAULT_MAX_SOLUTIONS):
+        self.unknown = list(unknown)
+        self.max_solutions = max_solutions
+        self.solutions = {}
+
+        self.messages = []
+        for plaintext, ciphertext, conf_str in messages:
+            plaintext, ciphertext = prepare_string(plaintext), prepare_string(ciphertext)
+            if len(plaintext) != len(ciphertext):
+                raise ValueError('Plaintext and ciphertext must have the same amount of letters')
+            self.messages.append((
+                plaintext.encode('ascii').translate(LETTER_TO_INDEX),
+                ciphertext.encode('ascii').translate(LETTER_TO_INDEX),
+                conf_str.strip(),
+            ))
+
+    def _parse(self, conf_str: str, known: dict):
+        """Parse configuration string with unknown rotors.
+
+        Args:
+            conf_str (str):            Configuration string.
+            known (dict[str, bytes]):  Recovered wirings (without ring setting).
+
+        Returns:
+            tuple[Reflector, list[Rotor], Plugboard, list[int]]: Parsed configuration (rotors from the first one)
+                                                                 and slots of rotors, which are still unknown.
+        """
+        parts = conf_str.split(' ')
+        names = []
+        rotor_confs = []
+        for rotor_conf in parts[1].split('-'):
+            name, _, rest = rotor_conf.partition(':')
+            names.append(name)
+            # unknown rotor is parsed as known one, and then replaced
+            if name in self.unknown:
+                rotor_conf = 'I:' + rest if rest else 'I'
+            rotor_confs.append(rotor_conf)
+        reflector, rotors_list, plugboard = parse_configuration(' '.join([parts[0], '-'.join(rotor_confs)] + parts[2:]))
+
+        names = names[len(names) - len(rotors_list):]  # Greek rotor is a part of reflector
+        slots = []
+        for i, (name, rotor) in enumerate(zip(names, rotors_list)):
+            if name in self.unknown:
+                key = ''.join(ALPH[y] for y in known.get(name, range(26)))
+                rotors_list[i] = Rotor(pos=rotor.pos, key=key, num=name, ring=rotor.ring)
+                if name not in known:
+                    slots.append(len(rotors_list) - 1 - i)
+        rotors_list.reverse()
+        return reflector, rotors_list, plugboard, slots
+
+    def equations(self, name: str, known: dict = None):
+        """Build equations W(b) = N(W(a)) of rotor from messages, in which it is the only unknown rotor.
+
+        Args:
+            name (str):                Rotor name.
+            known (dict[str, bytes]):  Recovered wirings of other rotors.
+
+        Returns:
+            list[list[tuple[int, bytes]]]: Edges of each letter a: letter b and table of N.
+        """
+        known = known or {}
+        edges = set()
+        for plaintext, ciphertext, conf_str in self.messages:
+            reflector, rotors_list, plugboard, slots = self._parse(conf_str, known)
+            if len(slots) != 1 or rotors_list[slots[0]].num != name:
+                continue
+            slot = slots[0]
+            ring = rotors_list[slot].ring
+
+            # permutations of rotors at each position are composed once per message
+            forward = [[rotor.permutation(pos) for pos in range(26)] for rotor in rotors_list]
+            plugboard, reflector = plugboard.permutation(), reflector.permutation()
+            outer_cache, inner_cache = {}, {}
+
+            positions = [rotor.pos for rotor in rotors_list]
+            for x, c in zip(plaintext, ciphertext):
+                # key press moves rotors as odometer before the letter is encoded
+                for i in range(len(positions)):
+                    positions[i] = (positions[i] + 1) % 26
+                    if positions[i]:
+                        break
+
+                outer = tuple(positions[:slot])
+                if outer not in outer_cache:
+                    permutation = plugboard
+                    for i, pos in enumerate(outer):
+                        permutation = permutation.then(forward[i][pos])
+                    outer_cache[outer] = permutation
+                inner = tuple(positions[slot + 1:])
+                if inner not in inner_cache:
+                    permutation = Permutation.identity()
+                    for i, pos in enumerate(inner, slot + 1):
+                        permutation = permutation.then(forward[i][pos])
+                    permutation = permutation.then(reflector).then(permutation.inverse())
+                    inner_cache[inner] = permutation.conjugate(ring).table
+
+                shift = positions[slot] - ring
+                a = (outer_cache[outer][x] + shift) % 26
+                b = (outer_cache[outer][c] + shift) % 26
+                edges.add((a, b, inner_cache[inner]))
+
+        graph = [[] for _ in ALPH]
+        for a, b, table in edges:
+            graph[a].append((b, table))
+            if a != b:
+                graph[b].append((a, table))  # N is involution: W(a) = N(W(b))
+        return graph
+
+    def solve_wiring(self, graph: list):
+        """Find wirings, which satisfy all equations (see 'equations').
+
+        Args:
+            graph (list[list[tuple[int, bytes]]]): Edges of each letter.
+
+        Returns:
+            list[bytes]: Wirings (at most 'max_solutions').
+        """
+        wiring = [None] * len(ALPH)
+        used = [False] * len(ALPH)
+        solutions = []
+        # the most constrained letters first: one hypothesis fixes their whole component
+        order = sorted(range(len(ALPH)), key=lambda letter: -len(graph[letter]))
+
+        def propagate(letter: int, value: int, assigned: list):
+            if used[value]:
+                return False
+            wiring[letter], used[value] = value, True
+            assigned.append(letter)
+            queue = [letter]
+            for a in queue:
+                y = wiring[a]
+                for b, table in graph[a]:
+                    implied = table[y]
+                    if wiring[b] is None:
+                        if used[implied]:
+                            return False
+                        wiring[b], used[implied] = implied, True
+                        assigned.append(b)
+                        queue.append(b)
+                    elif wiring[b] != implied:
+                        return False
+            return True
+
+        def search():
+            if len(solutions) >= self.max_solutions:
+                return
+            letter = next((letter for letter in order if wiring[letter] is None), None)
+            if letter is None:
+                solutions.append(bytes(wiring))
+                return
+            for value in range(len(ALPH)):
+                assigned = []
+                if propagate(letter, value, assigned):
+                    search()
+                for a in assigned:
+                    used[wiring[a]] = False
+                    wiring[a] = None
+
+        search()
+        return solutions
+
+    def solve(self):
+        """Recover all unknown rotors, which can be recovered unambiguously.
+
+        Returns:
+            dict[str, str]: Rotor name => wiring as 'key' of Rotor (rotors, which can't be recovered, are missing).
+        """
+        known = {}
+        progress = True
+        while progress:
+            progress = False
+            for name in self.unknown:
+                if name in known:
+                    continue
+                graph = self.equations(name, known)
+                if not any(graph):
+                    continue
+                solutions = self.solve_wiring(graph)
+                self.solutions[name] = [''.join(ALPH[y] for y in wiring) for wiring in solutions]
+                if len(solutions) == 1:
+                    known[name] = solutions[0]
+                    progress = True
+        return {name: ''.join(ALPH[y] for y in wiring) for name, wiring in known.items()}